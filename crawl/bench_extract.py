@@ -0,0 +1,61 @@
+import argparse
+import glob
+import os
+import time
+
+from sites import SITES
+
+# ================================
+# Extraction Micro-Benchmark
+# ================================
+#
+# Compares the BeautifulSoup extractors (extract_soup) with the precompiled XPath
+# extractors (extract) on the saved listing pages in fixtures/, checks that both
+# return the same products and reports tiles/sec for each.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def normalized(products):
+    # The XPath extractors strip surrounding whitespace from every field
+    return [{key: value.strip() for key, value in product.items()} for product in products]
+
+
+def tiles_per_second(extract, pages, repeat):
+    tiles = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            tiles += len(extract(page))
+    return tiles / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark product tile extraction on saved pages.")
+    parser.add_argument("sites", nargs="*", default=list(SITES), help="Sites to benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over each site's pages")
+    parser.add_argument("--fixtures-dir", default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    print(f"{'site':<8} {'pages':>5} {'before tiles/s':>15} {'after tiles/s':>14} {'speedup':>8}")
+    for site_name in args.sites:
+        site = SITES[site_name]
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.fixtures_dir, site_name, "*.html"))):
+            with open(path, "r", encoding="utf-8") as f:
+                pages.append(f.read())
+        if not pages:
+            print(f"{site_name:<8} no saved pages")
+            continue
+
+        for page in pages:
+            if normalized(site.extract(page)) != normalized(site.extract_soup(page)):
+                print(f"{site_name}: extract() and extract_soup() disagree on a saved page")
+
+        before = tiles_per_second(site.extract_soup, pages, args.repeat)
+        after = tiles_per_second(site.extract, pages, args.repeat)
+        print(f"{site_name:<8} {len(pages):>5} {before:>15.0f} {after:>14.0f} {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
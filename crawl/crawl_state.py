@@ -0,0 +1,149 @@
+import hashlib
+import sqlite3
+import time
+
+# ================================
+# Crawl State
+# ================================
+#
+# Remembers every product URL seen per site with a content fingerprint and a
+# last-seen timestamp, so that a re-crawl can emit only what changed:
+#   new      - URL never seen before
+#   changed  - name, price or image differ from the last crawl
+#   vanished - not seen by a complete crawl of the site
+# Every price observed for a product is kept in price_history.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    url TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    name TEXT,
+    price TEXT,
+    image TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    vanished_at REAL
+);
+CREATE INDEX IF NOT EXISTS products_site_seen ON products (site, last_seen);
+CREATE TABLE IF NOT EXISTS price_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    price TEXT,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS price_history_url ON price_history (url, seen_at);
+CREATE TABLE IF NOT EXISTS runs (
+    site TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL
+);
+"""
+
+FINGERPRINT_FIELDS = ("Name", "Price", "Image")
+
+
+def fingerprint(product):
+    content = "\x1f".join(str(product.get(field, "")) for field in FINGERPRINT_FIELDS)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class CrawlState:
+    """
+    SQLite-backed crawl state (crawl_state.db by default).
+    """
+
+    def __init__(self, path="crawl_state.db"):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def begin(self, site, resume=False):
+        """
+        Starts a crawl of `site` and returns its start time. A resumed crawl keeps the
+        start time of the unfinished run, so its earlier pages still count as seen.
+        """
+        row = self.conn.execute("SELECT started, finished FROM runs WHERE site = ?", (site,)).fetchone()
+        if resume and row and row[1] is None:
+            return row[0]
+        started = time.time()
+        self.conn.execute("INSERT OR REPLACE INTO runs (site, started, finished) VALUES (?, ?, NULL)",
+                          (site, started))
+        self.conn.commit()
+        return started
+
+    def observe(self, site, products):
+        """
+        Records the products of one crawled page and returns the delta events for the
+        new and changed ones.
+        """
+        now = time.time()
+        events = []
+        with self.conn:
+            for product in products:
+                url = product["URL"]
+                digest = fingerprint(product)
+                row = self.conn.execute(
+                    "SELECT fingerprint, price, vanished_at FROM products WHERE url = ?", (url,)
+                ).fetchone()
+
+                if row is None:
+                    self.conn.execute(
+                        "INSERT INTO products (url, site, fingerprint, name, price, image, first_seen, last_seen) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (url, site, digest, product.get("Name"), product.get("Price"), product.get("Image"), now, now),
+                    )
+                    self._record_price(url, product.get("Price"), now)
+                    events.append(dict(product, op="upsert", change="new"))
+                    continue
+
+                old_digest, old_price, vanished_at = row
+                self.conn.execute(
+                    "UPDATE products SET fingerprint = ?, name = ?, price = ?, image = ?, last_seen = ?, "
+                    "vanished_at = NULL WHERE url = ?",
+                    (digest, product.get("Name"), product.get("Price"), product.get("Image"), now, url),
+                )
+                if product.get("Price") != old_price:
+                    self._record_price(url, product.get("Price"), now)
+                if vanished_at is not None:
+                    events.append(dict(product, op="upsert", change="new"))
+                elif digest != old_digest:
+                    events.append(dict(product, op="upsert", change="changed"))
+        return events
+
+    def _record_price(self, url, price, seen_at):
+        self.conn.execute("INSERT INTO price_history (url, price, seen_at) VALUES (?, ?, ?)", (url, price, seen_at))
+
+    def finish(self, site, started):
+        """
+        Completes a crawl: products of `site` not seen since `started` are marked as
+        vanished and returned as delete events. Only call this after a complete crawl.
+        """
+        now = time.time()
+        with self.conn:
+            rows = self.conn.execute(
+                "SELECT url, name, price, image FROM products "
+                "WHERE site = ? AND last_seen < ? AND vanished_at IS NULL",
+                (site, started),
+            ).fetchall()
+            self.conn.execute(
+                "UPDATE products SET vanished_at = ? WHERE site = ? AND last_seen < ? AND vanished_at IS NULL",
+                (now, site, started),
+            )
+            self.conn.execute("UPDATE runs SET finished = ? WHERE site = ?", (now, site))
+        return [
+            {"op": "delete", "change": "vanished", "URL": url, "Name": name, "Price": price, "Image": image}
+            for url, name, price, image in rows
+        ]
+
+    def price_history(self, url):
+        """
+        Returns [(seen_at, price), ...] for a product, oldest first.
+        """
+        return self.conn.execute(
+            "SELECT seen_at, price FROM price_history WHERE url = ? ORDER BY seen_at", (url,)
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
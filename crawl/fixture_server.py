@@ -0,0 +1,58 @@
+import argparse
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# ================================
+# Local Fixture Server
+# ================================
+#
+# Serves saved listing pages so the crawler can run without the live sites:
+#   GET /<site>/...?page=N  ->  <fixtures dir>/<site>/page-N.html
+# Start it, then run e.g. "python runner.py --base-url http://127.0.0.1:8000".
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    fixtures_dir = FIXTURES_DIR
+
+    def translate_path(self, path):
+        parts = urlsplit(path)
+        segments = [segment for segment in parts.path.split("/") if segment]
+        if not segments:
+            return os.path.join(self.fixtures_dir, "__missing__")
+        page = parse_qs(parts.query).get("page", ["1"])[0]
+        if not page.isdigit():
+            return os.path.join(self.fixtures_dir, "__missing__")
+        return os.path.join(self.fixtures_dir, os.path.basename(segments[0]), f"page-{page}.html")
+
+    def log_message(self, format, *args):
+        pass  # Keep crawler output readable
+
+
+def serve(fixtures_dir=FIXTURES_DIR, host="127.0.0.1", port=0):
+    """
+    Starts the fixture server in a background thread.
+    Returns (server, base_url); call server.shutdown() to stop it.
+    """
+    handler = type("Handler", (FixtureHandler,), {"fixtures_dir": fixtures_dir})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve saved listing pages for local crawls.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fixtures-dir", default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    server, base_url = serve(args.fixtures_dir, port=args.port)
+    print(f"Serving fixtures from {args.fixtures_dir} at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
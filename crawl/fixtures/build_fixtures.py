@@ -0,0 +1,98 @@
+import json
+import os
+import zlib
+from html import escape
+from urllib.parse import urlsplit
+
+# ================================
+# Fixture Pages
+# ================================
+#
+# Rebuilds the saved listing pages served by fixture_server.py from previously
+# scraped JSON, using the same markup the site extractors look for.
+# Usage: python fixtures/build_fixtures.py [--tiles N] [--pages N]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CRAWL_DIR = os.path.dirname(HERE)
+
+SOURCES = {
+    "shein": os.path.join(CRAWL_DIR, "shein.json"),
+    "asos": os.path.join(CRAWL_DIR, "asos_new_in.json"),
+    "boohoo": os.path.join(CRAWL_DIR, "converted_prices", "boohoo_new_in.json"),
+}
+
+
+def path_of(url):
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else "") + (f"#{parts.fragment}" if parts.fragment else "")
+
+
+def shein_tile(item):
+    return (
+        f'<section class="product-card" aria-label="{escape(item["Name"])}">'
+        f'<a href="{escape(path_of(item["URL"]))}"><img src="{escape(item["Image"])}"></a>'
+        f'<div class="product-card__bottom"><span class="product-item__camecase-price">{escape(item["Price"])}</span></div>'
+        f'</section>'
+    )
+
+
+def asos_tile(item):
+    return (
+        f'<article class="productTile_U0clN" id="product-{zlib.crc32(item["URL"].encode("utf-8"))}">'
+        f'<a class="productLink_KM4PI" href="{escape(item["URL"])}">'
+        f'<div class="productHeroContainer_dVvdX"><img src="{escape(item["Image"])}" alt=""></div>'
+        f'<div class="productInfo_OdZ_b"><p class="productDescription_sryaw">{escape(item["Name"])}</p>'
+        f'<p class="container_s8SSI"><span class="price__B9LP">{escape(item["Price"])}</span></p></div>'
+        f'</a></article>'
+    )
+
+
+def boohoo_tile(item):
+    return (
+        f'<section class="b-product_tile">'
+        f'<div class="b-product_tile-image"><img src="{escape(item["Image"])}" alt="{escape(item["Name"])}"></div>'
+        f'<h3 class="b-product_tile-title"><a href="{escape(path_of(item["URL"]))}">{escape(item["Name"])}</a></h3>'
+        f'<div class="b-price"><span class="b-price-item m-new">{escape(item["Price"])}</span></div>'
+        f'</section>'
+    )
+
+
+def page_html(site, tiles):
+    body = "\n".join(tiles)
+    if site == "shein":
+        body = f'<div class="thrifty-find-products">\n{body}\n</div>'
+    elif site == "asos":
+        body = f'<section class="listingPage_HfNlp"><div class="productTiles">\n{body}\n</div></section>'
+    else:
+        body = f'<div class="b-product_grid">\n{body}\n</div><a class="js-load-more" href="#">Load more</a>'
+    # Some page chrome so the tiles are not the whole document
+    links = "".join(f'<li><a href="/c/{j}">Item {j}</a></li>' for j in range(20))
+    chrome = "\n".join(f'<nav class="menu"><ul>{links}</ul></nav>' for _ in range(10))
+    return f"<!DOCTYPE html>\n<html><head><title>{site}</title></head><body>\n{chrome}\n{body}\n</body></html>\n"
+
+
+TILES = {"shein": shein_tile, "asos": asos_tile, "boohoo": boohoo_tile}
+
+
+def build(tiles_per_page=30, pages=2, fixtures_dir=HERE):
+    for site, source in SOURCES.items():
+        with open(source, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        os.makedirs(os.path.join(fixtures_dir, site), exist_ok=True)
+        for page in range(1, pages + 1):
+            chunk = items[(page - 1) * tiles_per_page:page * tiles_per_page]
+            if not chunk:
+                break
+            with open(os.path.join(fixtures_dir, site, f"page-{page}.html"), "w", encoding="utf-8") as f:
+                f.write(page_html(site, [TILES[site](item) for item in chunk]))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild the fixture listing pages.")
+    parser.add_argument("--tiles", type=int, default=30, help="Product tiles per page")
+    parser.add_argument("--pages", type=int, default=2, help="Pages per site")
+    parser.add_argument("--fixtures-dir", default=HERE)
+    args = parser.parse_args()
+    build(args.tiles, args.pages, args.fixtures_dir)
@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+
+# The app's catalog module reads the NDJSON files the crawler writes; the crawler
+# reuses its reader rather than keeping a copy in step with it.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "final project"))
+
+from catalog import iter_ndjson  # noqa: E402
+
+# ================================
+# Streaming Output and Checkpoints
+# ================================
+#
+# Products are appended to an NDJSON file (one JSON object per line) as soon as a
+# listing page is done, and a small checkpoint file records which pages are complete.
+# After a crash, --resume skips the completed pages and the product URLs already in
+# the NDJSON file.
+
+
+class NDJSONWriter:
+    """
+    Appends products to an NDJSON file, flushing after every batch.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+        self.count = 0
+
+    def write(self, products):
+        for product in products:
+            self.file.write(json.dumps(product, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.count += len(products)
+
+    def close(self):
+        self.file.close()
+
+
+class Checkpoint:
+    """
+    Records the listing pages of a site whose products have been written.
+    Saved atomically after every page so a crash never leaves a partial checkpoint.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+
+    @classmethod
+    def load(cls, path):
+        checkpoint = cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                checkpoint.completed = set(json.load(f).get("completed_pages", []))
+        except FileNotFoundError:
+            pass
+        return checkpoint
+
+    def __contains__(self, page_url):
+        return page_url in self.completed
+
+    def mark(self, page_url):
+        self.completed.add(page_url)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"completed_pages": sorted(self.completed)}, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.completed = set()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def checkpoint_path(output_file):
+    return os.path.splitext(output_file)[0] + ".checkpoint.json"
+
+
+def delta_path(output_file):
+    return os.path.splitext(output_file)[0] + ".delta.ndjson"
@@ -0,0 +1,391 @@
+import argparse
+import logging
+import multiprocessing
+import os
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing.util import Finalize
+from urllib.parse import urlsplit
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from crawl_state import CrawlState
+from output import Checkpoint, NDJSONWriter, checkpoint_path, delta_path, iter_ndjson
+from sites import SITES
+
+# ================================
+# Configuration and Setup
+# ================================
+
+logging.basicConfig(
+    filename='crawler.log',
+    filemode='a',
+    format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/91.0.4472.124 Safari/537.36"
+)
+
+# Listing pages fetched at the same time per domain (default 1)
+DOMAIN_LIMITS = {
+    "www.asos.com": 2,
+    "us.shein.com": 2,
+    "www.boohoo.com": 2,
+}
+
+STATE_DB = "crawl_state.db"  # Fingerprints and last-seen times of every crawled product
+
+PAGE_TIMEOUT = 20    # Seconds to wait for product tiles to appear
+SETTLE_TIMEOUT = 10  # Seconds to wait for lazy-loaded tiles to stop changing
+
+# ================================
+# Browser Workers
+# ================================
+
+# One browser per worker process, created by the pool initializer
+_driver = None
+
+
+def initialize_webdriver(headless=True):
+    """
+    Initializes a Chrome WebDriver with the options shared by all sites.
+    """
+    options = webdriver.ChromeOptions()
+    options.add_argument(f"user-agent={USER_AGENT}")
+    if headless:
+        options.add_argument("--headless=new")
+
+    # Images are not needed: only their src attributes are extracted
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+    # Make headless mode less detectable
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+
+    driver = webdriver.Chrome(options=options)
+    driver.execute_cdp_cmd(
+        "Page.addScriptToEvaluateOnNewDocument",
+        {"source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"},
+    )
+    return driver
+
+
+def _init_worker(headless):
+    global _driver
+    _driver = initialize_webdriver(headless=headless)
+    # Quit the browser when the worker process exits
+    Finalize(_driver, _driver.quit, exitpriority=10)
+    logging.info("WebDriver initialized successfully.")
+
+
+class tiles_settled:
+    """
+    Wait condition: the page has finished loading and the number of product tiles
+    and the page height stayed the same between two polls (lazy loading is done).
+    Scrolls to the bottom on every poll to trigger lazy loading.
+    """
+
+    def __init__(self, selector):
+        self.selector = selector
+        self.last = None
+
+    def __call__(self, driver):
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        if driver.execute_script("return document.readyState") != "complete":
+            return False
+        state = (
+            len(driver.find_elements(By.CSS_SELECTOR, self.selector)),
+            driver.execute_script("return document.body.scrollHeight"),
+        )
+        settled = state == self.last and state[0] > 0
+        self.last = state
+        return settled
+
+
+def wait_for_tiles(driver, site, url):
+    """
+    Waits for the first product tiles, then for lazy loading to settle.
+    """
+    WebDriverWait(driver, PAGE_TIMEOUT).until(
+        lambda d: d.find_elements(By.CSS_SELECTOR, site.TILE_SELECTOR)
+    )
+    try:
+        WebDriverWait(driver, SETTLE_TIMEOUT, poll_frequency=0.5).until(tiles_settled(site.TILE_SELECTOR))
+    except Exception as e:
+        logging.warning(f"Tiles on {url} did not settle, extracting what is there: {e}")
+
+
+def crawl_page(site_name, url):
+    """
+    Loads one listing page in this worker's browser and extracts its products.
+    Runs inside a pool worker process.
+    """
+    site = SITES[site_name]
+    driver = _driver
+    driver.get(url)
+    wait_for_tiles(driver, site, url)
+    return site.extract(driver.page_source)
+
+
+def crawl_by_clicking(site_name, start_url, pages):
+    """
+    Fallback for categories whose site ignores page_url(): loads the first page and
+    clicks the site's pagination button or "Load more" link for each further page.
+    Returns the products extracted after each step (with "Load more", every list
+    also holds the earlier pages). Stops early when there is no control to click or
+    the page does not change. Runs inside a pool worker process.
+    """
+    site = SITES[site_name]
+    driver = _driver
+    driver.get(start_url)
+    wait_for_tiles(driver, site, start_url)
+    results = [site.extract(driver.page_source)]
+
+    for page in range(2, pages + 1):
+        try:
+            control = WebDriverWait(driver, PAGE_TIMEOUT).until(
+                EC.element_to_be_clickable(site.next_page_locator(page))
+            )
+            driver.execute_script("arguments[0].scrollIntoView(true);", control)
+            control.click()
+            WebDriverWait(driver, PAGE_TIMEOUT, poll_frequency=0.5).until(
+                lambda d: site.extract(d.page_source) != results[-1]
+            )
+        except TimeoutException:
+            logging.warning(f"{site_name}: page {page} of {start_url} could not be reached by clicking.")
+            break
+        wait_for_tiles(driver, site, start_url)
+        results.append(site.extract(driver.page_source))
+    return results
+
+
+# ================================
+# Scheduling
+# ================================
+
+
+class RepeatedPageError(Exception):
+    """
+    A listing page came back with the products of page 1: the site ignores ?page=N.
+    """
+
+
+def build_jobs(site_names, max_pages=None, base_url=None):
+    """
+    One job (site, page URL, page, category URL) per listing page of every category.
+    With base_url set, category URLs are replaced by the fixture server's /<site>/ path.
+    """
+    jobs = []
+    for site_name in site_names:
+        site = SITES[site_name]
+        start_urls = [f"{base_url.rstrip('/')}/{site_name}/"] if base_url else site.START_URLS
+        for start_url in start_urls:
+            for page in range(1, (max_pages or site.MAX_PAGES) + 1):
+                jobs.append((site_name, site.page_url(start_url, page), page, start_url))
+    return jobs
+
+
+def run(jobs, workers=None, headless=True, domain_limits=DOMAIN_LIMITS, on_products=None, on_error=None,
+        seen_urls=None):
+    """
+    Fans the jobs out over a pool of browser worker processes, never running more
+    than domain_limits[domain] pages of the same domain at once.
+    on_products(site_name, url, page, products) is called as each page completes,
+    with products whose URL was not seen before for that site (seen_urls can be
+    pre-filled with {site_name: set(urls)}); on_error(site_name, url, page, error)
+    is called for pages that failed.
+
+    A later page whose first product is the first product of its category's page 1
+    means the site ignored page_url(): that is reported as a RepeatedPageError, the
+    category's remaining pages are dropped and one job clicks through its pages
+    instead (see crawl_by_clicking). Pages that finish before their page 1 wait for
+    it; with --resume, pages whose page 1 was crawled before are not checked.
+    Returns {site_name: number of new products}.
+    """
+    if not jobs:
+        return {}
+    workers = workers or min(len(jobs), multiprocessing.cpu_count()) or 1
+    queues = defaultdict(deque)  # domain -> pending jobs
+    last_page = defaultdict(int)  # (site_name, category URL) -> pages to crawl
+    for job in jobs:
+        queues[urlsplit(job[1]).netloc].append(job)
+        last_page[job[0], job[3]] = max(last_page[job[0], job[3]], job[2])
+
+    in_flight = defaultdict(int)  # domain -> running jobs
+    futures = {}
+    counts = defaultdict(int)
+    seen_urls = defaultdict(set, seen_urls or {})
+    first_tiles = {}          # (site_name, category URL) -> URL of the first product on page 1
+    waiting = defaultdict(list)  # (site_name, category URL) -> [(job, products)] done before page 1
+    repeating = set()         # categories whose site ignores page_url()
+
+    def submit_ready(executor):
+        for domain, queue in queues.items():
+            while queue and in_flight[domain] < domain_limits.get(domain, 1):
+                job = queue.popleft()
+                site_name, url, page, start_url = job
+                if page is None:
+                    future = executor.submit(crawl_by_clicking, site_name, start_url, last_page[site_name, start_url])
+                elif (site_name, start_url) in repeating:
+                    continue
+                else:
+                    future = executor.submit(crawl_page, site_name, url)
+                futures[future] = (domain, job)
+                in_flight[domain] += 1
+
+    def save(site_name, url, page, products):
+        # Remove duplicates within the site, e.g. tiles repeated across pages
+        new_products = []
+        for product in products:
+            if product["URL"] not in seen_urls[site_name]:
+                seen_urls[site_name].add(product["URL"])
+                new_products.append(product)
+        counts[site_name] += len(new_products)
+
+        logging.info(f"{site_name} page {page}: extracted {len(products)} products ({url}).")
+        print(f"{site_name} page {page}: extracted {len(products)} products.")
+        if on_products:
+            on_products(site_name, url, page, new_products)
+
+    def page_done(job, products):
+        site_name, url, page, start_url = job
+        category = (site_name, start_url)
+        if page is None:
+            # Clicked through: the first list is page 1, which was saved already
+            for number, page_products in enumerate(products[1:], 2):
+                save(site_name, SITES[site_name].page_url(start_url, number), number, page_products)
+            return
+        if category in repeating:
+            return
+        if page > 1 and category not in first_tiles:
+            waiting[category].append((job, products))
+            return
+        if page == 1:
+            first_tiles[category] = products[0]["URL"] if products else None
+        elif products and products[0]["URL"] == first_tiles[category]:
+            error = RepeatedPageError(f"page {page} shows the products of page 1, the site ignores ?page=N")
+            logging.error(f"Error crawling {url}: {error}")
+            print(f"Error crawling {url}: {error}")
+            if on_error:
+                on_error(site_name, url, page, error)
+            repeating.add(category)
+            print(f"Crawling {start_url} by clicking through its pages instead.")
+            queues[urlsplit(url).netloc].appendleft((site_name, start_url, None, start_url))
+            return
+        save(site_name, url, page, products)
+        if page == 1:
+            for waiting_job, waiting_products in waiting.pop(category, []):
+                page_done(waiting_job, waiting_products)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(headless,)) as executor:
+        submit_ready(executor)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                domain, job = futures.pop(future)
+                in_flight[domain] -= 1
+                try:
+                    products = future.result()
+                except Exception as e:
+                    site_name, url, page, _ = job
+                    logging.error(f"Error crawling {url}: {e}")
+                    print(f"Error crawling {url}: {e}")
+                    if on_error:
+                        on_error(site_name, url, page, e)
+                    continue
+                page_done(job, products)
+            submit_ready(executor)
+
+    # Pages whose page 1 is not part of this run (--resume)
+    for category_pages in waiting.values():
+        for (site_name, url, page, _), products in category_pages:
+            save(site_name, url, page, products)
+    return dict(counts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl product listings with a pool of headless browsers.")
+    parser.add_argument("sites", nargs="*", default=list(SITES), choices=list(SITES), help="Sites to crawl")
+    parser.add_argument("--workers", type=int, default=None, help="Browser processes (default: one per core)")
+    parser.add_argument("--max-pages", type=int, default=None, help="Listing pages per category URL")
+    parser.add_argument("--base-url", default=None,
+                        help="Crawl a fixture server (see fixture_server.py) instead of the live sites")
+    parser.add_argument("--no-headless", action="store_true", help="Show the browser windows")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted crawl: skip completed pages and captured URLs")
+    parser.add_argument("--state-db", default=STATE_DB, help="Crawl state database (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    jobs = build_jobs(args.sites, max_pages=args.max_pages, base_url=args.base_url)
+
+    # Products are streamed to <site>.ndjson as pages complete, with a checkpoint per site.
+    # New, changed and vanished products also go to <site>.delta.ndjson.
+    state = CrawlState(args.state_db)
+    writers, deltas, checkpoints, seen_urls, started = {}, {}, {}, {}, {}
+    for site_name in args.sites:
+        output_file = SITES[site_name].OUTPUT_FILE
+        checkpoints[site_name] = Checkpoint.load(checkpoint_path(output_file))
+        if args.resume and os.path.exists(output_file):
+            seen_urls[site_name] = {product["URL"] for product in iter_ndjson(output_file)}
+            print(f"Resuming {site_name}: {len(checkpoints[site_name].completed)} pages, "
+                  f"{len(seen_urls[site_name])} products already captured.")
+        else:
+            checkpoints[site_name].clear()
+        writers[site_name] = NDJSONWriter(output_file, append=args.resume)
+        deltas[site_name] = NDJSONWriter(delta_path(output_file), append=args.resume)
+        started[site_name] = state.begin(site_name, resume=args.resume)
+
+    if args.resume:
+        jobs = [job for job in jobs if job[1] not in checkpoints[job[0]]]
+
+    changes = defaultdict(lambda: defaultdict(int))
+    failed_sites = set()
+
+    def save_page(site_name, url, page, products):
+        # Products first, then the checkpoint: a crash in between only re-crawls the page
+        writers[site_name].write(products)
+        events = state.observe(site_name, products)
+        deltas[site_name].write(events)
+        for event in events:
+            changes[site_name][event["change"]] += 1
+        checkpoints[site_name].mark(url)
+
+    def page_failed(site_name, url, page, error):
+        failed_sites.add(site_name)
+
+    try:
+        counts = run(jobs, workers=args.workers, headless=not args.no_headless,
+                     on_products=save_page, on_error=page_failed, seen_urls=seen_urls)
+
+        # Vanished products can only be told apart from failed pages after a complete crawl
+        for site_name in args.sites:
+            if site_name in failed_sites:
+                print(f"Some {site_name} pages failed: not checking for vanished products, re-run with --resume.")
+                continue
+            events = state.finish(site_name, started[site_name])
+            deltas[site_name].write(events)
+            changes[site_name]["vanished"] += len(events)
+    finally:
+        for writer in list(writers.values()) + list(deltas.values()):
+            writer.close()
+        state.close()
+
+    for site_name in args.sites:
+        output_file = SITES[site_name].OUTPUT_FILE
+        summary = ", ".join(f"{change}: {changes[site_name][change]}" for change in ("new", "changed", "vanished"))
+        logging.info(f"{counts.get(site_name, 0)} products saved to {output_file} ({summary})")
+        print(f"{counts.get(site_name, 0)} products saved to {output_file} ({summary})")
+
+if __name__ == "__main__":
+    main()
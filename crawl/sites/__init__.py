@@ -0,0 +1,18 @@
+from sites import asos, boohoo, shein
+
+# ================================
+# Site Registry
+# ================================
+#
+# Each site module provides:
+#   NAME, DOMAIN, BASE_URL  - identification; DOMAIN is used for concurrency limits
+#   START_URLS              - category listing pages to crawl
+#   MAX_PAGES               - listing pages per category URL
+#   OUTPUT_FILE             - NDJSON file the runner streams the site's products to
+#   TILE_SELECTOR           - CSS selector of a product tile, used for waiting
+#   page_url(url, page)     - URL of listing page `page` (1-based) of a category
+#   next_page_locator(page) - (By strategy, selector) of the control that shows page `page`
+#                             (pagination button or "Load more"), for sites that ignore page_url
+#   extract(html)           - list of product dicts (Name, Price, URL, Image)
+
+SITES = {site.NAME: site for site in (shein, asos, boohoo)}
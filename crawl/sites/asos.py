@@ -0,0 +1,78 @@
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+from sites.common import absolute_image_url, set_query_param
+from sites.extract import TileSelectors, extract_tiles, has_class
+
+NAME = "asos"
+DOMAIN = "www.asos.com"
+BASE_URL = "https://www.asos.com"
+START_URLS = ["https://www.asos.com/women/new-in/cat/?cid=27108"]
+MAX_PAGES = 5
+OUTPUT_FILE = "asos_new_in.ndjson"
+TILE_SELECTOR = 'article[class^="productTile_"]'
+
+SELECTORS = TileSelectors(
+    tile="//article[starts-with(@class, 'productTile_')]",
+    name=f"string((.//p[{has_class('productDescription_sryaw')}])[1])",
+    price=f"string((.//span[{has_class('price__B9LP')}])[1])",
+    url="string((.//a[@href])[1]/@href)",
+    image=f"string(((.//div[{has_class('productHeroContainer_dVvdX')}])[1]//img)[1]/@src)",
+)
+
+
+def page_url(url, page):
+    return set_query_param(url, "page", page)
+
+
+def next_page_locator(page):
+    """
+    The "Load more" link, used when ?page=N is ignored: it appends the next page.
+    """
+    return "css selector", 'a[data-auto-id="loadMoreProducts"]'
+
+
+def extract_soup(html):
+    """
+    BeautifulSoup reference implementation of extract(), kept for
+    bench_extract.py to compare speed and output against.
+    """
+    soup = BeautifulSoup(html, 'lxml')
+
+    products = []
+    for product in soup.select(TILE_SELECTOR):  # Matches dynamic class names
+        try:
+            # Extract product name
+            name_tag = product.find('p', {'class': 'productDescription_sryaw'})
+            name = name_tag.text.strip() if name_tag else "No name available"
+
+            # Extract product price
+            price_tag = product.find('span', {'class': 'price__B9LP'})
+            price = price_tag.text.strip() if price_tag else "No price available"
+
+            # Extract product URL
+            url_tag = product.find('a', href=True)
+            url = url_tag['href'] if url_tag else "No URL available"
+
+            # Extract product image URL
+            img_container = product.find('div', {'class': 'productHeroContainer_dVvdX'})
+            img_tag = img_container.find('img') if img_container else None
+            image_url = img_tag['src'] if img_tag and 'src' in img_tag.attrs else "No image available"
+
+            products.append({
+                "Name": name,
+                "Price": price,
+                "URL": urljoin(BASE_URL, url),
+                "Image": absolute_image_url(image_url, BASE_URL)
+            })
+        except Exception as e:
+            print(f"Error extracting product details: {e}")
+            continue
+    return products
+
+
+def extract(html):
+    """
+    Extracts the products of a "New In" listing page.
+    """
+    return extract_tiles(html, SELECTORS, BASE_URL)
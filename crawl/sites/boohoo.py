@@ -0,0 +1,83 @@
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+from sites.common import absolute_image_url, set_query_param
+from sites.extract import TileSelectors, extract_tiles, has_class
+
+NAME = "boohoo"
+DOMAIN = "www.boohoo.com"
+BASE_URL = "https://www.boohoo.com"
+START_URLS = ["https://www.boohoo.com/mens-promotions/mens-flash-promo"]
+MAX_PAGES = 5
+OUTPUT_FILE = "boohoo_new_in.ndjson"
+TILE_SELECTOR = "section.b-product_tile"
+
+SELECTORS = TileSelectors(
+    tile=f"//section[{has_class('b-product_tile')}]",
+    name=f"normalize-space((.//h3[{has_class('b-product_tile-title')}])[1])",
+    price=f"string((.//span[{has_class('b-price-item')} and {has_class('m-new')}])[1])",
+    url=f"string(((.//h3[{has_class('b-product_tile-title')}])[1]//a[@href])[1]/@href)",
+    image="string((.//img[@alt])[1]/@src)",
+)
+
+
+def page_url(url, page):
+    return set_query_param(url, "page", page)
+
+
+def next_page_locator(page):
+    """
+    The "Load more" link, used when ?page=N is ignored: it appends the next page.
+    """
+    return "css selector", "a.js-load-more"
+
+
+def extract_product_details(product_section):
+    """
+    Extracts product details from a product section.
+    """
+    # Extract Product Name
+    name_tag = product_section.find('h3', class_='b-product_tile-title')
+    name = name_tag.get_text(strip=True) if name_tag else "No name available"
+
+    # Extract Product URL
+    url_tag = name_tag.find('a', href=True) if name_tag else None
+    relative_url = url_tag['href'] if url_tag else ""
+
+    # Extract Product Image URL
+    img_tag = product_section.find('img', alt=True)
+    image_url = img_tag['src'] if img_tag and 'src' in img_tag.attrs else "No image available"
+
+    # Extract Current Price
+    price_new_tag = product_section.find('span', class_='b-price-item m-new')
+    price_new = price_new_tag.get_text(strip=True) if price_new_tag else "No price available"
+
+    return {
+        "Name": name,
+        "Price": price_new,
+        "URL": urljoin(BASE_URL, relative_url),
+        "Image": absolute_image_url(image_url, BASE_URL)
+    }
+
+
+def extract_soup(html):
+    """
+    BeautifulSoup reference implementation of extract(), kept for
+    bench_extract.py to compare speed and output against.
+    """
+    soup = BeautifulSoup(html, 'lxml')
+
+    products = []
+    for product_section in soup.select(TILE_SELECTOR):
+        try:
+            products.append(extract_product_details(product_section))
+        except Exception as e:
+            print(f"Error extracting product details: {e}")
+    return products
+
+
+def extract(html):
+    """
+    Extracts the products of a promotions listing page.
+    """
+    return extract_tiles(html, SELECTORS, BASE_URL)
@@ -0,0 +1,22 @@
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+def absolute_image_url(image_url, base_url):
+    """
+    Fixes protocol-relative ("//...") and site-relative ("/...") image URLs.
+    """
+    if image_url.startswith("//"):
+        return "https:" + image_url
+    if image_url.startswith("/"):
+        return urljoin(base_url, image_url)
+    return image_url
+
+
+def set_query_param(url, name, value):
+    """
+    Returns `url` with the query parameter `name` set to `value`.
+    """
+    parts = urlsplit(url)
+    query = [(key, val) for key, val in parse_qsl(parts.query, keep_blank_values=True) if key != name]
+    query.append((name, str(value)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
@@ -0,0 +1,71 @@
+from urllib.parse import urljoin
+
+from lxml import etree, html as lxml_html
+
+from sites.common import absolute_image_url
+
+# ================================
+# Tile Extraction
+# ================================
+#
+# Sites declare their product tile and field selectors as XPath expressions. They are
+# compiled once at import time and evaluated directly on the lxml tree, instead of
+# building a BeautifulSoup tree and running find()/select() per tile.
+
+DEFAULTS = {
+    "Name": "No name available",
+    "Price": "No price available",
+    "URL": "",
+    "Image": "No image available",
+}
+
+
+def has_class(name):
+    """
+    XPath predicate matching elements whose class list contains `name`
+    (what BeautifulSoup's class_=name does).
+    """
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class TileSelectors:
+    """
+    Precompiled XPath selectors for one site's listing pages.
+
+    `tile` selects the product tiles in the document, each field expression is
+    evaluated relative to a tile and must return a string. Tiles where one of the
+    `required` fields is empty are skipped.
+    """
+
+    def __init__(self, tile, name, price, url, image, required=()):
+        self.tile = etree.XPath(tile)
+        self.fields = {
+            "Name": etree.XPath(name, smart_strings=False),
+            "Price": etree.XPath(price, smart_strings=False),
+            "URL": etree.XPath(url, smart_strings=False),
+            "Image": etree.XPath(image, smart_strings=False),
+        }
+        self.required = required
+
+
+def extract_tiles(page_source, selectors, base_url):
+    """
+    Extracts the product dicts (Name, Price, URL, Image) from a listing page.
+    """
+    if not page_source:
+        return []
+    document = lxml_html.document_fromstring(page_source)
+
+    products = []
+    for tile in selectors.tile(document):
+        values = {field: xpath(tile).strip() for field, xpath in selectors.fields.items()}
+        if any(not values[field] for field in selectors.required):
+            continue
+
+        products.append({
+            "Name": values["Name"] or DEFAULTS["Name"],
+            "Price": values["Price"] or DEFAULTS["Price"],
+            "URL": urljoin(base_url, values["URL"]),
+            "Image": absolute_image_url(values["Image"] or DEFAULTS["Image"], base_url),
+        })
+    return products
@@ -0,0 +1,74 @@
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+from sites.common import absolute_image_url, set_query_param
+from sites.extract import TileSelectors, extract_tiles, has_class
+
+NAME = "shein"
+DOMAIN = "us.shein.com"
+BASE_URL = "https://shein.com"
+START_URLS = ["https://us.shein.com/super-deals"]
+MAX_PAGES = 5
+OUTPUT_FILE = "shein.ndjson"
+TILE_SELECTOR = "div.thrifty-find-products section"
+
+SELECTORS = TileSelectors(
+    tile=f"(//div[{has_class('thrifty-find-products')}])[1]//section",
+    name="string(@aria-label)",
+    price=f"string((.//span[{has_class('product-item__camecase-price')}])[1])",
+    url="string((.//a)[1]/@href)",
+    image="string((.//img)[1]/@src)",
+    required=("Name", "URL", "Price"),
+)
+
+
+def page_url(url, page):
+    return set_query_param(url, "page", page)
+
+
+def next_page_locator(page):
+    """
+    The pagination button of listing page `page`, used when ?page=N is ignored.
+    """
+    return "xpath", f"//span[{has_class('sui-pagination__inner')} and normalize-space()='{page}']"
+
+
+def extract_soup(html):
+    """
+    BeautifulSoup reference implementation of extract(), kept for
+    bench_extract.py to compare speed and output against.
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    container = soup.find('div', {'class': 'thrifty-find-products'})
+    if container is None:
+        return []
+
+    products = []
+    for section in container.find_all('section'):
+        try:
+            # Extract product name, URL and price
+            name = section['aria-label']
+            url = section.a['href']
+            price = section.find('span', {'class': 'product-item__camecase-price'}).text
+
+            # Extract product image URL
+            img_tag = section.find('img')  # Locate the <img> tag
+            image_url = img_tag['src'] if img_tag else "No image available"  # Get the src attribute
+
+            products.append({
+                "Name": name,
+                "Price": price.strip(),
+                "URL": urljoin(BASE_URL, url),
+                "Image": absolute_image_url(image_url, BASE_URL)
+            })
+        except Exception as e:
+            print(f"Error extracting product details: {e}")
+            continue
+    return products
+
+
+def extract(html):
+    """
+    Extracts the products of a super-deals listing page.
+    """
+    return extract_tiles(html, SELECTORS, BASE_URL)
@@ -1,58 +1,251 @@
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, Response, g, has_request_context, request, render_template, jsonify, send_file
 from whoosh import index
-from whoosh.qparser import QueryParser
+from autocomplete import AUTOCOMPLETE_FILE, Autocomplete
+from catalog import DATA_FILES, image_key, iter_products, resolve_image
+from metrics import Registry, SlowLog, stage, start_timing, stop_timing
+from scores import ScoreStore
+from search_service import DEFAULT_BOOST, FACETS, CursorError, SearchService
+from prices import load_rates
+from ranking import SuggestionRanking
+from similar import SIMILAR_FILE, TOP_N as SIMILAR_TOP_N, SimilarItems
+from spelling import SPELLING_FILE, Speller
+from thumbnails import ThumbnailCache
+from versions import CurrentVersion, current_dir
+from visual import HASH_FILE, VisualIndex
+import atexit
+import math
 import os
-import json
+import threading
+import time
 
 app = Flask(__name__)
 
-# Load the Whoosh index
-INDEX_DIR = "index"
-if not os.path.exists(INDEX_DIR):
-    print(f"Index directory '{INDEX_DIR}' does not exist. Please run 'index.py' to create it.")
-    ix = None
-else:
-    try:
-        ix = index.open_dir(INDEX_DIR)
-    except Exception as e:
-        print(f"Error opening index: {e}")
-        ix = None
+# ================================
+# Instrumentation
+# ================================
+#
+# Every request is timed per stage (see metrics.stage: lock, refresh, popularity,
+# parse, search, hits, facets, spelling, render; the rest is "other"). Requests slower
+# than SLOW_REQUEST_MS, and requests that hit an error, are appended to
+# SLOW_REQUEST_LOG as JSON lines. Counters and latency histograms are served in the
+# Prometheus text format on /metrics; METRICS=0 turns all of it off. The values
+# are per process: with several workers, each one is scraped (or summed) separately.
+METRICS = os.environ.get("METRICS", "1") != "0"
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 500))
+SLOW_REQUEST_LOG = os.environ.get("SLOW_REQUEST_LOG", "data/slow_requests.log")
+
+metrics = Registry()
+requests_total = metrics.counter("velouria_requests_total", "HTTP requests.", ("route", "method", "status"))
+request_seconds = metrics.histogram("velouria_request_seconds", "HTTP request latency.", ("route",))
+stage_seconds = metrics.histogram("velouria_stage_seconds", "Time spent per request stage.", ("route", "stage"))
+errors_total = metrics.counter("velouria_errors_total", "Errors, by where they happened.", ("where",))
+votes_total = metrics.counter("velouria_votes_total", "Likes and dislikes recorded.", ("vote",))
+slow_log = SlowLog(SLOW_REQUEST_LOG, SLOW_REQUEST_MS)
+
+
+def report_error(where, e):
+    """
+    Prints an error and counts it; the request it happened in is written to the slow request log.
+    """
+    print(f"Error {where}: {e}")
+    errors_total.inc(where)
+    if METRICS and has_request_context():
+        g.error = f"{where}: {e}"
+
+
+def start_request():
+    g.request_start = time.perf_counter()
+    g.timing_token = start_timing()
+
+
+def finish_request(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    requests_total.inc(route, request.method, str(response.status_code))
+    g.response_status = response.status_code
+    return response
+
+
+def record_request(exception):
+    start = g.pop("request_start", None)
+    if start is None:
+        return
+    seconds = time.perf_counter() - start
+    timings = stop_timing(g.pop("timing_token"))
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    status = g.pop("response_status", None)
+    if status is None:  # The response was never finalized
+        status = 500
+        requests_total.inc(route, request.method, "500")
+    if exception is not None:
+        report_error("unhandled", exception)
+
+    request_seconds.observe(seconds, route)
+    for name, value in timings.items():
+        stage_seconds.observe(value, route, name)
+    stage_seconds.observe(max(seconds - sum(timings.values()), 0.0), route, "other")
+    slow_log.record(request.method, request.full_path.rstrip("?"), status, seconds, timings, g.pop("error", None))
+
+
+if METRICS:
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(record_request)
+
+
+@metrics.collector
+def service_metrics():
+    families = []
+    if search_service:
+        stats = search_service.stats()
+        caches = ["query_cache", "ordering_cache", "result_cache", "facet_cache"]
+        families += [
+            ("velouria_index_generation", "gauge", "Generation of the open index.", [({}, stats["generation"])]),
+            ("velouria_index_refreshes_total", "counter", "Searcher refreshes after index updates.",
+             [({}, stats["refreshes"])]),
+            ("velouria_cache_hits_total", "counter", "Search cache hits.",
+             [({"cache": cache}, stats[cache]["hits"]) for cache in caches]),
+            ("velouria_cache_misses_total", "counter", "Search cache misses.",
+             [({"cache": cache}, stats[cache]["misses"]) for cache in caches]),
+            ("velouria_cache_entries", "gauge", "Entries in the search caches.",
+             [({"cache": cache}, stats[cache]["size"]) for cache in caches]),
+        ]
+    if thumbnails is None:
+        return families
+    thumbnail_stats = thumbnails.stats()
+    families += [
+        ("velouria_thumbnail_requests_total", "counter", "Thumbnail cache lookups.",
+         [({"result": "hit"}, thumbnail_stats["hits"]), ({"result": "miss"}, thumbnail_stats["misses"])]),
+        ("velouria_thumbnail_bytes", "gauge", "Size of the thumbnail cache.", [({}, thumbnail_stats["bytes"])]),
+    ]
+    return families
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    if not METRICS:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# ================================
+# App State
+# ================================
+#
+# create_app() loads the index, the product details, the vote store and the
+# suggestion ranking; warm_up() loads the tables built by index.py and answers the
+# most common searches. serve.py runs both once and then forks its workers, so the
+# read-only state is shared copy-on-write; only votes are coordinated between
+# processes, through the score database.
+INDEX_DIR = os.environ.get("INDEX_DIR", "index")
+# Like/dislike scores, keyed by product URL; SCORES_DB points e.g. load tests at a scratch copy
+SCORES_DB = os.environ.get("SCORES_DB", "data/scores.db")
+WARM_UP_QUERIES = ["", "dress", "top", "jeans"]  # "" is the front page
+
+ix = None
+index_version = None  # Follows the published version of a versioned index, see versions.py
+search_service = None
+products = {}
+score_store = None
+ranking = None
+thumbnails = None
+warm_up_seconds = None  # Set when warm_up() has finished
+
+RESULTS_PER_PAGE = 24
+MAX_PAGELEN = 100
+
+
+def finite_arg(name, default=None):
+    """
+    A float query parameter; values that don't parse and nan/inf are ignored.
+    """
+    value = request.args.get(name, default, type=float)
+    return value if value is None or math.isfinite(value) else default
+
+
+def search_args():
+    """
+    Reads the search parameters shared by the HTML page and the JSON API.
+    """
+    return {
+        "query_string": request.args.get("query", "").strip(),
+        "sort": request.args.get("price", "").strip(),
+        "min_price": finite_arg("min_price"),  # CHF
+        "max_price": finite_arg("max_price"),  # CHF
+        "page": max(request.args.get("page", 1, type=int), 1),
+        "pagelen": max(min(request.args.get("pagelen", RESULTS_PER_PAGE, type=int), MAX_PAGELEN), 1),
+        "boost": request.args.get("boost", DEFAULT_BOOST, type=float),  # Popularity boost, 0 = text relevance only
+        # ?brand=Monki&brand=ONLY&source=asos: any of the brands, and from asos
+        "facets": {facet: request.args.getlist(facet) for facet in FACETS if request.args.getlist(facet)},
+    }
+
+
+def facet_counts(args, page):
+    # Counts for the query that was actually searched (it may have been spell-corrected)
+    return search_service.facet_counts(page["query"], args["min_price"], args["max_price"], args["facets"])
+
 
 @app.route("/", methods=["GET"])
 def search():
-    query_string = request.args.get("query", "").strip()
-    price_filter = request.args.get("price", "").strip()
-    results = []
+    args = search_args()
+    page = {"hits": [], "total": 0, "page": args["page"], "pagelen": args["pagelen"], "next_cursor": None}
+    counts = {}
 
-    if ix:
+    if search_service:
         try:
-            with ix.searcher() as searcher:
-                parser = QueryParser("name", ix.schema)
-                query = parser.parse(query_string) if query_string else parser.parse("*")
-                search_results = searcher.search(query, limit=100)
-
-                results = []
-                for hit in search_results:
-                    image_url = hit.get("image", "https://via.placeholder.com/150")
-                    
-                    # Replace Shein placeholder images with custom placeholder
-                    if "bg-grey-solid-color" in image_url:
-                        image_url = "{{ url_for('static', filename='VELOURIA.png') }}"
-
-                    results.append({
-                        "name": hit["name"],
-                        "price": hit.get("price", "N/A"),
-                        "url": hit.get("url", "#"),
-                        "image": image_url,
-                    })
-
-                if price_filter:
-                    results.sort(key=lambda item: float(item["price"].strip("$").replace("CHF", "")),
-                                 reverse=price_filter == "high-low")
+            page = search_service.search_page(**args, speller=speller.get())
+            counts = facet_counts(args, page)
         except Exception as e:
-            print(f"Error during search: {e}")
+            report_error("during search", e)
+
+    with stage("render"):
+        return render_template("search.html", results=page["hits"], total=page["total"], page=page["page"],
+                               pagelen=page["pagelen"], has_next=page["next_cursor"] is not None,
+                               query=args["query_string"], price_filter=args["sort"],
+                               min_price=args["min_price"], max_price=args["max_price"],
+                               facet_counts=counts, selected=args["facets"],
+                               original_query=page.get("original_query"), corrected_query=page.get("query"),
+                               suggestion=page.get("suggestion"))
+
+
+@app.route("/api/search", methods=["GET"])
+def api_search():
+    """
+    JSON search API: returns one page of hits, the total number of matches and a
+    `next_cursor` to pass back as ?cursor=... for the following page.
+    """
+    if not search_service:
+        return jsonify({"error": "Index not available"}), 503
+
+    args = search_args()
+    try:
+        page = search_service.search_page(**args, speller=speller.get(), cursor=request.args.get("cursor"))
+        counts = facet_counts(args, page)
+    except CursorError as e:
+        # Malformed, or made for another search or index generation
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        report_error("during search", e)
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "query": args["query_string"],
+        # Set when the query had no matches and its spelling correction was searched instead
+        "corrected_query": page["query"] if "original_query" in page else None,
+        "suggestion": page.get("suggestion"),  # "Did you mean"
+        "total": page["total"],
+        "page": page["page"],
+        "pagelen": page["pagelen"],
+        "results": page["hits"],
+        "next_cursor": page["next_cursor"],
+        "facets": {facet: [{"value": value, "count": count} for value, count in values]
+                   for facet, values in counts.items()},
+    })
 
-    return render_template("search.html", results=results, query=query_string, price_filter=price_filter)
+
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    if not search_service:
+        return jsonify({"error": "Index not available"}), 503
+    return jsonify(dict(search_service.stats(), thumbnails=thumbnails.stats()))
 
 
 @app.route("/like_product", methods=["POST"])
@@ -64,86 +257,131 @@ def like_product():
 def dislike_product():
     product_id = request.form.get("product_id")
     return update_likes(product_id, like=False)
-DATA_FILES = ["data/asos.json", "data/shein.json"]  # Paths to your original data files
 
-def update_likes(product_name, like):
+
+def open_index(index_dir):
+    if not os.path.exists(index_dir):
+        print(f"Index directory '{index_dir}' does not exist. Please run 'index.py' to create it.")
+        return None
+    try:
+        return index.open_dir(current_dir(index_dir))
+    except Exception as e:
+        report_error("opening index", e)
+        return None
+
+
+def load_products(data_files):
+    """
+    Loads the product details from the data files once, keyed by URL.
+    """
+    products = {}
+    for item in iter_products(data_files):
+        # Placeholders (e.g. Shein's grey tile) become "" and show the Velouria logo
+        image_url = resolve_image(item.get("Image"))
+
+        products[item["URL"]] = {
+            "Name": item.get("Name", "No name available"),
+            "Price": item.get("Price", "0"),
+            "URL": item["URL"],
+            "Image": image_url,
+            "Thumbnail": image_key(image_url),
+            "Category": item.get("Category", "Uncategorized")
+        }
+    return products
+
+
+def load_indexed_products(searcher):
+    """
+    The product details of the index `searcher` reads, keyed by URL (products added by
+    delta feeds included), the near-duplicate clusters and the CHF prices in cents
+    index.py assigned them.
+    """
+    products, clusters, prices = {}, {}, {}
+    for fields in searcher.all_stored_fields():
+        image_url = fields.get("image", "")  # Placeholders were resolved to "" by index.py
+        products[fields["url"]] = {
+            "Name": fields.get("name", "No name available"),
+            "Price": fields.get("price", "0"),
+            "URL": fields["url"],
+            "Image": image_url,
+            "Thumbnail": image_key(image_url),
+            "Category": fields.get("category", "Uncategorized")
+        }
+        if "cluster" in fields:
+            clusters[fields["url"]] = fields["cluster"]
+        prices[fields["url"]] = fields.get("price_cents")
+    return products, clusters, prices
+
+
+def load_catalog(searcher=None):
+    """
+    Loads the product details and the suggestion ranking from the index `searcher`
+    reads, or from the data files without an index. SearchService calls it for every
+    index generation it serves, so /suggested follows each publish and delta.
+    """
+    global products, ranking
+    if searcher:
+        # Sorted by the CHF prices search sorts and filters by, converted once by index.py
+        catalog, clusters, prices = load_indexed_products(searcher)
+        ranking = SuggestionRanking(catalog, score_store.scores(), score_store.version(),
+                                    clusters=clusters, price_cents=prices)
+    else:
+        catalog = load_products(DATA_FILES)
+        rates, _ = load_rates(fetch=None)  # Same rates as the last index build, never fetched while serving
+        ranking = SuggestionRanking(catalog, score_store.scores(), score_store.version(), rates=rates)
+    products = catalog
+
+
+SUGGESTIONS_PER_PAGE = 48
+
+
+def update_likes(product_url, like):
     try:
-        updated = False
-
-        # Process each file independently
-        for file_path in DATA_FILES:
-            with open(file_path, "r", encoding="utf-8") as file:
-                items = json.load(file)
-
-            # Update the specific product's score if found
-            for item in items:
-                if item["Name"] == product_name:
-                    item["Score"] = item.get("Score", 0) + (1 if like else -1)
-                    updated = True
-                    break  # Exit after updating the product
-
-            # Save the updated file
-            if updated:
-                with open(file_path, "w", encoding="utf-8") as file:
-                    json.dump(items, file, indent=4)
-                break  # Stop after updating the correct file
-
-        if updated:
-            return jsonify({"message": "Success", "product_name": product_name, "new_score": item["Score"]})
-        else:
+        # Any product of the served index can be voted on, including ones added by a delta feed
+        known = search_service.has_product(product_url) if search_service else product_url in products
+        if not known:
             return jsonify({"error": "Product not found"}), 404
 
+        new_score = score_store.vote(product_url, 1 if like else -1)
+        votes_total.inc("like" if like else "dislike")
+        ranking.update(product_url, new_score)
+        if search_service:
+            search_service.update_popularity(product_url, new_score)
+        return jsonify({"message": "Success", "product_url": product_url, "new_score": new_score})
+
     except Exception as e:
+        report_error("recording vote", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/suggested", methods=["GET"])
 def suggested():
     try:
         price_filter = request.args.get("price", "").strip()  # Get the price filter parameter
-        unique_items = {}
-
-        # Combine all data files into a single list
-        for file_path in DATA_FILES:
-            with open(file_path, "r") as file:
-                items = json.load(file)
-                for item in items:
-                    # Use the 'Name' field as the unique key to avoid duplicates
-                    if item["Name"] not in unique_items and item.get("Score", 0) > 0:
-                        # Check for Shein placeholder image and replace it
-                        image_url = item.get("Image", "https://via.placeholder.com/150")
-                        if "bg-grey-solid-color" in image_url:
-                            image_url = "{{ url_for('static', filename='VELOURIA.png') }}"
-                        
-                        # Update the item with the corrected image
-                        unique_items[item["Name"]] = {
-                            "Name": item["Name"],
-                            "Price": item.get("Price", "0"),
-                            "URL": item.get("URL", "#"),
-                            "Image": image_url,
-                            "Score": item.get("Score", 0),
-                            "Category": item.get("Category", "Uncategorized")
-                        }
-
-        # Sort items with positive scores by score in descending order (default sorting)
-        suggestions = sorted(unique_items.values(), key=lambda x: x["Score"], reverse=True)
-
-        # Apply price sorting if needed
-        if price_filter == "low-high":
-            suggestions.sort(key=lambda x: float(x.get("Price", "0").strip("CHF").replace(",", ".")))
-        elif price_filter == "high-low":
-            suggestions.sort(key=lambda x: float(x.get("Price", "0").strip("CHF").replace(",", ".")), reverse=True)
+        limit = max(min(request.args.get("limit", SUGGESTIONS_PER_PAGE, type=int), 200), 1)
+        offset = max(request.args.get("offset", 0, type=int), 0)
+
+        # Pick up votes committed by other workers, then slice the precomputed ordering
+        # (of the index version being served; the ranking is replaced when it changes)
+        if search_service:
+            search_service.refresh()
+        current = ranking
+        current.sync(score_store)
+        suggestions = current.page(price_filter, limit=limit, offset=offset)
+        total = len(current)
 
     except Exception as e:
-        print(f"Error: {e}")
-        suggestions = []
+        report_error("loading suggestions", e)
+        suggestions, total, limit, offset = [], 0, SUGGESTIONS_PER_PAGE, 0
 
     # Pass the price_filter back to the template for persistence
-    return render_template("suggestions.html", suggestions=suggestions, price_filter=price_filter)
+    with stage("render"):
+        return render_template("suggestions.html", suggestions=suggestions, price_filter=price_filter,
+                               total=total, limit=limit, offset=offset)
 
 
 
 
-# List of common clothing-related words for query completion
+# Fallback list of common clothing-related words, used until index.py has built the autocomplete table
 clothing_terms = [
     "Dress", "Socks", "Shirt", "Pants", "Jacket", "Skirt", "Sweater", "Jeans",
     "Blouse", "Coat", "T-shirt", "Shorts", "Suit", "Blazer", "Hat", "Scarf",
@@ -154,20 +392,201 @@ clothing_terms = [
     "Sarong", "Jumpsuit", "Tights"
 ]
 
+def current_index_dir():
+    # The tables below are read from the published version, like the searcher
+    return index_version.path() if index_version else current_dir(INDEX_DIR)
+
+
+class VersionedTable:
+    """
+    A table index.py (or visual.py) writes next to the index. get() returns it,
+    reloading it when the file or the published index version changes, or None
+    while the file doesn't exist.
+    """
+
+    def __init__(self, loader, file_name, description):
+        self.loader = loader  # index version directory -> table
+        self.file_name = file_name
+        self.description = description
+        self.loaded = (None, None)  # ((index version directory, file mtime), table)
+
+    def get(self):
+        index_dir = current_index_dir()
+        try:
+            stamp = (index_dir, os.stat(os.path.join(index_dir, self.file_name)).st_mtime)
+        except OSError:
+            return None
+        loaded_stamp, table = self.loaded
+        if stamp != loaded_stamp:
+            try:
+                table = self.loader(index_dir)
+                self.loaded = (stamp, table)
+            except Exception as e:
+                report_error(f"loading {self.description}", e)
+        return table
+
+
+autocomplete = VersionedTable(Autocomplete.load, AUTOCOMPLETE_FILE, "autocomplete")
+speller = VersionedTable(Speller.load, SPELLING_FILE, "spelling table")
+similar_items = VersionedTable(SimilarItems.load, SIMILAR_FILE, "similar items")
+visual_index = VersionedTable(VisualIndex.load, HASH_FILE, "image hashes")
+
+
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600  # Keys are hashes of the image URL, so a thumbnail never changes
+
+
+@app.route("/thumb/<key>.webp", methods=["GET"])
+def thumbnail(key):
+    if len(key) != 40 or any(c not in "0123456789abcdef" for c in key):
+        return jsonify({"error": "Invalid thumbnail key"}), 404
+
+    path = thumbnails.get(key)
+    if path is None:
+        # Only images of indexed products are fetched
+        image_url = search_service.image_url(key) if search_service else None
+        if image_url is None:
+            return jsonify({"error": "Image not found"}), 404
+        path = thumbnails.thumbnail(key, image_url)
+        if path is None:
+            return jsonify({"error": "Image could not be fetched"}), 502
+
+    response = send_file(path, mimetype="image/webp", max_age=THUMBNAIL_MAX_AGE)
+    response.headers["Cache-Control"] = f"public, max-age={THUMBNAIL_MAX_AGE}, immutable"
+    return response
+
+
+@app.route("/similar", methods=["GET"])
+def similar():
+    url = request.args.get("url", "").strip()
+    limit = max(min(request.args.get("limit", SIMILAR_TOP_N, type=int), SIMILAR_TOP_N), 1)
+    table = similar_items.get()
+    if search_service is None or table is None:
+        return jsonify({"error": "Similar items are not available, run index.py"}), 503
+
+    try:
+        product, hits = search_service.similar(url, table, limit=limit)
+    except ValueError as e:
+        # The index was updated and index.py is still rebuilding the table
+        return jsonify({"error": str(e)}), 503
+    if product is None:
+        return jsonify({"error": "Product not found"}), 404
+    return jsonify({"product": product, "similar": hits})
+
+
+@app.route("/visually_similar", methods=["GET"])
+def visually_similar():
+    url = request.args.get("url", "").strip()
+    limit = max(min(request.args.get("limit", SIMILAR_TOP_N, type=int), 50), 1)
+    visual = visual_index.get()
+    if search_service is None or visual is None:
+        return jsonify({"error": "Image hashes are not available, run visual.py"}), 503
+
+    product, hits = search_service.visually_similar(url, visual, limit=limit)
+    if product is None:
+        return jsonify({"error": "Product not found"}), 404
+    return jsonify({"product": product, "similar": hits})
+
+
 @app.route("/suggest", methods=["GET"])
 def suggest():
-    query = request.args.get("query", "").lower().strip()
-    if not query:  # Return empty suggestions for an empty query
+    query = request.args.get("query", "")
+    if not query.strip():  # Return empty suggestions for an empty query
         return jsonify([])
 
+    table = autocomplete.get()
+    if table is not None:
+        return jsonify(table.complete(query, k=10))
+
     # Filter clothing terms that start with the query
+    query = query.lower().strip()
     suggestions = [word for word in clothing_terms if word.lower().startswith(query)]
 
     return jsonify(suggestions[:10])  # Return the top 10 matches
 
 
 
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Liveness: the process answers requests.
+    """
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness: the index is open and warm_up() has finished.
+    """
+    if search_service is None:
+        return jsonify({"status": "index not available", "pid": os.getpid()}), 503
+    if warm_up_seconds is None:
+        return jsonify({"status": "warming up", "pid": os.getpid()}), 503
+    return jsonify({"status": "ready", "pid": os.getpid(), "index_dir": search_service.index_dir,
+                    "generation": search_service.generation,
+                    "warm_up_seconds": round(warm_up_seconds, 3)})
+
+
+def create_app(index_dir=None, scores_db=None):
+    """
+    Loads the state the routes serve from and returns the app. /ready reports 503
+    until warm_up() has run as well.
+    """
+    global INDEX_DIR, SCORES_DB, ix, index_version, search_service, score_store, thumbnails
+    INDEX_DIR = index_dir or INDEX_DIR
+    SCORES_DB = scores_db or SCORES_DB
+
+    ix = open_index(INDEX_DIR)
+    index_version = CurrentVersion(INDEX_DIR)
+    score_store = ScoreStore(SCORES_DB)
+    score_store.seed_from_files(DATA_FILES)
+    atexit.register(score_store.close)
+    # Long-lived searcher and query/result caches, refreshed when the index changes or
+    # another version is published (the products and suggestion ranking with them);
+    # like scores boost the relevance ranking
+    search_service = SearchService(ix, scores=score_store, root=INDEX_DIR, on_change=load_catalog) if ix else None
+    if search_service is None:
+        load_catalog()
+
+    # Resized WebP copies of the product images, fetched on first use
+    thumbnails = ThumbnailCache()
+    return app
+
+
+def warm_up(queries=WARM_UP_QUERIES):
+    """
+    Loads the autocomplete, spelling, similar-items and image hash tables and fills
+    the search caches with the first page of the most common searches, so the first
+    requests (of every worker forked afterwards) are served from memory.
+    """
+    global warm_up_seconds
+    start = time.perf_counter()
+    autocomplete.get()
+    speller.get()
+    similar_items.get()
+    visual_index.get()
+    if search_service:
+        for query in queries:
+            # The parameters search_args() reads from a request without arguments
+            try:
+                page = search_service.search_page(query, pagelen=RESULTS_PER_PAGE, speller=speller.get())
+                search_service.facet_counts(page["query"])
+            except Exception as e:
+                report_error("warming up", e)
+    warm_up_seconds = time.perf_counter() - start
+
+
+def after_fork():
+    """
+    Called in each worker process forked after create_app(): the worker opens its own
+    index files (see SearchService.reopen); everything else is kept.
+    """
+    if search_service:
+        search_service.reopen()
 
 
 if __name__ == "__main__":
+    create_app()
+    # The development server starts answering right away; /ready turns 200 once warm
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
     app.run(debug=True)
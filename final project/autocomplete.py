@@ -0,0 +1,125 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+import heapq
+import json
+import os
+import re
+
+from whoosh.analysis import STOP_WORDS
+
+from cache import LRUCache
+
+# ================================
+# Autocomplete
+# ================================
+
+AUTOCOMPLETE_FILE = "autocomplete.json"  # Written next to the index segments
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+
+def normalize(text):
+    return " ".join(WORD_PATTERN.findall(text.lower()))
+
+
+def build_autocomplete(ix, max_ngram=3, min_ngram_count=2):
+    """
+    Collects completion candidates from the index: every word of the product names
+    weighted by its document frequency, plus 2..max_ngram word phrases that occur in
+    at least min_ngram_count products. Words come from the stored names, not the
+    term dictionary, which holds stems ("sleev").
+    Returns (terms, weights) with terms sorted.
+    """
+    weights = Counter()
+    ngrams = Counter()
+    with ix.reader() as reader:
+        for fields in reader.all_stored_fields():
+            words = WORD_PATTERN.findall(fields.get("name", "").lower())
+            weights.update({word for word in words if word not in STOP_WORDS and any(c.isalpha() for c in word)})
+            phrases = set()
+            for n in range(2, max_ngram + 1):
+                for i in range(len(words) - n + 1):
+                    gram = words[i:i + n]
+                    # "dress in", "in black" are not useful completions
+                    if gram[0] in STOP_WORDS or gram[-1] in STOP_WORDS:
+                        continue
+                    phrases.add(" ".join(gram))
+            ngrams.update(phrases)
+
+    for phrase, count in ngrams.items():
+        if count >= min_ngram_count:
+            weights[phrase] = count
+
+    terms = sorted(weights)
+    return terms, [weights[term] for term in terms]
+
+
+def write_autocomplete(ix, index_dir):
+    """
+    Rebuilds the autocomplete table for the index and saves it into index_dir.
+    """
+    terms, weights = build_autocomplete(ix)
+    path = os.path.join(index_dir, AUTOCOMPLETE_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"generation": ix.latest_generation(), "terms": terms, "weights": weights}, f)
+    os.replace(tmp_path, path)  # Readers never see a half-written file
+    return len(terms)
+
+
+class Autocomplete:
+    """
+    Prefix completion over a sorted term array with precomputed weights.
+
+    A prefix maps to a contiguous range of the sorted array (two bisects); the top-k
+    of that range by weight is precomputed for short prefixes, where ranges are large,
+    and cached in an LRU for hot longer prefixes.
+    """
+
+    def __init__(self, terms, weights, generation=None, k=10, precompute_length=2, cache_size=4096):
+        self.terms = terms
+        self.weights = array("l", weights)
+        self.generation = generation
+        self.k = k
+        self.cache = LRUCache(cache_size)
+
+        # Top-k completions for every prefix of up to precompute_length characters
+        heaps = {}
+        for i, term in enumerate(terms):
+            for length in range(1, min(precompute_length, len(term)) + 1):
+                heap = heaps.setdefault(term[:length], [])
+                entry = (self.weights[i], -i)  # Ties go to the alphabetically first term
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+        self.top = {
+            prefix: [terms[-neg_i] for _, neg_i in sorted(heap, reverse=True)]
+            for prefix, heap in heaps.items()
+        }
+        self.precompute_length = precompute_length
+
+    @classmethod
+    def load(cls, index_dir, **kwargs):
+        with open(os.path.join(index_dir, AUTOCOMPLETE_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["terms"], data["weights"], generation=data.get("generation"), **kwargs)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def complete(self, prefix, k=10):
+        prefix = normalize(prefix) + (" " if prefix[-1:].isspace() and prefix.strip() else "")
+        if not prefix:
+            return []
+        if len(prefix) <= self.precompute_length and k <= self.k:
+            return self.top.get(prefix, [])[:k]
+
+        completions = self.cache.get((prefix, k))
+        if completions is None:
+            lo = bisect_left(self.terms, prefix)
+            hi = bisect_left(self.terms, prefix + "\uffff", lo)
+            best = heapq.nlargest(k, range(lo, hi), key=self.weights.__getitem__)
+            completions = [self.terms[i] for i in best]
+            self.cache.put((prefix, k), completions)
+        return completions
@@ -0,0 +1,11 @@
+# ================================
+# Benchmarks
+# ================================
+#
+# Run from the "final project" directory:
+#   python -m benchmark.run                       10k, 100k and 1M product catalogs
+#   python -m benchmark.run --sizes 10000 --baseline benchmark/baseline.json
+#
+#   synthetic.py  - catalogs generated from the field distributions of data/*.json
+#   run.py        - index build throughput, index size and query latency, saved as
+#                   JSON and compared with a baseline
@@ -0,0 +1,367 @@
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from benchmark.run import QUERY_MIX
+from catalog import DATA_FILES, iter_products
+
+# ================================
+# HTTP Load Harness
+# ================================
+#
+# Starts the app on a local port (or targets --url) and drives it from --concurrency
+# client threads with a weighted mix of searches, autocomplete, suggestions and
+# votes. Votes go to a small set of "hot" products so that writes contend with each
+# other and with the reads. Reports throughput, latency percentiles and histograms
+# and error rates per endpoint, then checks for lost updates: the votes the server
+# acknowledged (HTTP 200) must all be in the final scores.
+#
+# The started server uses a scratch score database (SCORES_DB), seeded from the
+# catalog files like data/scores.db, so load tests never touch the real scores.
+
+WORK_DIR = "bench"
+DEFAULT_MIX = "search=50,suggest=25,suggested=10,like=10,dislike=5"
+ENDPOINTS = ("search", "suggest", "suggested", "like", "dislike")
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf")]
+READY_TIMEOUT = 120  # Seconds for the server to load the index and catalog
+REQUEST_TIMEOUT = 60
+
+
+def parse_mix(mix):
+    """
+    "search=50,like=10" -> {"search": 50.0, "like": 10.0}
+    """
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name.strip()!r}, expected one of {', '.join(ENDPOINTS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def search_params(params):
+    # benchmark.run.QUERY_MIX entries as the query string of "/"
+    query = {"query": params.get("query_string", ""), "price": params.get("sort", "")}
+    for name in ("min_price", "max_price", "page"):
+        if params.get(name) is not None:
+            query[name] = params[name]
+    query = list(query.items())
+    for facet, values in params.get("facets", {}).items():
+        query.extend((facet, value) for value in values)
+    return urllib.parse.urlencode(query)
+
+
+def free_port(host):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+# ================================
+# Server
+# ================================
+
+
+def serve(host, port, processes):
+    """
+    Runs the app with the threaded Werkzeug server, or with `processes` pre-forked
+    workers (serve.py). SIGTERM exits normally, so buffered votes are flushed.
+    """
+    from werkzeug.serving import run_simple
+
+    import app as web_app
+    import serve as production
+
+    if processes > 1:
+        production.serve(host, port, workers=processes)
+        return
+    web_app.create_app()
+    web_app.warm_up()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    run_simple(host, port, web_app.app, threaded=True)
+
+
+def start_server(host, port, processes, scores_db):
+    env = dict(os.environ, SCORES_DB=scores_db)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmark.load", "--serve", "--host", host, "--port", str(port),
+         "--server-processes", str(processes)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://{host}:{port}"
+    deadline = time.time() + READY_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=5):
+                return server, base_url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"Server did not start within {READY_TIMEOUT}s")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def read_scores(scores_db):
+    conn = sqlite3.connect(scores_db)
+    try:
+        return dict(conn.execute("SELECT url, score FROM scores"))
+    finally:
+        conn.close()
+
+
+# ================================
+# Load Generation
+# ================================
+
+
+class LoadGenerator:
+    """
+    Sends requests from `concurrency` threads until `duration` seconds have passed
+    or `requests` requests were sent, recording (endpoint, status, seconds) samples
+    and the votes the server acknowledged.
+    """
+
+    def __init__(self, base_url, weights, product_urls, hot_products=20, seed=0):
+        self.base_url = base_url
+        self.endpoints = list(weights)
+        self.weights = [weights[name] for name in self.endpoints]
+        rng = random.Random(seed)
+        self.hot_urls = rng.sample(product_urls, min(hot_products, len(product_urls)))
+        self.seed = seed
+        self.samples = []                    # (endpoint, status, seconds); status 0 = connection error
+        self.acknowledged = defaultdict(int)  # url -> summed delta of the votes answered with 200
+        self.errors = Counter()              # error message -> count
+        self._lock = threading.Lock()
+        self._sent = 0
+
+    def _request(self, rng, endpoint):
+        if endpoint == "search":
+            return urllib.request.Request(f"{self.base_url}/?{search_params(rng.choice(QUERY_MIX))}"), None
+        if endpoint == "suggest":
+            word = (rng.choice(QUERY_MIX)["query_string"] or "dress").split()[0]
+            return urllib.request.Request(f"{self.base_url}/suggest?query={word[:rng.randint(1, len(word))]}"), None
+        if endpoint == "suggested":
+            return urllib.request.Request(f"{self.base_url}/suggested?price={rng.choice(['', 'low-high'])}"), None
+
+        url = rng.choice(self.hot_urls)
+        data = urllib.parse.urlencode({"product_id": url}).encode("utf-8")
+        request = urllib.request.Request(f"{self.base_url}/{endpoint}_product", data=data, method="POST")
+        return request, (url, 1 if endpoint == "like" else -1)
+
+    def _worker(self, number, deadline, max_requests):
+        rng = random.Random(self.seed * 1000 + number)
+        while time.perf_counter() < deadline:
+            with self._lock:
+                if max_requests and self._sent >= max_requests:
+                    return
+                self._sent += 1
+            endpoint = rng.choices(self.endpoints, self.weights)[0]
+            request, vote = self._request(rng, endpoint)
+
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except Exception as e:
+                status = 0
+                with self._lock:
+                    self.errors[f"{endpoint}: {type(e).__name__}: {e}"] += 1
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self.samples.append((endpoint, status, elapsed))
+                if vote and status == 200:
+                    self.acknowledged[vote[0]] += vote[1]
+
+    def run(self, concurrency, duration=None, max_requests=None):
+        deadline = time.perf_counter() + (duration or float("inf"))
+        threads = [threading.Thread(target=self._worker, args=(number, deadline, max_requests))
+                   for number in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+
+def histogram(seconds):
+    counts = np.histogram(np.array(seconds) * 1000, bins=[0] + HISTOGRAM_BUCKETS_MS)[0]
+    return {f"<={bound:g}ms" if bound != float("inf") else "slower": int(count)
+            for bound, count in zip(HISTOGRAM_BUCKETS_MS, counts)}
+
+
+def summarize(samples, elapsed):
+    """
+    Per-endpoint throughput, error rate, latency percentiles and histogram.
+    """
+    by_endpoint = defaultdict(list)
+    for endpoint, status, seconds in samples:
+        by_endpoint[endpoint].append((status, seconds))
+    by_endpoint["all"] = [(status, seconds) for _, status, seconds in samples]
+
+    summary = {}
+    for endpoint, entries in by_endpoint.items():
+        seconds = [s for _, s in entries]
+        errors = sum(1 for status, _ in entries if not 200 <= status < 400)
+        latencies = np.array(seconds) * 1000
+        summary[endpoint] = {
+            "requests": len(entries),
+            "requests_per_second": len(entries) / max(elapsed, 1e-9),
+            "errors": errors,
+            "error_rate": errors / max(len(entries), 1),
+            "statuses": dict(Counter(str(status) for status, _ in entries)),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(latencies.max()),
+            "histogram": histogram(seconds),
+        }
+    return summary
+
+
+def lost_updates(initial, final, acknowledged):
+    """
+    Compares the final score of every voted product with its initial score plus the
+    acknowledged votes. Returns the totals and the products that differ.
+    """
+    mismatches = {}
+    for url, delta in acknowledged.items():
+        expected = initial.get(url, 0) + delta
+        actual = final.get(url, 0)
+        if actual != expected:
+            mismatches[url] = {"expected": expected, "actual": actual}
+    return {
+        "products_voted": len(acknowledged),
+        "products_mismatched": len(mismatches),
+        "votes_lost": sum(abs(entry["expected"] - entry["actual"]) for entry in mismatches.values()),
+        "mismatches": mismatches,
+    }
+
+
+def print_report(summary, updates, elapsed):
+    print(f"\n{'endpoint':<10} {'requests':>8} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for endpoint in list(ENDPOINTS) + ["all"]:
+        if endpoint not in summary:
+            continue
+        entry = summary[endpoint]
+        print(f"{endpoint:<10} {entry['requests']:>8} {entry['requests_per_second']:>8.1f} {entry['errors']:>7} "
+              f"{entry['p50_ms']:>8.1f} {entry['p95_ms']:>8.1f} {entry['p99_ms']:>8.1f} {entry['max_ms']:>8.1f}")
+
+    print("\nLatency histogram (all endpoints):")
+    counts = summary["all"]["histogram"]
+    widest = max(counts.values()) or 1
+    for bucket, count in counts.items():
+        print(f"  {bucket:>9} {count:>7} {'#' * round(40 * count / widest)}")
+
+    if updates is not None:
+        print(f"\nLost updates: {updates['votes_lost']} votes on {updates['products_mismatched']} of "
+              f"{updates['products_voted']} voted products")
+    print(f"Elapsed: {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the web app with concurrent searches and votes.")
+    parser.add_argument("--url", default=None,
+                        help="Target a running server instead of starting one (lost updates need --scores-db)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Client threads")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Endpoint weights (default: %(default)s)")
+    parser.add_argument("--hot-products", type=int, default=20, help="Products the votes go to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-processes", type=int, default=1,
+                        help="Started server: 1 = threaded, N = N pre-forked workers (serve.py)")
+    parser.add_argument("--scores-db", default=None,
+                        help="Score database of the server (default: a scratch copy in the work dir)")
+    parser.add_argument("--work-dir", default=WORK_DIR)
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)  # Server subprocess
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.host, args.port, args.server_processes)
+        return
+
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    product_urls = [item["URL"] for item in iter_products(DATA_FILES)]
+
+    server = None
+    scores_db = args.scores_db
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        os.makedirs(args.work_dir, exist_ok=True)
+        scores_db = scores_db or os.path.join(args.work_dir, "load-scores.db")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(scores_db + suffix):
+                os.remove(scores_db + suffix)
+        print(f"Starting the server ({args.server_processes} process{'es' if args.server_processes > 1 else ''})...")
+        server, base_url = start_server(args.host, args.port or free_port(args.host), args.server_processes,
+                                        scores_db)
+
+    try:
+        initial = read_scores(scores_db) if scores_db else None
+        generator = LoadGenerator(base_url, weights, product_urls, args.hot_products, args.seed)
+        print(f"Running {args.concurrency} clients against {base_url} ({args.mix})...")
+        elapsed = generator.run(args.concurrency, duration=None if args.requests else args.duration,
+                                max_requests=args.requests)
+    finally:
+        if server:
+            stop_server(server)  # Flushes the buffered votes
+
+    updates = None
+    if scores_db:
+        if not server:
+            time.sleep(2)  # A running server flushes votes every flush_interval
+        updates = lost_updates(initial, read_scores(scores_db), generator.acknowledged)
+
+    summary = summarize(generator.samples, elapsed)
+    print_report(summary, updates, elapsed)
+    for message, count in generator.errors.most_common(5):
+        print(f"  {count} x {message}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"concurrency": args.concurrency, "mix": weights, "elapsed_seconds": elapsed,
+                       "server_processes": args.server_processes, "endpoints": summary,
+                       "lost_updates": updates}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import time
+
+import numpy as np
+from whoosh.index import open_dir
+
+from autocomplete import AUTOCOMPLETE_FILE, write_autocomplete
+from benchmark.synthetic import write_catalog
+from catalog import iter_products
+from index import bulk_build, find_clusters
+from prices import load_rates
+from search_service import SearchService
+from similar import SIMILAR_FILE, write_similar
+from spelling import SPELLING_FILE, Speller, write_spelling
+
+# ================================
+# Indexing and Query Benchmark
+# ================================
+#
+# For each catalog size: generates a synthetic catalog (cached in --work-dir),
+# builds the index the way "index.py --bulk" does, measures its size on disk, then
+# runs a fixed query mix through the calls app.search() makes. Every round starts
+# with a fresh SearchService, so each query is measured once uncached ("cold") and
+# once from the result cache ("warm"). Results are written as JSON and compared
+# with a baseline: a metric more than --threshold worse than the baseline fails
+# the run (exit status 1).
+
+SIZES = [10_000, 100_000, 1_000_000]
+WORK_DIR = "bench"
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+THRESHOLD = 0.2   # Allowed relative slowdown before a metric counts as a regression
+NOISE_MS = 1.0    # Latency changes smaller than this are never regressions (warm hits take ~0.05 ms)
+PAGELEN = 24      # app.RESULTS_PER_PAGE
+
+# The search() parameters of each query (see app.search_args)
+QUERY_MIX = [
+    {"query_string": "dress"},
+    {"query_string": "black jumper"},
+    {"query_string": "jeans", "sort": "low-high"},
+    {"query_string": "knitted cardigan", "sort": "high-low"},
+    {"query_string": "boots", "min_price": 20, "max_price": 80},
+    {"query_string": "", "sort": "low-high"},                     # Browsing everything by price
+    {"query_string": "top", "facets": {"brand": ["ASOS DESIGN"]}},
+    {"query_string": "oversized hoodie", "facets": {"source": ["shein"], "category": ["Tops"]}},
+    {"query_string": "jumpr"},                                    # Misspelled: corrected and searched again
+    {"query_string": "shirt", "page": 5},                         # Deep page
+]
+
+# Metric path -> True if higher is better
+COMPARED_METRICS = {
+    ("build", "docs_per_second"): True,
+    ("index_bytes",): False,
+    ("queries", "cold", "p50_ms"): False,
+    ("queries", "cold", "p95_ms"): False,
+    ("queries", "cold", "p99_ms"): False,
+    ("queries", "warm", "p50_ms"): False,
+    ("queries", "warm", "p95_ms"): False,
+    ("queries", "warm", "p99_ms"): False,
+}
+
+
+def directory_size(path, names=None):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+               if names is None or name in names)
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    return {"p50_ms": float(np.percentile(values, 50)), "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)), "max_ms": float(values.max()), "samples": len(values)}
+
+
+def search(service, speller, params):
+    """
+    What app.search() does for one request, without rendering the template.
+    """
+    args = dict({"sort": "", "min_price": None, "max_price": None, "page": 1, "pagelen": PAGELEN,
+                 "facets": {}}, **params)
+    page = service.search_page(**args, speller=speller)
+    service.facet_counts(page["query"], args["min_price"], args["max_price"], args["facets"])
+    return page
+
+
+def build(catalog_path, index_dir, procs=None):
+    rates, _ = load_rates(fetch=None)
+    start = time.perf_counter()
+    stage = find_clusters([catalog_path])
+    dedupe_seconds = time.perf_counter() - start
+
+    count, index_seconds = bulk_build(index_dir, iter_products([catalog_path]), procs=procs, rates=rates,
+                                      failures=[], **stage)
+
+    start = time.perf_counter()
+    ix = open_dir(index_dir)
+    write_autocomplete(ix, index_dir)
+    write_similar(ix, index_dir)
+    write_spelling(ix, index_dir)
+    derived_seconds = time.perf_counter() - start
+
+    total = dedupe_seconds + index_seconds + derived_seconds
+    return {
+        "products": count,
+        "dedupe_seconds": dedupe_seconds,
+        "index_seconds": index_seconds,
+        "derived_seconds": derived_seconds,
+        "total_seconds": total,
+        "docs_per_second": count / max(total, 1e-9),
+        "index_docs_per_second": count / max(index_seconds, 1e-9),
+    }
+
+
+def measure_queries(index_dir, rounds):
+    ix = open_dir(index_dir)
+    speller = Speller.load(index_dir)
+    cold, warm, per_query = [], [], {i: [] for i in range(len(QUERY_MIX))}
+    for _ in range(rounds):
+        service = SearchService(ix)
+        for i, params in enumerate(QUERY_MIX):
+            start = time.perf_counter()
+            search(service, speller, params)
+            cold.append(time.perf_counter() - start)
+            per_query[i].append(cold[-1])
+        for params in QUERY_MIX:
+            start = time.perf_counter()
+            search(service, speller, params)
+            warm.append(time.perf_counter() - start)
+        service.close()
+    return {
+        "cold": percentiles(cold),
+        "warm": percentiles(warm),
+        "per_query_cold_p50_ms": {json.dumps(QUERY_MIX[i], sort_keys=True): float(np.median(samples) * 1000)
+                                  for i, samples in per_query.items()},
+    }
+
+
+def run_size(size, work_dir, rounds, procs, seed, keep):
+    catalog_path = os.path.join(work_dir, f"catalog-{size}-{seed}.ndjson")
+    if not os.path.exists(catalog_path):
+        print(f"Generating {size} products...")
+        write_catalog(catalog_path, size, seed=seed)
+
+    index_dir = os.path.join(work_dir, f"index-{size}")
+    shutil.rmtree(index_dir, ignore_errors=True)
+    print(f"Indexing {size} products...")
+    result = {"build": build(catalog_path, index_dir, procs)}
+    derived = {AUTOCOMPLETE_FILE, SIMILAR_FILE, SPELLING_FILE}
+    result["derived_bytes"] = directory_size(index_dir, derived)
+    result["index_bytes"] = directory_size(index_dir) - result["derived_bytes"]
+
+    print(f"Running {rounds} rounds of {len(QUERY_MIX)} queries...")
+    result["queries"] = measure_queries(index_dir, rounds)
+    if not keep:
+        shutil.rmtree(index_dir, ignore_errors=True)
+    return result
+
+
+def metric(result, path):
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    Returns a list of (size, metric, baseline value, value, relative change) for every
+    metric that got more than `threshold` worse than the baseline (and, for latencies,
+    by at least NOISE_MS).
+    """
+    regressions = []
+    for size, result in results["sizes"].items():
+        base = baseline.get("sizes", {}).get(size)
+        if not base:
+            continue
+        for path, higher_is_better in COMPARED_METRICS.items():
+            old, new = metric(base, path), metric(result, path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = (-change if higher_is_better else change) > threshold
+            if path[-1].endswith("_ms") and abs(new - old) < NOISE_MS:
+                worse = False
+            print(f"{size:>8} {'.'.join(path):<28} {old:>14.2f} {new:>14.2f} {change:>+8.1%}"
+                  f"{'  REGRESSION' if worse else ''}")
+            if worse:
+                regressions.append((size, ".".join(path), old, new, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark index builds and search latency on synthetic catalogs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Catalog sizes (default: %(default)s)")
+    parser.add_argument("--rounds", type=int, default=20, help="Passes over the query mix")
+    parser.add_argument("--procs", type=int, default=None, help="Index writer processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic catalog seed")
+    parser.add_argument("--work-dir", default=WORK_DIR, help="Catalogs and indexes (default: %(default)s)")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark indexes")
+    parser.add_argument("--output", default=None, help="Results file (default: <work dir>/results.json)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline to compare with (default: %(default)s)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Relative change that counts as a regression (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": multiprocessing.cpu_count(),
+        "rounds": args.rounds,
+        "seed": args.seed,
+        "sizes": {},
+    }
+    for size in args.sizes:
+        results["sizes"][str(size)] = result = run_size(size, args.work_dir, args.rounds, args.procs, args.seed,
+                                                        args.keep)
+        build_result, queries = result["build"], result["queries"]
+        print(f"{size} products: {build_result['docs_per_second']:.0f} docs/s, "
+              f"index {result['index_bytes'] / 1e6:.1f} MB (+{result['derived_bytes'] / 1e6:.1f} MB derived), "
+              f"cold p50/p95/p99 {queries['cold']['p50_ms']:.1f}/{queries['cold']['p95_ms']:.1f}/"
+              f"{queries['cold']['p99_ms']:.1f} ms, warm p50 {queries['warm']['p50_ms']:.2f} ms")
+
+    output = args.output or os.path.join(args.work_dir, "results.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one.")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"{'size':>8} {'metric':<28} {'baseline':>14} {'now':>14} {'change':>8}")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}.")
+        sys.exit(1)
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+from bisect import bisect
+from collections import Counter, defaultdict
+from itertools import accumulate
+import json
+import math
+import os
+import random
+import re
+
+from catalog import DATA_FILES, iter_products, resolve_image, source_site
+from dedupe import COLOUR_WORDS, find_duplicates
+from prices import AMOUNT_PATTERN, parse_price
+
+# ================================
+# Synthetic Catalogs
+# ================================
+#
+# A model of the sample catalog (data/*.json) per source site: a word-level Markov
+# chain over the product names, the category, price prefix, placeholder-image and
+# score frequencies, a log-normal price distribution and the share of near-duplicate
+# colourways. Catalogs of any size are generated from it deterministically (fixed
+# seed) and streamed to NDJSON, the format index.py reads from the crawler.
+
+MAX_NAME_WORDS = 25
+_START, _END = "\x02", "\x03"
+SLUG_PATTERN = re.compile(r"[^a-z0-9]+")
+
+# URL and image URL layouts of the crawled sites; product IDs match dedupe.PRODUCT_ID_PATTERNS
+URL_TEMPLATES = {
+    "asos": "https://www.asos.com/{brand}/{slug}/prd/{id}#colourWayId-{variant}",
+    "shein": "https://shein.com/{Slug}-p-{id}.html",
+    "boohoo": "https://www.boohoo.com/{slug}/BMM{id}.html?color={variant}",
+}
+IMAGE_TEMPLATES = {
+    "asos": "https://images.asos-media.com/products/{slug}/{id}-1-{variant}/?$n_480w$&wid=476&fit=constrain",
+    "shein": "https://img.ltwebstatic.com/images3_pi/{id}/{variant}_thumbnail_405x552.webp",
+    "boohoo": "https://media.boohoo.com/i/boohoo/bmm{id}_{variant}_xl?w=900&qlt=default&fmt=auto&sm=fit",
+}
+
+
+class Distribution:
+    """
+    Samples values with the frequencies of a Counter.
+    """
+
+    def __init__(self, counts):
+        self.values = list(counts)
+        self.cumulative = list(accumulate(counts[value] for value in self.values))
+
+    def sample(self, rng):
+        return self.values[bisect(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+def slugify(text):
+    return SLUG_PATTERN.sub("-", text.lower()).strip("-")
+
+
+def fit(data_files=DATA_FILES):
+    """
+    Fits the catalog model to the sample data. Returns {site: model} with the
+    share of each site under "weight".
+    """
+    items = list(iter_products(data_files))
+    clusters, _ = find_duplicates(items)
+    duplicate_share = 1 - len(set(clusters.values())) / max(len(clusters), 1)
+
+    by_site = defaultdict(list)
+    for item in items:
+        by_site[source_site(item["URL"])].append(item)
+
+    models = {}
+    for site, site_items in by_site.items():
+        transitions = defaultdict(Counter)
+        categories, prefixes, scores, placeholders = Counter(), Counter(), Counter(), Counter()
+        log_prices = []
+        for item in site_items:
+            words = [_START] + (item.get("Name") or "").split()[:MAX_NAME_WORDS] + [_END]
+            for word, following in zip(words, words[1:]):
+                transitions[word][following] += 1
+            categories[item.get("Category", "Uncategorized")] += 1
+            scores[item.get("Score", 0)] += 1
+            placeholders[not resolve_image(item.get("Image"))] += 1
+
+            price_str = item.get("Price") or ""
+            parsed, amount = parse_price(price_str), AMOUNT_PATTERN.search(price_str)
+            if parsed and amount:
+                prefixes[price_str[:amount.start()]] += 1
+                log_prices.append(math.log(max(parsed[1], 0.01)))
+            else:
+                prefixes[None] += 1  # Unparseable price, e.g. "No price available"
+
+        mean = sum(log_prices) / max(len(log_prices), 1)
+        std = math.sqrt(sum((p - mean) ** 2 for p in log_prices) / max(len(log_prices), 1))
+        models[site] = {
+            "weight": len(site_items),
+            "transitions": {word: Distribution(following) for word, following in transitions.items()},
+            "categories": Distribution(categories),
+            "prefixes": Distribution(prefixes),
+            "scores": Distribution(scores),
+            "placeholders": Distribution(placeholders),
+            "log_price": (mean, std),
+            "duplicate_share": duplicate_share,
+        }
+    return models
+
+
+def _name(model, rng):
+    words, word = [], _START
+    while len(words) < MAX_NAME_WORDS:
+        word = model["transitions"][word].sample(rng)
+        if word == _END:
+            break
+        words.append(word)
+    return " ".join(words) or "Product"
+
+
+def _recolour(name, rng):
+    # A colourway of a product: the colour words change, the rest of the name stays
+    colours = sorted(COLOUR_WORDS)
+    words = [rng.choice(colours) if word.lower() in COLOUR_WORDS else word for word in name.split()]
+    if words == name.split():
+        words += ["in", rng.choice(colours)]
+    return " ".join(words)
+
+
+def generate(models, count, seed=0):
+    """
+    Streams `count` synthetic catalog items (the fields of data/*.json).
+    """
+    rng = random.Random(seed)
+    sites = Distribution({site: model["weight"] for site, model in models.items()})
+    recent = []  # Products colourways can be made of
+    for number in range(count):
+        site = sites.sample(rng)
+        model = models[site]
+        product_id, variant = 100000000 + number, number
+
+        if recent and rng.random() < model["duplicate_share"]:
+            base = rng.choice(recent)
+            site, model = base["site"], models[base["site"]]
+            name = _recolour(base["name"], rng)
+            category = base["category"]
+            if site != "shein":
+                product_id = base["id"]  # Same product ID, another colourway
+        else:
+            name = _name(model, rng)
+            category = model["categories"].sample(rng)
+            product = {"site": site, "name": name, "category": category, "id": product_id}
+            if len(recent) < 1000:
+                recent.append(product)
+            else:
+                recent[rng.randrange(len(recent))] = product
+
+        slug = slugify(name)[:80]
+        url = URL_TEMPLATES[site].format(brand=slugify(name.split()[0]) if name else "brand", slug=slug,
+                                         Slug="-".join(re.findall(r"\w+", name))[:80], id=product_id,
+                                         variant=variant)
+        if model["placeholders"].sample(rng):
+            image = "//img.ltwebstatic.com/bg-grey-solid-color.png"
+        else:
+            image = IMAGE_TEMPLATES[site].format(slug=slug, id=product_id, variant=variant)
+
+        prefix = model["prefixes"].sample(rng)
+        if prefix is None:
+            price = "No price available"
+        else:
+            mean, std = model["log_price"]
+            price = f"{prefix}{math.exp(rng.gauss(mean, std)):.2f}"
+
+        yield {"Name": name, "Price": price, "URL": url, "Image": image,
+               "Score": model["scores"].sample(rng), "Category": category}
+
+
+def write_catalog(path, count, seed=0, data_files=DATA_FILES):
+    """
+    Writes a synthetic catalog of `count` products to an NDJSON file.
+    """
+    models = fit(data_files)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for item in generate(models, count, seed):
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import re
+from urllib.parse import urlsplit
+
+# ================================
+# Catalog Loading
+# ================================
+
+# JSON data files that make up the catalog
+DATA_FILES = ["data/asos.json", "data/shein.json"]
+
+# Fields that define a product's content; a change in any of them means re-indexing
+FINGERPRINT_FIELDS = ("Name", "Price", "Image", "Category")
+
+# Brands that product names start with; sub-lines ("ASOS DESIGN Tall", "SHEIN EZwear")
+# count as their brand. Matched case-insensitively, longest first.
+BRANDS = [
+    "ASOS DESIGN", "ASOS 4505", "ASOS EDITION", "ASOS LUXE", "Weekend Collective", "Topshop", "Monki",
+    "Weekday", "ONLY", "JDY", "Vero Moda", "Noisy May", "Stradivarius", "Reclaimed Vintage", "Public Desire",
+    "London Rebel", "Brave Soul", "New Look", "River Island", "Bershka", "Pull&Bear", "Collusion",
+    "SHEIN", "Manfinity", "DAZY", "MUSERA", "MIOTAN", "ROMWE", "EMERY ROSE", "HelloKiss",
+    "boohooMAN", "boohoo",
+]
+_BRAND_PATTERN = re.compile(
+    "|".join(re.escape(brand) + r"\b" for brand in sorted(BRANDS, key=len, reverse=True)), re.IGNORECASE
+)
+_BRAND_NAMES = {brand.lower(): brand for brand in BRANDS}
+
+# Sites that mostly sell their own label: unbranded names get the site's brand
+SITE_BRANDS = {"boohoo": "boohoo"}
+
+# Placeholders the sites show instead of a product image (e.g. Shein's grey tile)
+PLACEHOLDER_MARKERS = ("bg-grey-solid-color", "VELOURIA.png", "placeholder")
+
+
+def iter_json_array(file_path, chunk_size=1 << 16):
+    """
+    Streams the elements of a top-level JSON array one at a time, so that parsing
+    takes memory for the largest single item rather than the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise json.JSONDecodeError("Expected a JSON array", buffer, 0)
+        buffer = buffer[1:]
+        eof = False
+
+        while True:
+            # Skip separators between items
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            while not buffer and not eof:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = chunk.lstrip().lstrip(",").lstrip()
+
+            if buffer.startswith("]"):
+                return
+            if not buffer:
+                raise json.JSONDecodeError("Unterminated JSON array", "", 0)
+
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # Item is cut off at the end of the buffer: read more and retry
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+
+            yield item
+            buffer = buffer[end:]
+
+
+def iter_ndjson(file_path):
+    """
+    Streams the objects of an NDJSON file (one JSON object per line), as written
+    by the crawler. A truncated last line from an interrupted crawl is skipped.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping malformed line {line_number} in {file_path}")
+
+
+def iter_file(file_path):
+    if file_path.endswith((".ndjson", ".jsonl")):
+        return iter_ndjson(file_path)
+    return iter_json_array(file_path)
+
+
+def iter_products(data_files=DATA_FILES):
+    """
+    Streams the products from the data files (JSON arrays or NDJSON), skipping
+    repeated URLs (the first occurrence of a URL wins).
+    """
+    seen_urls = set()
+    for file_path in data_files:
+        try:
+            for item in iter_file(file_path):
+                url = item.get("URL")
+                if not url or url in seen_urls:
+                    continue
+                seen_urls.add(url)
+                yield item
+        except FileNotFoundError:
+            print(f"File not found: {file_path}")
+        except json.JSONDecodeError:
+            print(f"Error decoding JSON in file: {file_path}")
+
+
+def fingerprint(item):
+    """
+    Content hash of the fields that are indexed for a product.
+    """
+    content = "\x1f".join(str(item.get(field, "")) for field in FINGERPRINT_FIELDS)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def resolve_image(image_url):
+    """
+    Returns the absolute URL of a product image, or "" for missing images and
+    placeholders (the template shows the Velouria logo instead).
+    """
+    if not image_url:
+        return ""
+    image_url = image_url.strip()
+    if image_url.startswith("//"):
+        image_url = "https:" + image_url
+    if not image_url.startswith(("http://", "https://")):
+        return ""
+    if any(marker in image_url for marker in PLACEHOLDER_MARKERS):
+        return ""
+    return image_url
+
+
+def image_key(image_url):
+    return hashlib.sha1(image_url.encode("utf-8")).hexdigest() if image_url else None
+
+
+def source_site(url):
+    """
+    The site a product was crawled from: "asos" for https://www.asos.com/...
+    """
+    netloc = urlsplit(url or "").netloc.lower()
+    return netloc.split(".")[-2] if "." in netloc else netloc
+
+
+def brand(item):
+    """
+    The brand a product name starts with, the site's own label, or "" if unknown.
+    """
+    match = _BRAND_PATTERN.match((item.get("Name") or "").strip())
+    if match:
+        return _BRAND_NAMES[match.group(0).lower()]
+    return SITE_BRANDS.get(source_site(item.get("URL")), "")
@@ -0,0 +1,232 @@
+import re
+import unicodedata
+import zlib
+from array import array
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from catalog import image_key, resolve_image
+from visual import DUPLICATE_DISTANCE, hamming
+
+# ================================
+# Near-Duplicate Detection
+# ================================
+#
+# The same product shows up under several URLs: one per colourway, or once per
+# catalog. Each product gets a MinHash signature of its normalized name; products
+# that share an LSH band bucket and have similar signatures, the same product ID in
+# their URL, the same image URL or nearly the same image (perceptual hashes at most
+# visual.DUPLICATE_DISTANCE bits apart, see visual.py) are put in one cluster. Every product is hashed once
+# and only compared with the first MAX_BUCKET_COMPARISONS products of each of its
+# buckets, so the whole pass is linear in the catalog size. Pairs past that limit in
+# a large bucket (a very common name) are not compared; they only end up in one
+# cluster through other products they both match.
+#
+# Image hashes are blocked in IMAGE_HASH_CHUNKS = DUPLICATE_DISTANCE + 1 chunks: two
+# hashes that differ in at most DUPLICATE_DISTANCE bits leave at least one chunk
+# unchanged, so they always share a bucket.
+#
+# The cluster ID is the URL of the first product of the cluster in catalog order.
+
+NUM_PERM = 64             # MinHash permutations
+BANDS = 8                 # LSH bands of NUM_PERM // BANDS rows, ~0.77 Jaccard threshold
+SHINGLE_SIZE = 4          # Character shingles
+THRESHOLD = 0.8           # Estimated Jaccard similarity needed to merge two products
+MAX_BUCKET_COMPARISONS = 8  # Earlier products of a bucket each new product is compared with
+IMAGE_HASH_CHUNKS = DUPLICATE_DISTANCE + 1
+
+_PRIME = (1 << 31) - 1
+_random = np.random.RandomState(20240601)  # Fixed seed: signatures must be stable across runs
+_A = _random.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_B = _random.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+COLOUR_WORDS = {
+    "black", "white", "grey", "gray", "charcoal", "navy", "blue", "red", "burgundy", "wine", "pink", "rose",
+    "green", "khaki", "olive", "sage", "brown", "chocolate", "tan", "camel", "beige", "stone", "cream",
+    "ecru", "ivory", "yellow", "mustard", "orange", "rust", "purple", "lilac", "lavender", "silver", "gold",
+    "multi", "light", "dark", "pale", "washed",
+}
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Product IDs in the listing URLs of the crawled sites
+PRODUCT_ID_PATTERNS = [
+    re.compile(r"/prd/(\d+)"),                 # ASOS
+    re.compile(r"-p-(\d+)\.html"),             # Shein
+    re.compile(r"/([A-Z]{2,5}\d{4,})\.html"),  # boohoo
+]
+
+
+def normalize_name(name):
+    """
+    Lowercases, strips accents and punctuation, and drops colour words, so that the
+    colourways of a product get the same name.
+    """
+    name = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii").lower()
+    words = [word for word in WORD_PATTERN.findall(name) if word not in COLOUR_WORDS]
+    # "... jacket in" after dropping "burgundy"
+    while words and words[-1] in ("in", "and", "with"):
+        words.pop()
+    return " ".join(words)
+
+
+def minhash(name):
+    """
+    MinHash signature (NUM_PERM uint64 values) of a normalized name's character shingles.
+    """
+    text = f" {name} "
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(len(text) - SHINGLE_SIZE + 1, 1))}
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def similarity(signature, other):
+    return float(np.mean(signature == other))
+
+
+def product_id(url):
+    parts = urlsplit(url or "")
+    for pattern in PRODUCT_ID_PATTERNS:
+        match = pattern.search(parts.path)
+        if match:
+            site = parts.netloc.split(".")[-2] if "." in parts.netloc else parts.netloc
+            return f"{site}:{match.group(1)}"
+    return None
+
+
+def image_identity(image_url):
+    """
+    Host and path of a product image: the same picture with other resize parameters.
+    """
+    image_url = resolve_image(image_url)
+    if not image_url:
+        return None
+    parts = urlsplit(image_url)
+    return parts.netloc + parts.path
+
+
+def band_keys(signature):
+    rows = NUM_PERM // BANDS
+    return [f"b{band}:{zlib.crc32(signature[band * rows:(band + 1) * rows].tobytes()):08x}"
+            for band in range(BANDS)]
+
+
+def image_hash(item, image_hashes):
+    """
+    The perceptual hash of a product's image, if it was computed (see visual.py).
+    """
+    if not image_hashes:
+        return None
+    return image_hashes.get(image_key(resolve_image(item.get("Image"))))
+
+
+def image_hash_chunks(value, chunks=IMAGE_HASH_CHUNKS):
+    """
+    A 64-bit image hash split into `chunks` runs of bits.
+    """
+    bounds = [64 * i // chunks for i in range(chunks + 1)]
+    return [(value >> low) & ((1 << (high - low)) - 1) for low, high in zip(bounds, bounds[1:])]
+
+
+def dedupe_keys(item, signature=None, image_hashes=None):
+    """
+    The blocking keys of a product: its LSH band buckets, its product ID and image
+    (exact matches on these two are duplicates without further checks) and the
+    chunks of its image hash.
+    """
+    if signature is None:
+        signature = minhash(normalize_name(item.get("Name")))
+    keys = band_keys(signature)
+    pid = product_id(item.get("URL"))
+    if pid:
+        keys.append(f"pid:{pid}")
+    image = image_identity(item.get("Image"))
+    if image:
+        keys.append(f"img:{image}")
+    value = image_hash(item, image_hashes)
+    if value is not None:
+        keys.extend(f"ph{i}:{chunk:04x}" for i, chunk in enumerate(image_hash_chunks(value)))
+    return keys
+
+
+def is_exact_key(key):
+    return key.startswith(("pid:", "img:"))
+
+
+class Deduplicator:
+    """
+    Assigns products to near-duplicate clusters as they are added (union-find over
+    the products that share a blocking key). A product is only compared with the
+    first MAX_BUCKET_COMPARISONS products of each bucket, so only those are kept.
+
+    Memory grows with the catalog: per product it keeps the URL, image hash, blocking
+    keys, union-find parent, MinHash signature (NUM_PERM uint32 values) and about six
+    bucket entries. On the synthetic catalogs that is ~2 KB per product (~2 GB for a
+    million products), of which ~0.4 KB (the returned clusters and keys) outlives it.
+    """
+
+    def __init__(self, threshold=THRESHOLD, image_hashes=None):
+        self.threshold = threshold
+        self.image_hashes = image_hashes or {}
+        self.urls = []
+        self.hashes = []      # perceptual image hashes, None if unknown
+        self.keys = {}        # url -> blocking keys, space-separated
+        self._signatures = np.empty((1024, NUM_PERM), dtype=np.uint32)  # MinHash values are < 2^31
+        self._parent = array("l")
+        self._buckets = {}    # blocking key -> first product positions
+
+    def _find(self, i):
+        while self._parent[i] != i:
+            self._parent[i] = self._parent[self._parent[i]]
+            i = self._parent[i]
+        return i
+
+    def _union(self, i, j):
+        i, j = self._find(i), self._find(j)
+        if i != j:
+            # The earlier product stays the root, so it names the cluster
+            self._parent[max(i, j)] = min(i, j)
+
+    def add(self, item):
+        position = len(self.urls)
+        signature = minhash(normalize_name(item.get("Name")))
+        keys = dedupe_keys(item, signature, self.image_hashes)
+        if position == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        self._signatures[position] = signature
+        self.urls.append(item["URL"])
+        self.hashes.append(image_hash(item, self.image_hashes))
+        self.keys[item["URL"]] = " ".join(keys)
+        self._parent.append(position)
+
+        for key in keys:
+            bucket = self._buckets.setdefault(key, [])
+            for other in bucket:
+                if self._matches(key, position, other):
+                    self._union(position, other)
+            if len(bucket) < MAX_BUCKET_COMPARISONS:
+                bucket.append(position)
+
+    def _matches(self, key, position, other):
+        if is_exact_key(key):
+            return True
+        if key.startswith("ph"):
+            return hamming(self.hashes[position], self.hashes[other]) <= DUPLICATE_DISTANCE
+        return similarity(self._signatures[position], self._signatures[other]) >= self.threshold
+
+    def clusters(self):
+        """
+        Returns {url: cluster ID}.
+        """
+        return {url: self.urls[self._find(position)] for position, url in enumerate(self.urls)}
+
+
+def find_duplicates(products, threshold=THRESHOLD, image_hashes=None):
+    """
+    Clusters a catalog. Returns ({url: cluster ID}, {url: space-separated blocking keys}).
+    """
+    deduplicator = Deduplicator(threshold, image_hashes)
+    for item in products:
+        deduplicator.add(item)
+    return deduplicator.clusters(), deduplicator.keys
@@ -0,0 +1,81 @@
+import argparse
+import io
+import random
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from PIL import Image, ImageDraw
+
+# ================================
+# Local Image Server
+# ================================
+#
+# Stand-in for the product image CDNs when testing the thumbnail cache
+# (IMAGE_BASE_URL=http://127.0.0.1:8001, see thumbnails.py): every path
+# returns a JPEG whose shapes and colours are derived from the path (the query string is
+# ignored, like a CDN's resize parameters), so each path has its own stable image.
+# Paths containing "missing" return 404.
+
+
+def render_image(path, size=(476, 608)):
+    """
+    A JPEG of a few shapes placed and coloured from the path's hash.
+    """
+    rng = random.Random(zlib.crc32(path.encode("utf-8")))
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(40, size[0] // 2), y0 + rng.randrange(40, size[1] // 2)
+        shape = draw.ellipse if rng.random() < 0.5 else draw.rectangle
+        shape([x0, y0, x1, y1], fill=tuple(rng.randrange(256) for _ in range(3)))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        if "missing" in self.path:
+            self.send_error(404)
+            return
+        data = render_image(urlsplit(self.path).path)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host="127.0.0.1", port=0):
+    """
+    Starts the image server in a background thread.
+    Returns (server, base_url); call server.shutdown() to stop it.
+    server.RequestHandlerClass.requests counts the images served.
+    """
+    handler = type("Handler", (ImageHandler,), {"requests": 0})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve generated product images for local tests.")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    server, base_url = serve(port=args.port)
+    print(f"Serving generated images at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,52 +1,377 @@
-from whoosh.fields import Schema, TEXT, ID
-from whoosh.index import create_in, open_dir
+from whoosh.analysis import StemmingAnalyzer
+from whoosh.fields import Schema, TEXT, ID, KEYWORD, NUMERIC
+from whoosh.index import create_in, exists_in, open_dir
+from whoosh.query import Or, Term
+from autocomplete import write_autocomplete
+from catalog import DATA_FILES, brand, iter_file, iter_products, fingerprint, image_key, resolve_image, source_site
+from dedupe import dedupe_keys, find_duplicates, image_hash, is_exact_key, minhash, normalize_name, similarity, THRESHOLD
+from similar import write_similar
+from spelling import write_spelling
+from versions import collect_garbage, current_dir, current_version, discard, new_version, publish, validate
+from thumbnails import indexed_images
+from visual import DUPLICATE_DISTANCE, hamming, load_hashes, save_hashes
+from prices import RATES_TO_CHF, load_rates, normalize_prices
+import argparse
+import multiprocessing
 import os
-import json
+import sys
+import time
 
 # Define the schema
 schema = Schema(
-    name=TEXT(stored=True),
+    name=TEXT(stored=True, analyzer=StemmingAnalyzer()),  # "jumpers" matches "jumper"
     price=TEXT(stored=True),
     url=ID(stored=True, unique=True),
-    image=ID(stored=True)  # Store image URLs for product images
+    category=ID(stored=True, sortable=True),  # Facets: sortable columns make the counts cheap
+    category_words=TEXT(analyzer=StemmingAnalyzer()),  # The category for text search ("dress" finds Dresses)
+    brand=ID(stored=True, sortable=True),  # From the start of the name, see catalog.brand()
+    source=ID(stored=True, sortable=True),  # Site the product was crawled from
+    image=ID(stored=True),  # Product image URL, "" for missing images and placeholders
+    image_key=ID,  # SHA-1 of the image URL, the /thumb/<key> proxy only serves indexed images
+    price_cents=NUMERIC(int, bits=64, stored=True, sortable=True),  # Normalized CHF price in cents
+    fingerprint=ID(stored=True),  # Content hash used to skip unchanged products on re-index
+    cluster=ID(stored=True, sortable=True),  # Near-duplicate cluster (URL of its first product)
+    dedupe_keys=KEYWORD  # LSH buckets, product ID and image, to cluster products added by deltas
 )
 
-# Create or open index directory
-index_dir = "index"
-if not os.path.exists(index_dir):
-    os.mkdir(index_dir)
-    ix = create_in(index_dir, schema)  # Create a new index if it doesn't exist
-else:
+# Index directory
+INDEX_DIR = "index"
+
+PRICE_BATCH = 10000  # Products whose prices are normalized together
+
+
+def open_or_create_index(index_dir=INDEX_DIR):
+    """
+    Opens the index, creating it (or rebuilding it when the schema changed) if needed.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    if not exists_in(index_dir):
+        return create_in(index_dir, schema)  # Create a new index if there is none (e.g. a new, empty version)
+
     ix = open_dir(index_dir)  # Open existing index
+    if set(ix.schema.names()) != set(schema.names()):
+        print("Index schema is outdated, rebuilding the index.")
+        ix = create_in(index_dir, schema)
+    return ix
+
+
+def product_fields(item, price_cents=None, cluster=None, keys=None):
+    """
+    Maps a catalog item to the index fields. `price_cents` is the item's price
+    normalized by with_prices(), `cluster` and `keys` come from dedupe.find_duplicates().
+    """
+    fields = dict(
+        name=item.get("Name", "No name available"),
+        price=item.get("Price", "No price available"),
+        url=item["URL"],
+        category=item.get("Category", "Uncategorized"),
+        source=source_site(item["URL"]),
+        category_words=item.get("Category", ""),
+        image=resolve_image(item.get("Image")),
+        fingerprint=fingerprint(item),
+        cluster=cluster or item["URL"],
+        dedupe_keys=keys if keys is not None else " ".join(dedupe_keys(item))
+    )
+
+    if fields["image"]:
+        fields["image_key"] = image_key(fields["image"])
+
+    # Products of unknown brand are not listed under any brand
+    item_brand = brand(item)
+    if item_brand:
+        fields["brand"] = item_brand
+
+    # Products without a parseable price are left out of price sorting/filtering
+    if price_cents is not None:
+        fields["price_cents"] = price_cents
+    return fields
+
+
+def with_prices(products, rates=RATES_TO_CHF, failures=None, batch_size=PRICE_BATCH):
+    """
+    Price normalization stage: streams (item, price_cents) pairs, converting the
+    prices of `batch_size` items at a time in one NumPy pass. price_cents is None
+    for items without a usable price; unparseable prices are appended to `failures`
+    as (url, price_str) instead of being indexed with a made-up value.
+    """
+    batch = []
+
+    def convert():
+        cents, valid, batch_failures = normalize_prices([item.get("Price") for item in batch], rates)
+        if failures is not None:
+            failures.extend((batch[position].get("URL"), price_str) for position, price_str in batch_failures)
+        for item, item_cents, item_valid in zip(batch, cents.tolist(), valid.tolist()):
+            yield item, item_cents if item_valid else None
+
+    for item in products:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield from convert()
+            batch = []
+    if batch:
+        yield from convert()
+
+
+def report_price_failures(failures, limit=10):
+    if not failures:
+        return
+    print(f"{len(failures)} prices could not be parsed and were indexed without a CHF price:")
+    for url, price_str in failures[:limit]:
+        print(f"  {price_str!r} ({url})")
+    if len(failures) > limit:
+        print(f"  ... and {len(failures) - limit} more")
+
+
+def update_index(ix, products, rates=RATES_TO_CHF, failures=None, clusters=None, keys=None):
+    """
+    Brings the index in line with `products`, keyed by URL: new products are added,
+    changed ones (different fingerprint, cluster or CHF price, which changes with the
+    exchange rates) are updated, products that disappeared from the source are
+    deleted and unchanged ones are skipped.
+    `clusters` and `keys` are the output of dedupe.find_duplicates() for `products`.
+    Returns the added/updated/deleted/unchanged counts.
+    """
+    counts = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    clusters, keys = clusters or {}, keys or {}
+
+    # URL -> (fingerprint, cluster, price_cents) of what is currently indexed
+    with ix.searcher() as searcher:
+        indexed = {fields["url"]: (fields.get("fingerprint"), fields.get("cluster"), fields.get("price_cents"))
+                   for fields in searcher.all_stored_fields()}
+
+    writer = ix.writer()
+    try:
+        seen_urls = set()
+        for item, price_cents in with_prices(products, rates, failures):
+            try:
+                fields = product_fields(item, price_cents, clusters.get(item.get("URL")), keys.get(item.get("URL")))
+            except Exception as e:
+                print(f"Error indexing item: {item}. Error: {e}")
+                continue
+
+            url = fields["url"]
+            seen_urls.add(url)
+            if url not in indexed:
+                writer.add_document(**fields)
+                counts["added"] += 1
+            elif indexed[url] != (fields["fingerprint"], fields["cluster"], fields.get("price_cents")):
+                writer.update_document(**fields)
+                counts["updated"] += 1
+            else:
+                counts["unchanged"] += 1
+
+        for url in indexed.keys() - seen_urls:
+            writer.delete_by_term("url", url)
+            counts["deleted"] += 1
+    except Exception:
+        writer.cancel()
+        raise
+
+    if counts["added"] or counts["updated"] or counts["deleted"]:
+        writer.commit()
+    else:
+        # Nothing changed: don't create a new index generation
+        writer.cancel()
+    return counts
+
+
+def delta_cluster(searcher, item, keys, threshold=THRESHOLD, image_hashes=None):
+    """
+    Finds the cluster of a product added by a delta feed by looking up the indexed
+    products that share one of its blocking keys. Returns None if it has no duplicate.
+    """
+    signature = minhash(normalize_name(item.get("Name")))
+    value = image_hash(item, image_hashes)
+    candidates = searcher.search(Or([Term("dedupe_keys", key) for key in keys]), limit=None, scored=False)
+    for hit in candidates:
+        if hit["url"] == item["URL"]:
+            continue
+        other = minhash(normalize_name(hit["name"]))
+        other_item = {"URL": hit["url"], "Image": hit.get("image")}
+        other_value = image_hash(other_item, image_hashes)
+        # Band and image hash buckets are only candidates; product ID and image URL matches are duplicates
+        exact = any(key in keys for key in dedupe_keys(other_item, other) if is_exact_key(key))
+        same_image = (value is not None and other_value is not None
+                      and hamming(value, other_value) <= DUPLICATE_DISTANCE)
+        if exact or same_image or similarity(signature, other) >= threshold:
+            return hit["cluster"]
+    return None
+
+
+def apply_delta(ix, events, rates=RATES_TO_CHF, failures=None, image_hashes=None):
+    """
+    Applies a crawler delta feed (<site>.delta.ndjson): "upsert" events add or replace
+    a product by URL, "delete" events remove it. Nothing else in the index is touched;
+    upserted products join the cluster of an indexed near-duplicate.
+    Returns the updated/deleted counts.
+    """
+    counts = {"updated": 0, "deleted": 0}
+    searcher = ix.searcher()
+    writer = ix.writer()
+    try:
+        for event, price_cents in with_prices(events, rates, failures):
+            if event.get("op") == "delete":
+                writer.delete_by_term("url", event["URL"])
+                counts["deleted"] += 1
+            else:
+                item = {key: value for key, value in event.items() if key not in ("op", "change")}
+                keys = dedupe_keys(item, image_hashes=image_hashes)
+                cluster = delta_cluster(searcher, item, keys, image_hashes=image_hashes)
+                writer.update_document(**product_fields(item, price_cents, cluster, " ".join(keys)))
+                counts["updated"] += 1
+    except Exception:
+        writer.cancel()
+        raise
+    finally:
+        searcher.close()
+
+    if counts["updated"] or counts["deleted"]:
+        writer.commit()
+    else:
+        writer.cancel()
+    return counts
+
+
+def bulk_build(index_dir, products, procs=None, limitmb=256, multisegment=True, rates=RATES_TO_CHF,
+               failures=None, clusters=None, keys=None):
+    """
+    Builds a complete index from scratch in a fresh directory, streaming `products`
+    into Whoosh's multiprocessing writer. Each of the `procs` workers buffers up to
+    `limitmb` MB before flushing; with `multisegment` every worker writes its own
+    segment instead of merging them at the end.
+    Returns (doc_count, seconds).
+    """
+    if os.path.exists(index_dir) and os.listdir(index_dir):
+        raise ValueError(f"Bulk builds need a fresh directory, '{index_dir}' is not empty.")
+    os.makedirs(index_dir, exist_ok=True)
+
+    ix = create_in(index_dir, schema)
+    procs = procs or multiprocessing.cpu_count()
+    start = time.time()
+
+    writer = ix.writer(procs=procs, limitmb=limitmb, multisegment=multisegment)
+    clusters, keys = clusters or {}, keys or {}
+    count = 0
+    try:
+        for item, price_cents in with_prices(products, rates, failures):
+            try:
+                url = item.get("URL")
+                writer.add_document(**product_fields(item, price_cents, clusters.get(url), keys.get(url)))
+                count += 1
+            except Exception as e:
+                print(f"Error indexing item: {item}. Error: {e}")
+    except BaseException:
+        writer.cancel()
+        raise
+    writer.commit()
+
+    return count, time.time() - start
+
+
+def find_clusters(files, image_hashes=None):
+    """
+    Near-duplicate stage: one streaming pass over the catalog before indexing it.
+    Unlike the indexing, it holds state for every product (see dedupe.Deduplicator),
+    and the clusters and keys it returns stay in memory until the index is written.
+    """
+    clusters, keys = find_duplicates(iter_products(files), image_hashes=image_hashes)
+    print(f"{len(clusters)} products in {len(set(clusters.values()))} clusters of near-duplicates.")
+    return {"clusters": clusters, "keys": keys}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the product index.")
+    parser.add_argument("files", nargs="*", default=DATA_FILES, help="JSON catalog files to index")
+    parser.add_argument("--index-dir", default=INDEX_DIR,
+                        help="Index root, each build is published as a new version in it (default: %(default)s)")
+    parser.add_argument("--delta", action="store_true",
+                        help="The files are crawler delta feeds (*.delta.ndjson) to apply to the index")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Full rebuild from scratch using parallel writers")
+    parser.add_argument("--procs", type=int, default=None, help="Bulk mode: writer processes (default: all cores)")
+    parser.add_argument("--limitmb", type=int, default=256, help="Bulk mode: memory per writer process in MB")
+    parser.add_argument("--single-segment", action="store_true",
+                        help="Bulk mode: merge the worker segments into one at the end")
+    parser.add_argument("--offline", action="store_true",
+                        help="Don't fetch exchange rates, use the cached or fallback rates")
+    parser.add_argument("--force", action="store_true",
+                        help="Publish the new version even if it fails validation (e.g. a catalog that shrank)")
+    args = parser.parse_args()
+
+    rates, source = load_rates(fetch=None) if args.offline else load_rates()
+    print(f"Using {source} exchange rates to CHF: " + ", ".join(f"{c} {r:.4f}" for c, r in sorted(rates.items())))
+    failures = []
+
+    # Every build goes to a new version directory; the one being served is never written to
+    os.makedirs(args.index_dir, exist_ok=True)
+    serving = current_dir(args.index_dir)
+    serving = serving if exists_in(serving) else None
+    # Perceptual hashes from "python visual.py", used as a near-duplicate signal once computed
+    image_hashes = load_hashes(serving) if serving else {}
+    index_dir = new_version(args.index_dir, base=None if args.bulk else serving)
+
+    try:
+        changed = build_version(args, index_dir, rates, failures, image_hashes)
+    except BaseException:
+        discard(index_dir)
+        raise
+    report_price_failures(failures)
+
+    if not changed and serving and current_version(args.index_dir):
+        discard(index_dir)
+        print(f"Nothing changed, still serving {current_version(args.index_dir)}.")
+        return
+
+    # Derived structures are rebuilt for every new version
+    ix = open_dir(index_dir)
+    print(f"Autocomplete rebuilt with {write_autocomplete(ix, index_dir)} entries.")
+    print(f"Similar items rebuilt with {write_similar(ix, index_dir)} groups.")
+    print(f"Spelling table rebuilt with {write_spelling(ix, index_dir)} words.")
+    if image_hashes:
+        kept = {key: image_hashes[key] for key in map(image_key, indexed_images(ix)) if key in image_hashes}
+        save_hashes(kept, index_dir)
+        print(f"Image hashes kept for {len(kept)} images, run visual.py for the new ones.")
+
+    problems = validate(index_dir, previous=serving)
+    for problem in problems:
+        print(f"Validation: {problem}")
+    if problems and not args.force:
+        discard(index_dir)
+        print(f"The new version failed validation and was discarded, still serving {serving or 'nothing'}.")
+        sys.exit(1)
+    publish(args.index_dir, index_dir)
+    print(f"Published {os.path.basename(index_dir)} ({ix.doc_count()} documents).")
+    deleted = collect_garbage(args.index_dir)
+    if deleted:
+        print(f"Deleted {len(deleted)} old versions and files: {', '.join(deleted)}")
+
+
+def build_version(args, index_dir, rates, failures, image_hashes):
+    """
+    Builds, updates or applies a delta to the index in the new version directory
+    `index_dir` (a fresh directory for --bulk, hard links to the served version
+    otherwise). Returns whether the index changed.
+    """
+    if args.bulk:
+        count, seconds = bulk_build(index_dir, iter_products(args.files), procs=args.procs,
+                                    limitmb=args.limitmb, multisegment=not args.single_segment,
+                                    rates=rates, failures=failures, **find_clusters(args.files, image_hashes))
+        print(f"Indexing completed! {count} documents in {seconds:.1f}s ({count / max(seconds, 1e-9):.0f} docs/sec)")
+        return True
+    if args.delta:
+        ix = open_or_create_index(index_dir)
+        counts = {"updated": 0, "deleted": 0}
+        for file in args.files:
+            for name, count in apply_delta(ix, iter_file(file), rates, failures, image_hashes).items():
+                counts[name] += count
+        print("Delta applied! " + ", ".join(f"{name}: {count}" for name, count in counts.items()))
+        return bool(counts["updated"] or counts["deleted"])
+    ix = open_or_create_index(index_dir)
+    counts = update_index(ix, iter_products(args.files), rates, failures, **find_clusters(args.files, image_hashes))
+    print("Indexing completed! " + ", ".join(f"{name}: {count}" for name, count in counts.items()))
+    return bool(counts["added"] or counts["updated"] or counts["deleted"])
+
 
-# JSON data files to index
-data_files = ["data/asos.json", "data/shein.json"]
-
-# Index the data
-with ix.writer() as writer:
-    for file in data_files:
-        try:
-            # Open and load JSON data
-            with open(file, "r", encoding="utf-8") as f:
-                products = json.load(f)
-
-                # Iterate through each product in the JSON
-                for item in products:
-                    try:
-                        writer.add_document(
-                            name=item.get("Name", "No name available"),
-                            price=item.get("Price", "No price available"),
-                            url=item.get("URL", ""),  # URL field is mandatory
-                           image=item.get("Image", "/static/VELOURIA.png")  # Add leading slash for absolute path
-
- # Use a placeholder if missing
-                        )
-                    except Exception as e:
-                        print(f"Error indexing item: {item}. Error: {e}")
-
-        except FileNotFoundError:
-            print(f"File not found: {file}")
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON in file: {file}")
-
-print("Indexing completed!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import contextvars
+import json
+import threading
+import time
+
+# ================================
+# Metrics and Stage Timing
+# ================================
+#
+# Counters and histograms in the Prometheus text format (no client library needed),
+# plus per-request stage timing: code on the request path wraps its steps in
+# `with stage("parse"):`; while a request is being timed (start_timing() was called
+# in this thread/context) the elapsed time is added to that request's stages,
+# otherwise stage() costs a single context variable lookup.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 2)
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for labels, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(names, labels + (f'{bound:g}',))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {entry[-2]:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {entry[-1]}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics of a process. Values owned by other objects (cache counters, the
+    index generation) are read at scrape time by collectors: functions returning
+    [(name, type, help, [(labels dict, value), ...]), ...].
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, function):
+        self.collectors.append(function)
+        return function
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# ================================
+# Stage Timing
+# ================================
+
+
+def start_timing():
+    """
+    Starts collecting stage timings for the current request. Returns a token for
+    stop_timing().
+    """
+    return _timings.set({})
+
+
+def stop_timing(token):
+    """
+    Returns {stage: seconds} of the request and stops collecting.
+    """
+    timings = _timings.get()
+    _timings.reset(token)
+    return timings or {}
+
+
+@contextmanager
+def stage(name):
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+class SlowLog:
+    """
+    Appends requests slower than threshold_ms, and requests that hit an error, to a
+    JSON-lines file with their stage timings.
+    """
+
+    def __init__(self, path, threshold_ms):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+
+    def record(self, method, path, status, seconds, timings, error=None):
+        if seconds * 1000 < self.threshold_ms and not error:
+            return False
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "method": method,
+            "path": path,
+            "status": status,
+            "ms": round(seconds * 1000, 2),
+            "stages_ms": {name: round(value * 1000, 2) for name, value in timings.items()},
+        }
+        if error:
+            entry["error"] = error
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Error writing slow request log: {e}")
+        return True
@@ -0,0 +1,196 @@
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+# ================================
+# Price Parsing
+# ================================
+
+# Approximate exchange rates used to bring every catalog onto CHF when neither the
+# rates cache nor the fallback file (see load_rates) is available
+RATES_TO_CHF = {
+    "CHF": 1.0,
+    "USD": 0.89,
+    "GBP": 1.13,
+    "EUR": 0.94,
+}
+
+# Currency symbols / codes as they appear in the scraped price strings
+CURRENCY_SYMBOLS = {
+    "CHF": "CHF",
+    "FR.": "CHF",
+    "USD": "USD",
+    "US$": "USD",
+    "$": "USD",
+    "GBP": "GBP",
+    "£": "GBP",
+    "EUR": "EUR",
+    "€": "EUR",
+}
+
+CURRENCY_PATTERN = re.compile(r"US\$|CHF|FR\.|USD|GBP|EUR|[$£€]", re.IGNORECASE)
+AMOUNT_PATTERN = re.compile(r"\d[\d.,']*")
+
+
+def parse_price(price_str, default_currency="CHF"):
+    """
+    Parses a scraped price such as "CHF16.99", "$13.49" or "£1,299.00".
+    Returns (currency, amount) or None if no amount can be found.
+    """
+    if not price_str:
+        return None
+
+    amount_match = AMOUNT_PATTERN.search(price_str)
+    if not amount_match:
+        return None
+
+    currency_match = CURRENCY_PATTERN.search(price_str)
+    currency = CURRENCY_SYMBOLS[currency_match.group(0).upper()] if currency_match else default_currency
+
+    amount = amount_match.group(0).rstrip(".,'").replace("'", "")
+    if "," in amount and "." in amount:
+        # "1,299.00" -> thousands separator is ","
+        amount = amount.replace(",", "")
+    elif "," in amount:
+        # "16,99" -> decimal comma, "1,299" -> thousands separator
+        whole, _, fraction = amount.rpartition(",")
+        amount = f"{whole.replace(',', '')}.{fraction}" if len(fraction) <= 2 else amount.replace(",", "")
+
+    try:
+        return currency, float(amount)
+    except ValueError:
+        return None
+
+
+def to_chf_cents(price_str, rates=RATES_TO_CHF):
+    """
+    Normalizes a scraped price string to an integer amount of CHF cents.
+    Returns None for missing or unparseable prices (e.g. "No price available").
+    """
+    parsed = parse_price(price_str)
+    if parsed is None:
+        return None
+
+    currency, amount = parsed
+    rate = rates.get(currency)
+    if rate is None:
+        return None
+    return int(round(amount * rate * 100))
+
+
+# ================================
+# Exchange Rates
+# ================================
+#
+# Rates are fetched at most once per RATES_TTL and cached in RATES_CACHE. Without
+# network access (or without forex_python) the stale cache is used, then the
+# RATES_FILE shipped with the data, then RATES_TO_CHF.
+
+RATES_CACHE = "data/rates_cache.json"
+RATES_FILE = "data/rates.json"
+RATES_TTL = 24 * 3600  # Seconds
+
+
+def fetch_rates(currencies=tuple(RATES_TO_CHF)):
+    """
+    Fetches the current rate to CHF of each currency. Needs forex_python and network access.
+    """
+    from forex_python.converter import CurrencyRates
+
+    converter = CurrencyRates()
+    return {currency: 1.0 if currency == "CHF" else float(converter.get_rate(currency, "CHF"))
+            for currency in currencies}
+
+
+def _read_rates(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {currency: float(rate) for currency, rate in data["rates"].items()}, data.get("fetched_at", 0)
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None, 0
+
+
+def load_rates(cache_file=RATES_CACHE, fallback_file=RATES_FILE, ttl=RATES_TTL, fetch=fetch_rates):
+    """
+    Returns (rates, source): the rates to CHF and where they came from
+    ("cache", "fetched", "stale cache", "fallback" or "built-in").
+    Pass fetch=None to stay offline.
+    """
+    cached, fetched_at = _read_rates(cache_file)
+    if cached and time.time() - fetched_at < ttl:
+        return cached, "cache"
+
+    if fetch is not None:
+        try:
+            rates = fetch()
+            tmp_file = cache_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": time.time(), "rates": rates}, f, indent=4)
+            os.replace(tmp_file, cache_file)
+            return rates, "fetched"
+        except Exception as e:
+            print(f"Error fetching exchange rates, using offline rates: {e}")
+
+    if cached:
+        return cached, "stale cache"
+    fallback, _ = _read_rates(fallback_file)
+    if fallback:
+        return fallback, "fallback"
+    return dict(RATES_TO_CHF), "built-in"
+
+
+# ================================
+# Batch Normalization
+# ================================
+
+# Placeholders written by the crawlers; these are missing prices, not parse failures
+MISSING_PRICES = {"", "No price available"}
+
+
+def normalize_prices(price_strs, rates=RATES_TO_CHF):
+    """
+    Converts a batch of scraped price strings to integer CHF cents in one pass.
+
+    Every distinct string is parsed once (catalogs repeat the same few hundred
+    prices), then the currency conversion and rounding run as NumPy array
+    operations over the whole batch.
+    Returns (cents, valid, failures): an int64 array, a boolean array marking the
+    entries that have a price, and [(position, price_str)] for the strings that
+    could not be parsed or are in a currency without a rate.
+    """
+    price_strs = ["" if price is None else str(price) for price in price_strs]
+    if not price_strs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), []
+
+    unique, inverse = np.unique(np.array(price_strs, dtype=str), return_inverse=True)
+    currencies = list(rates)
+    rate_table = np.array([rates[currency] for currency in currencies] + [np.nan])
+    unknown = len(currencies)
+
+    amounts = np.full(len(unique), np.nan)
+    currency_ids = np.full(len(unique), unknown)
+    for i, price_str in enumerate(unique):
+        parsed = parse_price(price_str)
+        if parsed is None:
+            continue
+        amounts[i] = parsed[1]
+        if parsed[0] in rates:
+            currency_ids[i] = currencies.index(parsed[0])
+
+    chf = amounts * rate_table[currency_ids] * 100
+    valid_unique = ~np.isnan(chf)
+    cents_unique = np.where(valid_unique, np.rint(np.nan_to_num(chf)), 0).astype(np.int64)
+
+    failed_unique = ~valid_unique & ~np.isin(unique, list(MISSING_PRICES))
+    failures = [(int(position), price_strs[position]) for position in np.flatnonzero(failed_unique[inverse])]
+    return cents_unique[inverse], valid_unique[inverse], failures
+
+
+def format_chf(cents):
+    if cents is None:
+        return "N/A"
+    return f"CHF{cents / 100:.2f}"
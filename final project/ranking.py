@@ -0,0 +1,148 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+import threading
+
+from prices import RATES_TO_CHF, normalize_prices
+
+# ================================
+# "Suggested for You" Ranking
+# ================================
+
+
+class SuggestionRanking:
+    """
+    Keeps every product with a positive score in two sorted orders (by score and
+    by CHF price), so that /suggested is a slice of a precomputed list.
+
+    Near-duplicates (see dedupe.py) are listed once: only the best-scored product of
+    each cluster is in the sorted lists.
+
+    Votes are applied with update(), which moves a single entry in O(log n) search
+    plus a list shift instead of re-sorting the whole catalog.
+
+    `price_cents` ({url: CHF cents or None}) are the prices the index sorts and
+    filters search results by, so both orders agree; without them the products'
+    prices are converted with `rates`.
+    """
+
+    def __init__(self, products, scores, version=0, rates=RATES_TO_CHF, clusters=None, price_cents=None):
+        self.products = products
+        self._lock = threading.Lock()
+        self._scores = {}        # url -> positive score
+        self._listed = {}        # cluster -> (url, score) of the product in the sorted lists
+        self._by_score = []      # [(-score, name, url)]
+        self._by_price = []      # [(price_cents, -score, name, url)] for priced items
+        self._unpriced = []      # [(-score, name, url)] for items without a usable price
+        if price_cents is None:
+            cents, valid, _ = normalize_prices([item.get("Price") for item in products.values()], rates)
+            price_cents = {url: price if has_price else None
+                           for url, price, has_price in zip(products, cents.tolist(), valid.tolist())}
+        self._price_cents = price_cents
+        self._clusters = clusters or {}  # url -> cluster ID, products not in it are their own cluster
+        self._members = defaultdict(list)
+        for url, cluster in self._clusters.items():
+            self._members[cluster].append(url)
+        self.version = version
+
+        with self._lock:
+            for url, score in scores.items():
+                if score > 0 and url in self.products:
+                    self._scores[url] = score
+            for cluster in {self._clusters.get(url, url) for url in self._scores}:
+                self._relist(cluster)
+
+    def __len__(self):
+        return len(self._listed)
+
+    # ----- maintenance -----
+
+    def _keys(self, url, score):
+        name = self.products[url]["Name"]
+        price = self._price_cents.get(url)
+        score_key = (-score, name, url)
+        price_key = (price, -score, name, url) if price is not None else None
+        return score_key, price_key
+
+    def _insert(self, url, score):
+        score_key, price_key = self._keys(url, score)
+        insort(self._by_score, score_key)
+        if price_key is not None:
+            insort(self._by_price, price_key)
+        else:
+            insort(self._unpriced, score_key)
+
+    def _remove(self, url, score):
+        score_key, price_key = self._keys(url, score)
+        del self._by_score[bisect_left(self._by_score, score_key)]
+        if price_key is not None:
+            del self._by_price[bisect_left(self._by_price, price_key)]
+        else:
+            del self._unpriced[bisect_left(self._unpriced, score_key)]
+
+    def _relist(self, cluster):
+        """
+        Puts the best-scored product of a cluster in the sorted lists (or none if no
+        product of the cluster has a positive score).
+        """
+        best = None
+        for url in self._members.get(cluster, (cluster,)):
+            score = self._scores.get(url)
+            if score is not None and (best is None or score > best[1]):
+                best = (url, score)
+
+        listed = self._listed.get(cluster)
+        if listed == best:
+            return
+        if listed is not None:
+            self._remove(*listed)
+            del self._listed[cluster]
+        if best is not None:
+            self._insert(*best)
+            self._listed[cluster] = best
+
+    def update(self, url, score):
+        """
+        Applies a product's new score. Items drop out when their score is no longer positive.
+        """
+        with self._lock:
+            if self._scores.get(url) == score:
+                return
+            if score > 0 and url in self.products:
+                self._scores[url] = score
+            else:
+                self._scores.pop(url, None)
+            self._relist(self._clusters.get(url, url))
+
+    def sync(self, store):
+        """
+        Pulls scores that other processes committed to the store since the last sync.
+        """
+        changes, version = store.changes_since(self.version)
+        for url, score in changes.items():
+            self.update(url, score)
+        self.version = version
+
+    # ----- reads -----
+
+    def page(self, order="", limit=None, offset=0):
+        """
+        Returns one page of suggestions. order is "" (by score), "low-high" or "high-low".
+        Items without a usable price come last in both price orders.
+        """
+        with self._lock:
+            if limit is None:
+                limit = len(self._listed)
+
+            if order == "low-high":
+                keys = self._by_price[offset:offset + limit]
+            elif order == "high-low":
+                end = max(len(self._by_price) - offset, 0)
+                keys = self._by_price[max(end - limit, 0):end][::-1]
+            else:
+                keys = self._by_score[offset:offset + limit]
+
+            if order in ("low-high", "high-low") and len(keys) < limit:
+                start = max(offset - len(self._by_price), 0)
+                keys += self._unpriced[start:start + limit - len(keys)]
+
+            return [dict(self.products[key[-1]], Score=self._scores[key[-1]]) for key in keys]
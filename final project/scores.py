@@ -0,0 +1,246 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# ================================
+# Vote / Score Store
+# ================================
+#
+# Votes are buffered in memory and flushed to SQLite in batches (group commit):
+# every flush appends the pending votes to the `votes` log and folds them into
+# the `scores` table inside a single transaction. Scores are keyed by product URL.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    url TEXT PRIMARY KEY,
+    score INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS scores_version ON scores (version);
+CREATE TABLE IF NOT EXISTS votes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    delta INTEGER NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class ScoreStore:
+    """
+    Like/dislike scores keyed by product URL, backed by SQLite in WAL mode.
+
+    batch_size / flush_interval control how many votes are grouped into one commit,
+    compact_every controls how often the vote log is trimmed to log_retention rows.
+    """
+
+    def __init__(self, path, batch_size=64, flush_interval=0.5, compact_every=100, log_retention=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.log_retention = log_retention
+
+        self._lock = threading.Lock()
+        self._pending = []          # [(url, delta, ts), ...] not yet committed
+        self._pending_delta = {}    # url -> summed delta of self._pending
+        self._flushes = 0
+        self._flusher_pid = None
+        self._conns = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    # ----- connection handling -----
+
+    def _connect(self):
+        # One connection per thread (and per process, after a fork)
+        conn = getattr(self._conns, "conn", None)
+        if conn is None or self._conns.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conns.conn = conn
+            self._conns.pid = os.getpid()
+        return conn
+
+    def _ensure_flusher(self):
+        # Background thread that commits buffered votes; started lazily so that
+        # it lives in the process that actually receives votes
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            # Checked again under the lock: concurrent first votes start one thread
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+            thread = threading.Thread(target=self._flush_loop, name="score-flusher", daemon=True)
+            thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing votes: {e}")
+
+    # ----- seeding -----
+
+    def seed_from_files(self, data_files):
+        """
+        Imports the 'Score' values stored in the catalog JSON files the first time
+        the store is created. The first occurrence of a URL wins.
+        """
+        conn = self._connect()
+        if conn.execute("SELECT value FROM meta WHERE key = 'seeded'").fetchone():
+            return
+
+        seeded = {}
+        for file_path in data_files:
+            try:
+                with open(file_path, "r", encoding="utf-8") as file:
+                    items = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                print(f"Could not seed scores from {file_path}: {e}")
+                continue
+            for item in items:
+                url = item.get("URL")
+                if url and url not in seeded:
+                    seeded[url] = item.get("Score", 0)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO scores (url, score, version) VALUES (?, ?, 0)",
+                [(url, score) for url, score in seeded.items() if score],
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seeded', ?)", (str(time.time()),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ----- votes -----
+
+    def vote(self, url, delta):
+        """
+        Records a vote and returns the product's new score. O(1): the vote is
+        buffered and committed with the next batch.
+        """
+        self._ensure_flusher()
+        with self._lock:
+            self._pending.append((url, delta, time.time()))
+            self._pending_delta[url] = self._pending_delta.get(url, 0) + delta
+            if len(self._pending) < self.batch_size:
+                return self._committed_score(url) + self._pending_delta[url]
+
+        self.flush()
+        return self.score(url)
+
+    def flush(self):
+        """
+        Commits all buffered votes in a single transaction.
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, deltas = self._pending, self._pending_delta
+            self._pending, self._pending_delta = [], {}
+
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT INTO votes (url, delta, ts) VALUES (?, ?, ?)", batch)
+                version = conn.execute("SELECT MAX(id) FROM votes").fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO scores (url, score, version) VALUES (?, ?, ?) "
+                    "ON CONFLICT (url) DO UPDATE SET score = score + excluded.score, version = excluded.version",
+                    [(url, delta, version) for url, delta in deltas.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                # Put the votes back so they are retried with the next flush
+                self._pending = batch + self._pending
+                for url, delta in deltas.items():
+                    self._pending_delta[url] = self._pending_delta.get(url, 0) + delta
+                raise
+
+            self._flushes += 1
+            compact = self._flushes % self.compact_every == 0
+
+        if compact:
+            self.compact()
+        return len(batch)
+
+    def compact(self):
+        """
+        Trims the vote log to the most recent log_retention entries (their effect is
+        already folded into `scores`) and truncates the WAL file.
+        """
+        conn = self._connect()
+        conn.execute(
+            "DELETE FROM votes WHERE id <= (SELECT MAX(id) FROM votes) - ?",
+            (self.log_retention,),
+        )
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # ----- reads -----
+
+    def _committed_score(self, url):
+        row = self._connect().execute("SELECT score FROM scores WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else 0
+
+    def score(self, url):
+        # Read under the lock so a concurrent flush cannot count a vote twice
+        with self._lock:
+            return self._committed_score(url) + self._pending_delta.get(url, 0)
+
+    def scores(self):
+        """
+        Returns {url: score} for every product that has been voted on, including
+        votes that have not been flushed yet.
+        """
+        with self._lock:
+            result = dict(self._connect().execute("SELECT url, score FROM scores"))
+            for url, delta in self._pending_delta.items():
+                result[url] = result.get(url, 0) + delta
+        return result
+
+    def version(self):
+        """
+        Latest committed vote id; changes_since() returns everything after it.
+        """
+        row = self._connect().execute("SELECT MAX(version) FROM scores").fetchone()
+        return row[0] or 0
+
+    def changes_since(self, version):
+        """
+        Returns ({url: score}, latest_version) for the scores committed after `version`,
+        e.g. by other worker processes.
+        """
+        changes = {}
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT url, score, version FROM scores WHERE version > ?", (version,)
+            ).fetchall()
+            for url, score, row_version in rows:
+                changes[url] = score + self._pending_delta.get(url, 0)
+                version = max(version, row_version)
+        return changes, version
+
+    def close(self):
+        self.flush()
+        conn = getattr(self._conns, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._conns.conn = None
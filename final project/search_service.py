@@ -0,0 +1,753 @@
+from array import array
+import base64
+import hashlib
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import math
+import os
+import threading
+import time
+
+from whoosh import collectors, scoring, sorting
+from whoosh.index import open_dir
+from whoosh.searching import Searcher
+from whoosh.qparser import MultifieldParser
+from whoosh.query import And, Every, NumericRange, Or, Term
+
+from cache import LRUCache
+from catalog import image_key
+from metrics import stage
+from prices import format_chf
+from versions import CurrentVersion
+
+# ================================
+# Search Service
+# ================================
+
+
+class CursorError(ValueError):
+    """
+    A cursor that is malformed, or that search_page() can't continue from.
+    """
+
+
+def encode_cursor(view, offset, key=""):
+    data = json.dumps({"v": view, "o": offset, "k": key}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Returns (index view name, offset, search key) for a cursor produced by
+    encode_cursor(). Raises CursorError for malformed cursors.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        view, offset, key = str(data["v"]), int(data["o"]), str(data["k"])
+    except Exception:
+        raise CursorError(f"Invalid cursor: {cursor!r}")
+    if offset < 0:
+        raise CursorError(f"Invalid cursor: {cursor!r}")
+    return view, offset, key
+
+
+def search_key(query_string, sort, min_price, max_price, boost, facets):
+    """
+    Short hash of the search parameters a cursor continues: a cursor is only valid
+    for the (query, filters, sort, boost) of the page it came from.
+    """
+    data = json.dumps([query_string, sort, min_price, max_price, boost, facet_filters(facets)])
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:12]
+
+
+FACETS = ("category", "brand", "source")  # Fields results can be filtered and counted by
+FACET_LIMIT = 20                          # Values listed per facet, most frequent first
+
+
+def facet_filters(selected):
+    """
+    Canonical, hashable form of {facet: [values]}: values of one facet are OR-ed,
+    facets are AND-ed. Unknown facets and empty selections are dropped.
+    """
+    return tuple(
+        (facet, tuple(sorted(set(selected[facet]))))
+        for facet in FACETS if selected and selected.get(facet)
+    )
+
+
+# Fields a query is matched against, with their weight
+SEARCH_FIELDS = {"name": 1.0, "category_words": 0.5}
+
+DEFAULT_BOOST = 0.5  # Popularity boost used when a request does not set one
+MAX_BOOST = 5.0
+POPULARITY_REFRESH = 5.0  # Seconds between the popularity snapshots boosted rankings are cached for
+ORDERING_WINDOW = 240  # Docnums ranked per ordering at first (10 pages); deeper pages double it
+
+
+def popularity(score):
+    """
+    Signed log of a like score: each doubling of likes counts the same.
+    """
+    return math.copysign(math.log1p(abs(score)), score)
+
+
+class PopularityWeighting(scoring.BM25F):
+    """
+    BM25F multiplied by exp(boost * popularity) = (1 + |likes|) ** (+-boost), read
+    from the docnum-aligned popularity array of an IndexView. Made for each search,
+    so searches with different boosts run side by side; with boost 0 this is plain
+    BM25F.
+    """
+
+    use_final = True
+
+    def __init__(self, popularity, boost=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.popularity = popularity
+        self.boost = boost
+
+    def final(self, searcher, docnum, score):
+        if self.boost and docnum < len(self.popularity):
+            return score * math.exp(self.boost * self.popularity[docnum])
+        return score
+
+
+class WeightedTopCollector(collectors.TopCollector):
+    """
+    A TopCollector that applies the final() of the weighting in the search context.
+    TopCollector takes it from the searcher, which is the same for every search.
+    """
+
+    def prepare(self, top_searcher, q, context):
+        super().prepare(top_searcher, q, context)
+        weighting = context.weighting
+        self.final_fn = weighting.final if weighting is not None and weighting.use_final else None
+
+
+class CollapsibleFilter(collectors.FilterCollector):
+    """
+    A FilterCollector that goes inside a CollapseCollector. Searcher.search() wraps
+    the filter around the collapse, and FilterCollector collects straight into its
+    child, so filtered searches were not collapsed.
+    """
+
+    def matches(self):
+        allow, offset = self._allow, self.offset
+        return (sub_docnum for sub_docnum in self.child.matches() if offset + sub_docnum in allow)
+
+    def collect_matches(self):
+        for sub_docnum in self.matches():
+            self.child.collect(sub_docnum)
+
+
+class CollapsibleSort(collectors.SortingCollector):
+    """
+    A SortingCollector that goes inside a CollapseCollector. The collapse removes the
+    products a better one of their cluster replaced, and SortingCollector.remove()
+    searches the list of every match collected so far for each one.
+    """
+
+    def prepare(self, top_searcher, q, context):
+        super().prepare(top_searcher, q, context)
+        self.removed = set()
+
+    def remove(self, global_docnum):
+        self.removed.add(global_docnum)
+
+    def results(self):
+        if self.removed:
+            self.items = [item for item in self.items if item[1] not in self.removed]
+        return super().results()
+
+
+def query_parser(schema):
+    fields = [field for field in SEARCH_FIELDS if field in schema]  # Older indexes only have name
+    return MultifieldParser(fields, schema, fieldboosts=SEARCH_FIELDS)
+
+
+class IndexView:
+    """
+    One generation of the index being served, with the state that belongs to it: the
+    popularity array aligned with its docnums and the query parser for its schema.
+
+    Searches run side by side, each on a searcher checked out of the view's pool:
+    Whoosh reads the index files through file positions its readers share, so a
+    searcher serves one search at a time. The pool grows to the number of concurrent
+    searches; new searchers open the view's own segments, never a later generation.
+    A search keeps its view when the service moves on to another one, and its
+    searcher is closed instead of returned to the retired view.
+    """
+
+    def __init__(self, ix, searcher, index_dir):
+        self.ix = ix
+        self.index_dir = index_dir
+        self.schema = searcher.schema
+        self.generation = searcher.reader().generation()
+        self.key = (index_dir, self.generation)  # Generations of different versions can have the same number
+        self.name = f"{os.path.basename(os.path.normpath(index_dir or ''))}/{self.generation}"  # For cursors
+        self.parser = query_parser(self.schema)
+        self.popularity = array("d", bytes(8 * searcher.doc_count_all()))
+        self.scores_version = 0  # Last ScoreStore version applied to `popularity`
+        self._segments = [reader.segment() for reader, _ in searcher.reader().leaf_readers()
+                          if reader.segment() is not None]
+        self._idle = [searcher]
+        self._lock = threading.Lock()
+        self.retired = False
+
+    def _open(self):
+        reader = self.ix._reader(self.ix.storage, self.schema, self._segments, self.generation)
+        return Searcher(reader, fromindex=self.ix)
+
+    @contextmanager
+    def searcher(self):
+        with self._lock:
+            searcher = self._idle.pop() if self._idle else None
+        if searcher is None:
+            searcher = self._open()
+        try:
+            yield searcher
+        finally:
+            with self._lock:
+                keep = not self.retired
+                if keep:
+                    self._idle.append(searcher)
+            if not keep:
+                searcher.close()
+
+    def close_idle(self, retire=False):
+        """
+        Closes the searchers not in use; with `retire`, the ones in use are closed
+        when their search finishes.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.retired = self.retired or retire
+        for searcher in idle:
+            searcher.close()
+
+
+class SearchService:
+    """
+    The index being served, plus LRU caches for parsed queries, result orderings,
+    materialized pages and facet counts.
+
+    The first request for a (query, filters, sort) ranks the top ORDERING_WINDOW matches
+    once and keeps only their docnums and the total; the pages inside the window are
+    slices of that array plus the stored fields of their hits. A page past the window
+    ranks a window twice as deep (and so on), so the first page costs the same however
+    many products match.
+
+    Searches run in parallel on the searchers of an IndexView; the lock is only held
+    to follow index changes and to update the popularity bookkeeping. A new view is
+    opened when the index generation (_MAIN_N.toc) changes and, given the `root` of a
+    versioned index (see versions.py), when another version is published. Cache keys
+    include the view, and the caches are cleared when it changes, so stale hits are
+    never served; a running search finishes on the view it started on.
+
+    `on_change` is called with a searcher of every index generation the service
+    moves to (the first one included), under the lock and before any search runs on
+    it, so state derived from the index can be rebuilt in step with the searcher.
+
+    Relevance ranking can be boosted by the like scores of a ScoreStore. Votes update
+    the docnum-aligned popularity array in place (no reindex). Orderings that used the
+    boost are cached per popularity snapshot, which moves forward at most every
+    POPULARITY_REFRESH seconds: a vote shows in the cached rankings within that time,
+    and a stream of votes doesn't turn every search into a cache miss.
+    """
+
+    def __init__(self, ix, cache_size=256, ordering_cache_size=64, scores=None, root=None, on_change=None):
+        self.current_version = CurrentVersion(root) if root else None
+        self.scores = scores
+        self.on_change = on_change
+        self.popularity_version = 0  # Bumped whenever a like score changes
+        self.ranked_version = 0      # Popularity snapshot of the cached boosted rankings
+        self._ranked_at = 0.0
+        self.queries = LRUCache(cache_size)                # (view, query string) -> parsed query
+        self.orderings = LRUCache(ordering_cache_size)     # (view, query, filters, sort) -> (docnums, total)
+        self.results = LRUCache(cache_size)                # (view, query, filters, sort, page) -> page dict
+        self.facet_counts_cache = LRUCache(cache_size)     # (view, query, filters) -> facet counts
+        self._lock = threading.Lock()
+        self._popularity_lock = threading.Lock()  # Orders the popularity updates of concurrent searches
+        self.refreshes = 0
+        self.view = None
+        self._use_view(ix, getattr(ix.storage, "folder", None))
+        self.ranked_version = self.popularity_version
+
+    @property
+    def ix(self):
+        return self.view.ix
+
+    @property
+    def index_dir(self):
+        return self.view.index_dir
+
+    @property
+    def generation(self):
+        return self.view.generation
+
+    @contextmanager
+    def _locked(self):
+        # Time spent waiting for another request's refresh shows up as the "lock" stage
+        with stage("lock"):
+            self._lock.acquire()
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    def _current_view(self):
+        # Must be called with self._lock held
+        view = self.view
+        index_dir = self.current_version.path() if self.current_version is not None else view.index_dir
+        if index_dir != view.index_dir:
+            with stage("refresh"):
+                try:
+                    ix = open_dir(index_dir)
+                except Exception as e:
+                    # Keep serving the version that is open; the next request tries again
+                    print(f"Error opening index version {index_dir}: {e}")
+                    return view
+                self._use_view(ix, index_dir)
+        elif view.ix.latest_generation() != view.generation:
+            with stage("refresh"):
+                self._use_view(view.ix, index_dir)
+        return self.view
+
+    def _use_view(self, ix, index_dir):
+        # Must be called with self._lock held (or from __init__)
+        old = self.view
+        searcher = ix.searcher()
+        self.view = IndexView(ix, searcher, index_dir)
+        if old is not None:
+            old.close_idle(retire=True)
+            self.refreshes += 1
+        self.queries.clear()
+        self.orderings.clear()
+        self.results.clear()
+        self.facet_counts_cache.clear()
+        self._load_popularity(self.view, searcher)
+        self._changed(searcher)
+
+    def _changed(self, searcher):
+        # Must be called with self._lock held
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(searcher)
+        except Exception as e:
+            # The previous state stays in use; it is rebuilt with the next generation
+            print(f"Error updating the state of index generation {self.generation}: {e}")
+
+    def _begin(self):
+        """
+        The current view, after following any change of the index.
+        """
+        with self._locked():
+            return self._current_view()
+
+    def refresh(self):
+        """
+        Moves to the published version or the latest generation of the index now,
+        as the next search would.
+        """
+        self._begin()
+
+    def reopen(self):
+        """
+        Drops the searchers that are not in use, e.g. in a worker process forked from
+        the process that opened the index: Whoosh reads segment files that are not
+        memory-mapped with seek() + read(), and forked processes share the file
+        positions. Searchers with their own file handles are opened as needed; the
+        caches stay valid.
+        """
+        with self._lock:
+            self.view.close_idle()
+
+    # ----- popularity -----
+
+    def _set_popularity(self, view, searcher, url, score):
+        # Returns whether the boost of the product changed
+        docnum = searcher.document_number(url=url)
+        if docnum is None or view.popularity[docnum] == popularity(score):
+            return False
+        view.popularity[docnum] = popularity(score)
+        return True
+
+    def _load_popularity(self, view, searcher):
+        # Docnums change with every index generation, so each view has its own array
+        if self.scores is None:
+            return
+        view.scores_version = self.scores.version()
+        for url, score in self.scores.scores().items():
+            if score:
+                self._set_popularity(view, searcher, url, score)
+        self.popularity_version += 1
+
+    def _popularity_snapshot(self, view, searcher):
+        """
+        Applies the votes other worker processes committed, and returns the popularity
+        snapshot that boosted rankings are cached for.
+        """
+        with self._popularity_lock:
+            if self.scores is not None:
+                changes, view.scores_version = self.scores.changes_since(view.scores_version)
+                # Votes made in this process were applied by update_popularity() already
+                changed = [self._set_popularity(view, searcher, url, score) for url, score in changes.items()]
+                if any(changed):
+                    self.popularity_version += 1
+            now = time.monotonic()
+            if self.ranked_version != self.popularity_version and now - self._ranked_at >= POPULARITY_REFRESH:
+                self.ranked_version, self._ranked_at = self.popularity_version, now
+            return self.ranked_version
+
+    def update_popularity(self, url, score):
+        """
+        Applies a vote made in this process to the relevance boost.
+        """
+        view = self._begin()
+        with view.searcher() as searcher, self._popularity_lock:
+            if self._set_popularity(view, searcher, url, score):
+                self.popularity_version += 1
+
+    def parse(self, query_string, view=None):
+        view = view or self.view
+        key = (view.key, query_string)
+        query = self.queries.get(key)
+        if query is None:
+            with stage("parse"):
+                # Every() is a single matcher; "*" would match every field separately
+                query = view.parser.parse(query_string) if query_string else Every()
+            self.queries.put(key, query)
+        return query
+
+    def price_sort(self, sort):
+        # Products without a price come last in both directions
+        return sorting.MultiFacet([
+            sorting.QueryFacet({0: NumericRange("price_cents", None, None)}, other=1),
+            sorting.FieldFacet("price_cents", reverse=sort == "high-low"),
+        ])
+
+    def _filter(self, searcher, min_price, max_price, facets, exclude=None):
+        """
+        The filter query for a price range and facet_filters() (without the facet
+        `exclude`), or None.
+        """
+        queries = []
+        if min_price is not None or max_price is not None:
+            queries.append(NumericRange(
+                "price_cents",
+                int(round(min_price * 100)) if min_price is not None else None,
+                int(round(max_price * 100)) if max_price is not None else None,
+            ))
+        for facet, values in facets:
+            if facet != exclude and facet in searcher.schema:
+                queries.append(Or([Term(facet, value) for value in values]))
+        if not queries:
+            return None
+        return queries[0] if len(queries) == 1 else And(queries)
+
+    def _collector(self, searcher, collector, query_filter):
+        # Wraps a collector like Searcher.search() does, but with the filter inside
+        # the collapse (see CollapsibleFilter)
+        if query_filter is not None:
+            collector = CollapsibleFilter(collector, query_filter)
+        if "cluster" in searcher.schema:
+            # Near-duplicates (colourways, the same listing in two catalogs) show up once
+            collector = collectors.CollapseCollector(collector, "cluster")
+        return collector
+
+    def _ordering(self, view, searcher, query_string, sort, min_price, max_price, boost, facets=(), end=0,
+                  ranking_version=None):
+        """
+        Returns (ranked docnums, total matches) for a (query, filters, sort, boost). The
+        docnums cover at least the first `end` results, or all of them if there are fewer.
+        """
+        key = (view.key, query_string, (min_price, max_price), facets, sort, boost, ranking_version)
+        cached = self.orderings.get(key)
+        if cached is not None and (end <= len(cached[0]) or len(cached[0]) == cached[1]):
+            return cached
+        window = ORDERING_WINDOW
+        while window < end:
+            window *= 2
+
+        if sort in ("low-high", "high-low"):
+            collector = CollapsibleSort(self.price_sort(sort), limit=window)
+        else:
+            # replace=0: Whoosh would drop the parts of the query whose text scores can't
+            # reach the top `window` any more, but the popularity boost can lift them
+            collector = WeightedTopCollector(window, usequality=False, replace=0)
+        collector = self._collector(searcher, collector, self._filter(searcher, min_price, max_price, facets))
+        query = self.parse(query_string, view)
+        # The boost goes with this search only, searches on other threads have their own
+        context = searcher.context(weighting=PopularityWeighting(view.popularity, boost))
+        with stage("search"):
+            searcher.search_with_collector(query, collector, context=context)
+            search_results = collector.results()
+
+        docnums = array("l", (docnum for _, docnum in search_results.top_n))
+        if isinstance(collector, collectors.CollapseCollector):
+            # Every product has a cluster, so the matches list one product per cluster.
+            # (len(search_results) also counts products that a better one of their
+            # cluster replaced while collecting.)
+            total = len(collector.lists)
+        else:
+            total = len(search_results)
+        cached = (docnums, total)
+        self.orderings.put(key, cached)
+        return cached
+
+    def _hit(self, fields):
+        # Placeholders were resolved to "" by index.py
+        image_url = fields.get("image", "")
+
+        price_cents = fields.get("price_cents")
+        return {
+            "name": fields["name"],
+            "price": format_chf(price_cents) if price_cents is not None else fields.get("price", "N/A"),
+            "price_cents": price_cents,
+            "url": fields.get("url", "#"),
+            "image": image_url,
+            "thumbnail": image_key(image_url),
+        }
+
+    def search_page(self, query_string, page=1, pagelen=20, sort="", min_price=None, max_price=None,
+                    offset=None, boost=DEFAULT_BOOST, facets=None, speller=None, cursor=None):
+        """
+        Returns one page of results as a dict with the page's hits, the total number of
+        matches and a cursor for the next page (None on the last page). Pages are served
+        from the cache when the same (query, filters, sort, page) was already answered
+        for this index generation.
+
+        sort is "" (relevance), "low-high" or "high-low"; min_price/max_price are in CHF.
+        Sorting and price filtering happen inside the engine over the whole result set.
+        `offset` takes precedence over `page`, and a `cursor` (the `next_cursor` of the
+        previous page) over both. A cursor is only valid for the same query, filters,
+        sort and boost in the same index version and generation: otherwise its offset
+        would point into another result list, and CursorError is raised. `boost` is the
+        strength of the popularity boost in relevance order (0 = pure BM25F). `facets`
+        is {facet: [values]}, see facet_filters().
+
+        With a spelling.Speller, misspelled words are corrected: a query without
+        matches is answered for its correction (the page's `query` is the corrected
+        query, `original_query` what was typed), a query with matches gets the
+        correction as a `suggestion` ("did you mean").
+        """
+        key = search_key(query_string, sort, min_price, max_price, boost, facets)
+        view_name = None
+        if cursor:
+            view_name, offset, cursor_key = decode_cursor(cursor)
+            if cursor_key != key:
+                raise CursorError("The cursor is for another search, start again from the first page")
+
+        options = dict(page=page, pagelen=pagelen, sort=sort, min_price=min_price, max_price=max_price,
+                       offset=offset, boost=boost, facets=facets, view_name=view_name)
+        result = self._search_page(query_string, **options)
+        with stage("spelling"):
+            correction = speller.correct_query(query_string) if speller and query_string else query_string
+        if correction != query_string:
+            if result["total"] == 0:
+                corrected = self._search_page(correction, **options)
+                result = dict(corrected, original_query=query_string) if corrected["total"] else \
+                    dict(result, suggestion=correction)
+            else:
+                result = dict(result, suggestion=correction)
+
+        # Cached pages are shared by every search that reaches them; the cursor is for this one
+        next_offset = result["offset"] + result["pagelen"]
+        next_cursor = encode_cursor(result["view"], next_offset, key) if next_offset < result["total"] else None
+        return dict(result, next_cursor=next_cursor)
+
+    def _search_page(self, query_string, page, pagelen, sort, min_price, max_price, offset, boost, facets,
+                     view_name=None):
+        facets = facet_filters(facets)
+        if offset is None:
+            offset = (max(page, 1) - 1) * pagelen
+
+        # Price orders don't use scores
+        boost = boost or 0.0
+        if not math.isfinite(boost):
+            boost = DEFAULT_BOOST  # nan would make every score nan
+        boost = min(max(boost, 0.0), MAX_BOOST) if sort not in ("low-high", "high-low") else 0.0
+
+        view = self._begin()
+        if view_name is not None and view_name != view.name:
+            raise CursorError("The index changed since the cursor was made, start again from the first page")
+        with view.searcher() as searcher:
+            ranking_version = None
+            if boost:
+                with stage("popularity"):
+                    ranking_version = self._popularity_snapshot(view, searcher)
+            key = (view.key, query_string, (min_price, max_price), facets, sort, offset, pagelen, boost,
+                   ranking_version)
+            result = self.results.get(key)
+            if result is not None:
+                return result
+
+            docnums, total = self._ordering(view, searcher, query_string, sort, min_price, max_price, boost, facets,
+                                            end=offset + pagelen, ranking_version=ranking_version)
+            with stage("hits"):
+                hits = [self._hit(searcher.stored_fields(docnum)) for docnum in docnums[offset:offset + pagelen]]
+
+        result = {
+            "query": query_string,
+            "hits": hits,
+            "total": total,
+            "offset": offset,
+            "page": offset // pagelen + 1,
+            "pagelen": pagelen,
+            "generation": view.generation,
+            "view": view.name,
+        }
+        self.results.put(key, result)
+        return result
+
+    def facet_counts(self, query_string, min_price=None, max_price=None, facets=None, limit=FACET_LIMIT):
+        """
+        Returns {facet: [(value, count), ...]} for the matches of a query, most frequent
+        values first. The counts of a facet ignore the selection in that facet itself
+        (so its other values stay visible) but apply every other filter. Products are
+        counted the way results list them, one per cluster, so the counts of a facet
+        never add up to more than the total. Cached per index generation.
+        """
+        facets = facet_filters(facets)
+        view = self._begin()
+        key = (view.key, query_string, (min_price, max_price), facets, limit)
+        counts = self.facet_counts_cache.get(key)
+        if counts is not None:
+            return counts
+
+        with view.searcher() as searcher:
+
+            # Facets without a selection share one search; each selected facet needs its own
+            selected = {facet for facet, _ in facets}
+            fields = [facet for facet in FACETS if facet in searcher.schema]
+            passes = [[facet] for facet in fields if facet in selected]
+            passes.append([facet for facet in fields if facet not in selected])
+
+            counts = {}
+            query = self.parse(query_string, view)
+            for group in passes:
+                if not group:
+                    continue
+                query_filter = self._filter(searcher, min_price, max_price, facets,
+                                            exclude=group[0] if group[0] in selected else None)
+                with stage("facets"):
+                    values = self._count_values(searcher, self._listed_docnums(searcher, query, query_filter), group)
+                for facet in group:
+                    ranked = [(value, count) for value, count in values[facet].items() if value]
+                    ranked.sort(key=lambda entry: (-entry[1], entry[0]))
+                    counts[facet] = ranked[:limit]
+        self.facet_counts_cache.put(key, counts)
+        return counts
+
+    def _listed_docnums(self, searcher, query, query_filter):
+        """
+        The docnums of every match the way results list them: one product per cluster.
+        (A FacetCollector inside the collapse would also count the products that a
+        better one of their cluster replaced while collecting.)
+        """
+        if "cluster" not in searcher.schema:
+            collector = self._collector(searcher, collectors.UnlimitedCollector(), query_filter)
+            searcher.search_with_collector(query, collector)
+            return list(collector.results().docs())
+        # Collapsing needs scores to pick a cluster's product; the products it keeps are in `lists`
+        collector = self._collector(searcher, collectors.TopCollector(1, usequality=False, replace=0), query_filter)
+        searcher.search_with_collector(query, collector)
+        return [docnum for best in collector.lists.values() for _, docnum in best]
+
+    def _count_values(self, searcher, docnums, fields):
+        """
+        Returns {field: {value: count}} over `docnums`, read from the fields' sortable columns.
+        """
+        counts = {field: defaultdict(int) for field in fields}
+        docnums = sorted(docnums)
+        leaves = searcher.leaf_searchers()
+        for position, (leaf, offset) in enumerate(leaves):
+            end = leaves[position + 1][1] if position + 1 < len(leaves) else searcher.doc_count_all()
+            segment = docnums[bisect_left(docnums, offset):bisect_left(docnums, end)]
+            if not segment:
+                continue
+            reader = leaf.reader()
+            for field in fields:
+                if not reader.has_column(field):
+                    continue
+                column = reader.column_reader(field, translate=True)
+                field_counts = counts[field]
+                for docnum in segment:
+                    field_counts[column[docnum - offset]] += 1
+        return counts
+
+    def similar(self, url, table, limit=12):
+        """
+        Returns (product hit, similar product hits) from a similar.SimilarItems table,
+        or (None, []) if the URL is not indexed. Raises ValueError if the table was
+        built for another index generation (its docnums would point at other products).
+        """
+        view = self._begin()
+        if table.generation != view.generation or table.index_dir not in (None, view.index_dir):
+            raise ValueError(f"Similar items table is for generation {table.generation} of "
+                             f"{table.index_dir}, the index is at {view.generation} of {view.index_dir}")
+        with view.searcher() as searcher:
+            docnum = searcher.document_number(url=url)
+            if docnum is None:
+                return None, []
+            return (self._hit(searcher.stored_fields(docnum)),
+                    [self._hit(searcher.stored_fields(other)) for other in table.similar(docnum, limit)])
+
+    def visually_similar(self, url, visual, limit=12):
+        """
+        Returns (product hit, hits of the products whose images look most alike) from a
+        visual.VisualIndex, or (None, []) if the URL is not indexed. Near-duplicates of
+        the product are left out and every cluster appears once.
+        """
+        with self._begin().searcher() as searcher:
+            fields = searcher.document(url=url)
+            if fields is None:
+                return None, []
+
+            hits = []
+            seen_clusters = {fields.get("cluster", url)}
+            key = image_key(fields.get("image"))
+            # Ask for extra neighbours: some are near-duplicates or no longer indexed
+            for other_key, distance in visual.similar(key, k=limit * 3) if key else []:
+                for other in searcher.documents(image_key=other_key):
+                    cluster = other.get("cluster", other["url"])
+                    if cluster not in seen_clusters:
+                        seen_clusters.add(cluster)
+                        hits.append(dict(self._hit(other), distance=distance))
+                if len(hits) >= limit:
+                    break
+            return self._hit(fields), hits[:limit]
+
+    def has_product(self, url):
+        """
+        Whether a product URL is in the served index.
+        """
+        with self._begin().searcher() as searcher:
+            return searcher.document_number(url=url) is not None
+
+    def image_url(self, key):
+        """
+        The image URL of an indexed product for a thumbnail key, or None.
+        """
+        with self._begin().searcher() as searcher:
+            fields = searcher.document(image_key=key)
+        return fields["image"] if fields else None
+
+    def stats(self):
+        return {
+            "index_dir": self.index_dir,
+            "generation": self.generation,
+            "refreshes": self.refreshes,
+            "query_cache": self.queries.stats(),
+            "ordering_cache": self.orderings.stats(),
+            "result_cache": self.results.stats(),
+            "facet_cache": self.facet_counts_cache.stats(),
+        }
+
+    def close(self):
+        with self._lock:
+            self.view.close_idle(retire=True)
@@ -0,0 +1,159 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import app as web_app
+
+# ================================
+# Production Server
+# ================================
+#
+# A pre-forking server: the master process loads and warms up the app once
+# (app.create_app, app.warm_up), opens the listening socket and forks --workers
+# processes that each accept connections on it with a threaded Werkzeug server.
+# Everything loaded before the fork (products, suggestion ranking, autocomplete,
+# spelling and similar-items tables, the popularity array, the warmed search caches)
+# is shared copy-on-write; gc.freeze() keeps the garbage collector from touching,
+# and thereby copying, those objects in the workers. Votes are buffered per worker
+# and committed to the score database, from which the other workers pick them up.
+#
+# Workers that die are restarted. SIGTERM or SIGINT stops the workers (each one
+# stops accepting, finishes its requests and flushes its buffered votes) and then
+# the master.
+#
+#   python serve.py --workers 4 --port 8000
+
+WORKERS = os.cpu_count() or 1
+KEEPALIVE_TIMEOUT = 5       # Seconds an idle connection is kept open
+STOP_TIMEOUT = 30           # Seconds workers get to exit before they are killed
+RESTART_DELAY = 1.0         # Seconds before a worker that died is replaced
+
+
+class RequestHandler(WSGIRequestHandler):
+    # Idle keep-alive connections are closed, so a stopping worker waits for
+    # requests in progress, not for clients
+    timeout = KEEPALIVE_TIMEOUT
+
+
+def listen(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock):
+    """
+    Serves requests in a forked worker until SIGTERM. Returns the exit status.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The master handles Ctrl-C
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    status = 0
+    try:
+        web_app.after_fork()
+        host, port = sock.getsockname()[:2]
+        server = make_server(host, port, web_app.app, threaded=True, request_handler=RequestHandler,
+                             fd=sock.fileno())
+        server.daemon_threads = False  # server_close() waits for the requests in progress
+        # shutdown() waits for serve_forever() to return, so it can't run in the signal handler
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+        server.serve_forever()
+        server.server_close()
+    except Exception as e:
+        print(f"Error in worker {os.getpid()}: {e}")
+        status = 1
+    try:
+        web_app.score_store.close()  # Commits the votes still buffered in this worker
+    except Exception as e:
+        print(f"Error flushing votes in worker {os.getpid()}: {e}")
+        status = 1
+    return status
+
+
+def spawn(sock):
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            status = run_worker(sock)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)  # Never return into the master's code or run its atexit handlers
+    return pid
+
+
+def stop(workers):
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.time() + STOP_TIMEOUT
+    while workers and time.time() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            workers.discard(pid)
+        else:
+            time.sleep(0.1)
+    for pid in workers:
+        print(f"Worker {pid} did not stop, killing it")
+        os.kill(pid, signal.SIGKILL)
+
+
+def serve(host, port, workers=WORKERS, index_dir=None, scores_db=None):
+    start = time.perf_counter()
+    sock = listen(host, port)  # Bound first: connections wait in the backlog while warming up
+    web_app.create_app(index_dir=index_dir, scores_db=scores_db)
+    web_app.warm_up()
+    gc.freeze()
+    print(f"Loaded and warmed up in {time.perf_counter() - start:.1f}s, "
+          f"serving on http://{host}:{port} with {workers} workers")
+
+    stopping = False
+
+    def request_stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    running = {spawn(sock) for _ in range(workers)}
+    while not stopping:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if not pid:
+            time.sleep(0.2)
+            continue
+        running.discard(pid)
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting it")
+        time.sleep(RESTART_DELAY)
+        if not stopping:
+            running.add(spawn(sock))
+
+    stop(running)
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the app with pre-forked worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker processes (default: %(default)s)")
+    parser.add_argument("--index-dir", default=None, help="Index directory (default: INDEX_DIR or 'index')")
+    parser.add_argument("--scores-db", default=None, help="Score database (default: SCORES_DB or data/scores.db)")
+    args = parser.parse_args()
+    serve(args.host, args.port, max(args.workers, 1), args.index_dir, args.scores_db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+from collections import Counter
+import os
+import re
+
+import numpy as np
+from scipy import sparse
+
+# ================================
+# Similar Items
+# ================================
+#
+# Offline job, run by index.py after every index commit: products are vectorized
+# with TF-IDF over their name and category, grouped with mini-batch k-means, and
+# each product's top-N most similar products (cosine similarity, searched in its own
+# group and the nearest other group) are saved as one row of an int32 array indexed
+# by docnum. /similar answers with a row lookup.
+
+SIMILAR_FILE = "similar.npz"  # Written next to the index segments
+TOP_N = 12
+BLOCK_ROWS = 512  # Products compared with their candidates at a time
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokens(fields):
+    words = WORD_PATTERN.findall(fields.get("name", "").lower())
+    category = fields.get("category")
+    # The category counts as much as a few name words
+    return words + [f"category:{category.lower()}"] * 3 if category else words
+
+
+def tfidf(documents):
+    """
+    L2-normalized TF-IDF rows (sublinear tf, smoothed idf) as a CSR matrix.
+    """
+    vocabulary = {}
+    indptr, indices, counts = [0], [], []
+    for document in documents:
+        for term, count in Counter(document).items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (1 + np.log(np.array(counts, dtype=np.float64)), np.array(indices, dtype=np.int32), np.array(indptr)),
+        shape=(len(documents), max(len(vocabulary), 1)),
+    )
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + matrix.shape[0]) / (1 + df)) + 1
+    matrix = matrix @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def nearest_centroids(matrix, centroids, block_rows=BLOCK_ROWS):
+    """
+    The index of the most similar centroid of every row. Rows are compared a block at
+    a time, so the dense similarities take at most block_rows x k.
+    """
+    labels = np.empty(matrix.shape[0], dtype=np.intp)
+    for start in range(0, matrix.shape[0], block_rows):
+        similarities = matrix[start:start + block_rows] @ centroids.T
+        labels[start:start + block_rows] = np.asarray(similarities.argmax(axis=1)).ravel()
+    return labels
+
+
+def minibatch_kmeans(matrix, k, batch_size=256, iterations=100, seed=0):
+    """
+    Spherical mini-batch k-means (Sculley, 2010) on L2-normalized rows.
+    Returns (labels, centroids).
+    """
+    rng = np.random.RandomState(seed)
+    n = matrix.shape[0]
+    centroids = matrix[rng.choice(n, size=k, replace=False)].toarray()
+    counts = np.zeros(k)
+
+    for _ in range(iterations):
+        batch = matrix[rng.choice(n, size=min(batch_size, n), replace=False)]
+        labels = nearest_centroids(batch, centroids)
+        # Per-centroid learning rate 1 / (points assigned so far): each centroid moves
+        # to the running mean of its old position and the batch rows assigned to it,
+        # the same result as updating it one row at a time
+        assigned = np.bincount(labels, minlength=k)
+        new_counts = counts + assigned
+        moved = np.flatnonzero(assigned)
+        weights = sparse.csr_matrix((1 / new_counts[labels], (labels, np.arange(len(labels)))),
+                                    shape=(k, len(labels)))
+        centroids[moved] *= (counts[moved] / new_counts[moved])[:, None]
+        centroids[moved] += (weights @ batch)[moved].toarray()
+        counts = new_counts
+        norms = np.linalg.norm(centroids, axis=1)
+        norms[norms == 0] = 1
+        centroids /= norms[:, None]
+
+    return nearest_centroids(matrix, centroids), centroids
+
+
+def build_similar(ix, top_n=TOP_N, k=None, block_rows=BLOCK_ROWS):
+    """
+    Returns (neighbours, groups): neighbours[docnum] holds the docnums of the top_n
+    most similar products (-1 padded, deleted docnums are empty rows), groups[docnum]
+    is the product's k-means group. Near-duplicates of a product (see dedupe.py) are
+    left out of its neighbours and each near-duplicate cluster appears once.
+    """
+    with ix.reader() as reader:
+        size = reader.doc_count_all()
+        docnums, documents, clusters = [], [], []
+        for docnum, fields in reader.iter_docs():
+            docnums.append(docnum)
+            documents.append(tokens(fields))
+            clusters.append(fields.get("cluster", fields.get("url")))
+
+    neighbours = np.full((size, top_n), -1, dtype=np.int32)
+    groups = np.full(size, -1, dtype=np.int32)
+    if not docnums:
+        return neighbours, groups
+
+    matrix = tfidf(documents)
+    del documents  # The token lists take more memory than the matrix
+    docnums = np.array(docnums, dtype=np.int32)
+    k = k or max(1, min(int(np.sqrt(len(docnums) / 2)), len(docnums)))
+    labels, centroids = minibatch_kmeans(matrix, k)
+    groups[docnums] = labels
+
+    # Each group is compared with itself and its nearest other group
+    centroid_similarity = centroids @ centroids.T
+    np.fill_diagonal(centroid_similarity, -np.inf)
+    nearest_group = centroid_similarity.argmax(axis=1) if k > 1 else np.zeros(1, dtype=int)
+
+    members = [np.flatnonzero(labels == group) for group in range(k)]
+    for group in range(k):
+        if not len(members[group]):
+            continue
+        candidates = np.union1d(members[group], members[nearest_group[group]])
+        candidate_matrix = matrix[candidates].T
+        depth = min(top_n * 3, len(candidates))
+        # The rows are compared with the candidates a block at a time, so the dense
+        # similarities take at most block_rows x candidates
+        for start in range(0, len(members[group]), block_rows):
+            rows = members[group][start:start + block_rows]
+            similarities = (matrix[rows] @ candidate_matrix).toarray()
+            best = np.argpartition(-similarities, depth - 1, axis=1)[:, :depth]
+            best_similarities = np.take_along_axis(similarities, best, axis=1)
+            best = np.take_along_axis(best, np.argsort(-best_similarities, axis=1), axis=1)
+
+            for row, ordered in zip(rows, candidates[best]):
+                seen_clusters = {clusters[row]}
+                found = []
+                for candidate in ordered:
+                    if clusters[candidate] not in seen_clusters:
+                        seen_clusters.add(clusters[candidate])
+                        found.append(docnums[candidate])
+                        if len(found) == top_n:
+                            break
+                neighbours[docnums[row], :len(found)] = found
+
+    return neighbours, groups
+
+
+def write_similar(ix, index_dir, top_n=TOP_N):
+    """
+    Rebuilds the similar-items table for the index and saves it into index_dir.
+    Returns the number of groups.
+    """
+    neighbours, groups = build_similar(ix, top_n=top_n)
+    path = os.path.join(index_dir, SIMILAR_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, neighbours=neighbours, groups=groups, generation=np.array(ix.latest_generation()))
+    os.replace(tmp_path, path)  # Readers never see a half-written file
+    return len(set(groups[groups >= 0].tolist()))
+
+
+class SimilarItems:
+    """
+    The precomputed neighbour table. Docnums are only valid for the index generation
+    the table was built from.
+    """
+
+    def __init__(self, neighbours, groups, generation=None, index_dir=None):
+        self.neighbours = neighbours
+        self.groups = groups
+        self.generation = generation
+        self.index_dir = index_dir  # Versions of a versioned index can have the same generation
+
+    @classmethod
+    def load(cls, index_dir):
+        with np.load(os.path.join(index_dir, SIMILAR_FILE)) as data:
+            return cls(data["neighbours"], data["groups"], generation=int(data["generation"]), index_dir=index_dir)
+
+    def similar(self, docnum, limit=TOP_N):
+        if not 0 <= docnum < len(self.neighbours):
+            return []
+        row = self.neighbours[docnum, :limit]
+        return row[row >= 0].tolist()
@@ -0,0 +1,193 @@
+from collections import Counter
+import os
+import re
+import zlib
+
+import numpy as np
+from whoosh.lang.porter import stem
+
+from cache import LRUCache
+
+# ================================
+# Spelling Correction
+# ================================
+#
+# SymSpell-style correction over the words of the indexed products. Every word is
+# stored with the strings obtained by deleting up to MAX_EDIT_DISTANCE of its first
+# PREFIX_LENGTH characters; a misspelling shares one of these deletes with the words
+# it is close to. A lookup generates the (few) deletes of the query word and looks
+# them up in a table sorted by hash, so its cost doesn't grow with the vocabulary.
+# index.py rebuilds the table after every commit.
+
+SPELLING_FILE = "spelling.npz"  # Written next to the index segments
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_WORD_LENGTH = 3             # Shorter words are never corrected
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+OPERATORS = {"AND", "OR", "NOT", "ANDNOT", "ANDMAYBE", "TO"}
+
+
+def words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def deletes(word, max_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH):
+    """
+    The word's prefix and every string made by deleting up to max_distance characters from it.
+    """
+    frontier = {word[:prefix_length]}
+    result = set(frontier)
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        result |= frontier
+    return result
+
+
+def _hash(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def edit_distance(a, b, max_distance=MAX_EDIT_DISTANCE):
+    """
+    Damerau-Levenshtein (optimal string alignment) distance, or max_distance + 1 if
+    it is larger than max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+def allowed_distance(word):
+    # One typo in short words, two from 8 letters on
+    return max(1, min(MAX_EDIT_DISTANCE, len(word) // 4))
+
+
+def build_spelling(ix):
+    """
+    Collects the words of the indexed names and categories with their document
+    frequencies and builds the deletes table. Returns (words, counts, stems,
+    delete_hashes, delete_words): stems are the stems of the words (as indexed by
+    the stemming analyzer), delete_hashes is sorted, delete_words[i] is the position
+    in `words` of the word that delete_hashes[i] belongs to.
+    """
+    counts = Counter()
+    with ix.reader() as reader:
+        for fields in reader.all_stored_fields():
+            counts.update(set(words(f"{fields.get('name', '')} {fields.get('category', '')}")))
+
+    vocabulary = sorted(word for word in counts if len(word) >= MIN_WORD_LENGTH)
+    hashes, positions = [], []
+    for position, word in enumerate(vocabulary):
+        for delete in deletes(word):
+            hashes.append(_hash(delete))
+            positions.append(position)
+
+    hashes = np.array(hashes, dtype=np.uint32)
+    order = np.argsort(hashes, kind="stable")
+    return (vocabulary, [counts[word] for word in vocabulary], sorted({stem(word) for word in counts}),
+            hashes[order], np.array(positions, dtype=np.int32)[order])
+
+
+def write_spelling(ix, index_dir):
+    """
+    Rebuilds the spelling table for the index and saves it into index_dir.
+    Returns the number of words.
+    """
+    vocabulary, counts, stems, delete_hashes, delete_words = build_spelling(ix)
+    path = os.path.join(index_dir, SPELLING_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, words=np.array(vocabulary, dtype=str), counts=np.array(counts, dtype=np.int64),
+                 stems=np.array(stems, dtype=str),
+                 delete_hashes=delete_hashes, delete_words=delete_words,
+                 generation=np.array(ix.latest_generation()))
+    os.replace(tmp_path, path)  # Readers never see a half-written file
+    return len(vocabulary)
+
+
+class Speller:
+    """
+    The precomputed deletes table: corrects single words and whole queries.
+    """
+
+    def __init__(self, vocabulary, counts, stems, delete_hashes, delete_words, generation=None, cache_size=4096):
+        self.words = list(vocabulary)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.stems = set(stems)
+        self.delete_hashes = np.asarray(delete_hashes, dtype=np.uint32)
+        self.delete_words = np.asarray(delete_words, dtype=np.int32)
+        self.generation = generation
+        self.position = {word: i for i, word in enumerate(self.words)}
+        self.cache = LRUCache(cache_size)  # query string -> corrected query string
+
+    @classmethod
+    def load(cls, index_dir, **kwargs):
+        with np.load(os.path.join(index_dir, SPELLING_FILE)) as data:
+            return cls(data["words"].tolist(), data["counts"], data["stems"].tolist(),
+                       data["delete_hashes"], data["delete_words"],
+                       generation=int(data["generation"]), **kwargs)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        # "jumpers" is found through the stem of "jumper"
+        word = word.lower()
+        return word in self.position or stem(word) in self.stems
+
+    def lookup(self, word, max_distance=None):
+        """
+        Returns [(word, distance, document frequency)] for the known words at most
+        max_distance edits from `word`, best first (closest, then most frequent).
+        """
+        word = word.lower()
+        max_distance = allowed_distance(word) if max_distance is None else min(max_distance, MAX_EDIT_DISTANCE)
+        probes = np.array([_hash(delete) for delete in deletes(word, max_distance)], dtype=np.uint32)
+        starts = np.searchsorted(self.delete_hashes, probes, side="left")
+        ends = np.searchsorted(self.delete_hashes, probes, side="right")
+
+        suggestions = []
+        for position in {int(p) for start, end in zip(starts, ends) for p in self.delete_words[start:end]}:
+            candidate = self.words[position]
+            distance = edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                suggestions.append((candidate, distance, int(self.counts[position])))
+        suggestions.sort(key=lambda entry: (entry[1], -entry[2], entry[0]))
+        return suggestions
+
+    def correct(self, word):
+        """
+        The most likely intended word: the word itself if it is known or too short,
+        otherwise its best suggestion (or the word if there is none).
+        """
+        lowered = word.lower()
+        if len(lowered) < MIN_WORD_LENGTH or lowered in self:
+            return word
+        suggestions = self.lookup(lowered)
+        return suggestions[0][0] if suggestions else word
+
+    def correct_query(self, query_string):
+        """
+        Replaces the unknown words of a query by their corrections. Query syntax
+        (operators, field names, quotes) is left as it is.
+        """
+        corrected = self.cache.get(query_string)
+        if corrected is None:
+            corrected = re.sub(
+                r"(?<![\w:])[^\W\d_]+(?![\w:])",
+                lambda match: match.group(0) if match.group(0) in OPERATORS else self.correct(match.group(0)),
+                query_string,
+            )
+            self.cache.put(query_string, corrected)
+        return corrected
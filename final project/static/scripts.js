@@ -1,18 +1,18 @@
-function likeProduct(productName) {
+function likeProduct(productUrl, productName) {
     fetch("/like_product", {
         method: "POST",
         headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
-        body: `product_id=${encodeURIComponent(productName)}`
+        body: `product_id=${encodeURIComponent(productUrl)}`
     }).then(response => response.json())
       .then(data => alert(`Liked: ${productName}`))
       .catch(error => console.error('Error:', error));
 }
 
-function dislikeProduct(productName) {
+function dislikeProduct(productUrl, productName) {
     fetch("/dislike_product", {
         method: "POST",
         headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
-        body: `product_id=${encodeURIComponent(productName)}`
+        body: `product_id=${encodeURIComponent(productUrl)}`
     }).then(response => response.json())
       .then(data => alert(`Disliked: ${productName}`))
       .catch(error => console.error('Error:', error));
@@ -26,7 +26,7 @@ function fetchSuggestions(query) {
         return;
     }
 
-    fetch(`/suggest?query=${query}`)
+    fetch(`/suggest?query=${encodeURIComponent(query)}`)
         .then(response => response.json())
         .then(data => {
             const suggestionsBox = document.getElementById("suggestions-box");
@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import urllib.request
+
+import pytest
+
+# ================================
+# Test Fixtures
+# ================================
+#
+# The tests run the app on a real versioned index: the saved listing pages in
+# crawl/fixtures are served by crawl/fixture_server.py and run through the site
+# extractors into an NDJSON catalog, which index.py builds once per session. Every
+# test gets its own copy of the index root, votes database and thumbnail cache, with
+# product images from image_server.py.
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CRAWL_DIR = os.path.join(os.path.dirname(APP_DIR), "crawl")
+
+sys.path.insert(0, APP_DIR)
+sys.path.append(CRAWL_DIR)  # After the app: the crawler has its own app.py and index.py
+
+import fixture_server  # noqa: E402
+import image_server  # noqa: E402
+from sites import SITES  # noqa: E402
+from thumbnails import ThumbnailCache  # noqa: E402
+
+
+def run_index(root, *args):
+    """
+    Runs index.py on the index root like a cron job would. Returns its output.
+    """
+    result = subprocess.run([sys.executable, "index.py", "--offline", "--index-dir", str(root)]
+                            + [str(arg) for arg in args], cwd=APP_DIR, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+
+def write_ndjson(path, items):
+    with open(path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    return path
+
+
+@pytest.fixture(scope="session")
+def catalog(tmp_path_factory):
+    """
+    The products of the crawl fixture pages (two pages per site).
+    """
+    server, base_url = fixture_server.serve()
+    products = []
+    try:
+        for site_name, site in SITES.items():
+            for page in (1, 2):
+                with urllib.request.urlopen(site.page_url(f"{base_url}/{site_name}/", page)) as response:
+                    products.extend(site.extract(response.read().decode("utf-8")))
+    finally:
+        server.shutdown()
+    assert products
+    return products
+
+
+@pytest.fixture(scope="session")
+def catalog_file(catalog, tmp_path_factory):
+    return write_ndjson(tmp_path_factory.mktemp("crawl") / "catalog.ndjson", catalog)
+
+
+@pytest.fixture(scope="session")
+def built_index(catalog_file, tmp_path_factory):
+    root = tmp_path_factory.mktemp("built") / "index"
+    assert "Published" in run_index(root, catalog_file)
+    return root
+
+
+@pytest.fixture
+def index_root(built_index, tmp_path):
+    root = tmp_path / "index"
+    shutil.copytree(built_index, root)
+    return root
+
+
+@pytest.fixture
+def web_app(index_root, tmp_path, monkeypatch):
+    """
+    The app module, serving the test's copy of the index.
+    """
+    monkeypatch.chdir(APP_DIR)  # The data files are relative paths
+    import app
+
+    app.create_app(index_dir=str(index_root), scores_db=str(tmp_path / "scores.db"))
+    server, image_base_url = image_server.serve()
+    app.thumbnails = ThumbnailCache(directory=str(tmp_path / "thumbs"), image_base_url=image_base_url)
+    yield app
+    server.shutdown()
+    app.search_service.close()
+    app.score_store.close()
+
+
+@pytest.fixture
+def client(web_app):
+    return web_app.app.test_client()
@@ -0,0 +1,122 @@
+import pytest
+
+from conftest import run_index, write_ndjson
+
+# ================================
+# Search, Votes and Publishing
+# ================================
+
+DELTA_PRODUCT = {
+    "URL": "https://www.asos.com/test/velvet-delta-trousers/prd/99999901",
+    "Name": "Velvet Delta Trousers",
+    "Price": "CHF 30.00",
+    "Image": "https://images.asos-media.com/products/velvet-delta-trousers/99999901-1",
+    "Category": "Trousers",
+}
+
+
+def search(client, **params):
+    response = client.get("/api/search", query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def all_pages(client, **params):
+    """
+    Follows next_cursor from the first page to the last. Returns the pages.
+    """
+    pages = [search(client, **params)]
+    while pages[-1]["next_cursor"]:
+        pages.append(search(client, cursor=pages[-1]["next_cursor"], **params))
+    return pages
+
+
+def like(client, url, route="/like_product"):
+    return client.post(route, data={"product_id": url})
+
+
+@pytest.mark.parametrize("query", ["", "dress", "top", "black"])
+def test_facet_counts_never_exceed_total(client, query):
+    page = search(client, query=query)
+    assert page["facets"]
+    for facet, values in page["facets"].items():
+        assert sum(value["count"] for value in values) <= page["total"], facet
+    # Every listed product comes from exactly one site
+    assert sum(value["count"] for value in page["facets"]["source"]) == page["total"]
+
+
+def test_facet_filter_total_matches_its_count(client):
+    counts = search(client, query="")["facets"]["source"]
+    for value in counts:
+        assert search(client, query="", source=value["value"])["total"] == value["count"]
+
+
+@pytest.mark.parametrize("sort", ["", "low-high", "high-low"])
+def test_cursor_pages_list_every_result_once(client, sort):
+    pages = all_pages(client, query="", price=sort, pagelen=7)
+    urls = [hit["url"] for page in pages for hit in page["results"]]
+    assert len(pages) > 2
+    assert len(urls) == len(set(urls)) == pages[0]["total"]
+    if sort == "low-high":
+        prices = [hit["price_cents"] for page in pages for hit in page["results"]]
+        assert prices == sorted(prices)
+
+
+def test_cursor_of_another_search_is_rejected(client):
+    cursor = search(client, query="", pagelen=5)["next_cursor"]
+    assert client.get("/api/search", query_string={"query": "dress", "cursor": cursor}).status_code == 400
+    assert client.get("/api/search", query_string={"query": "", "price": "low-high", "pagelen": 5,
+                                                   "cursor": cursor}).status_code == 400
+    assert client.get("/api/search", query_string={"query": "", "cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_vote_on_indexed_product(client):
+    url = search(client, query="dress")["results"][0]["url"]
+    liked = like(client, url)
+    assert liked.status_code == 200
+    disliked = like(client, url, "/dislike_product")
+    assert disliked.status_code == 200
+    assert disliked.get_json()["new_score"] == liked.get_json()["new_score"] - 1
+
+
+def test_vote_on_unknown_product_is_rejected(client):
+    assert like(client, "https://www.asos.com/not/indexed/prd/1").status_code == 404
+
+
+def test_delta_product_can_be_found_and_voted_on(client, index_root, tmp_path):
+    assert like(client, DELTA_PRODUCT["URL"]).status_code == 404
+
+    feed = write_ndjson(tmp_path / "asos.delta.ndjson", [dict(DELTA_PRODUCT, op="upsert", change="new")])
+    assert "Published" in run_index(index_root, "--delta", feed)
+
+    hits = search(client, query="velvet delta")["results"]
+    assert DELTA_PRODUCT["URL"] in [hit["url"] for hit in hits]
+    assert like(client, DELTA_PRODUCT["URL"]).status_code == 200
+    suggested = client.get("/suggested", query_string={"limit": 200})
+    assert suggested.status_code == 200
+    assert DELTA_PRODUCT["Name"].encode() in suggested.data
+
+
+def test_app_follows_published_version(client, index_root, catalog, tmp_path):
+    first = search(client, query="", pagelen=5)
+    assert not search(client, query="velvet delta")["total"]
+
+    catalog_file = write_ndjson(tmp_path / "catalog.ndjson", catalog + [DELTA_PRODUCT])
+    assert "Published" in run_index(index_root, catalog_file)
+
+    page = search(client, query="", pagelen=5)
+    assert page["total"] == first["total"] + 1
+    assert search(client, query="velvet delta")["results"][0]["url"] == DELTA_PRODUCT["URL"]
+    # Cursors name the version they were made for
+    assert client.get("/api/search", query_string={"query": "", "pagelen": 5,
+                                                   "cursor": first["next_cursor"]}).status_code == 400
+
+
+def test_thumbnail_is_fetched_resized_and_cached(client, web_app):
+    hit = next(hit for hit in search(client, query="")["results"] if hit["thumbnail"])
+    for _ in range(2):
+        response = client.get(f"/thumb/{hit['thumbnail']}.webp")
+        assert response.status_code == 200
+        assert response.mimetype == "image/webp"
+    assert web_app.thumbnails.misses == 1
+    assert client.get(f"/thumb/{'0' * 40}.webp").status_code == 404
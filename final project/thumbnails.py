@@ -0,0 +1,230 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import io
+import os
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from PIL import Image
+from whoosh.index import open_dir
+
+from cache import LRUCache
+from catalog import image_key
+from versions import current_dir
+
+# ================================
+# Product Images and Thumbnails
+# ================================
+#
+# Product images are resolved when indexing: placeholders and missing images become
+# "" and real images get a key (SHA-1 of the URL) that is indexed, so /thumb/<key>
+# can only fetch images of indexed products. A thumbnail is fetched once, resized,
+# stored as WebP in THUMB_DIR and then served from disk. The directory is an LRU
+# bounded to max_bytes: serving a file refreshes its mtime, eviction removes the
+# oldest files.
+#
+# IMAGE_BASE_URL (e.g. http://127.0.0.1:8001, see image_server.py) fetches the images
+# from another host: only the scheme and host of the image URLs are replaced, so the
+# thumbnail keys stay the same.
+
+THUMB_DIR = "data/thumbs"
+THUMB_SIZE = (320, 400)        # Bounding box, the aspect ratio is kept
+THUMB_QUALITY = 80
+MAX_CACHE_BYTES = 256 << 20
+FETCH_TIMEOUT = 10             # Seconds
+FAILURE_TTL = 300              # Seconds before a failed image is fetched again
+TOUCH_INTERVAL = 3600          # Refresh a file's mtime at most once per hour
+IMAGE_BASE_URL = os.environ.get("IMAGE_BASE_URL")
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/91.0.4472.124 Safari/537.36"
+)
+
+
+def make_thumbnail(data, size=THUMB_SIZE, quality=THUMB_QUALITY):
+    """
+    Resizes image bytes to fit in `size` and re-encodes them as WebP.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        image.thumbnail(size)
+        output = io.BytesIO()
+        image.save(output, "WEBP", quality=quality, method=4)
+    return output.getvalue()
+
+
+def rebase_image_url(image_url, base_url):
+    """
+    image_url with its scheme and host replaced by base_url; unchanged if base_url is empty.
+    """
+    if not base_url:
+        return image_url
+    parts = urlsplit(image_url)
+    return base_url.rstrip("/") + parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def fetch_image(image_url, timeout=FETCH_TIMEOUT):
+    request = urllib.request.Request(image_url, headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+class ThumbnailCache:
+    """
+    Size-bounded on-disk LRU of WebP thumbnails, shared by all processes using the
+    same directory.
+    """
+
+    def __init__(self, directory=THUMB_DIR, max_bytes=MAX_CACHE_BYTES, fetch=fetch_image,
+                 image_base_url=IMAGE_BASE_URL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fetch = fetch
+        self.image_base_url = image_base_url
+        self.failures = LRUCache(4096)  # key -> time of the last failed fetch
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(size for _, size, _ in self._files())
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".webp")
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".webp"):
+                    stat = os.stat(os.path.join(root, name))
+                    yield os.path.join(root, name), stat.st_size, stat.st_mtime
+
+    def _lock(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key):
+        """
+        Returns the path of a cached thumbnail or None.
+        """
+        path = self._cached(key)
+        if path:
+            self.hits += 1
+        return path
+
+    def _cached(self, key):
+        path = self.path(key)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        now = time.time()
+        if now - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass  # Evicted by another process meanwhile
+        return path
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+        return path
+
+    def evict(self, target=0.9):
+        """
+        Removes the least recently used thumbnails until the cache is below
+        target * max_bytes.
+        """
+        files = sorted(self._files(), key=lambda entry: entry[2])
+        self.size = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if self.size <= self.max_bytes * target:
+                break
+            try:
+                os.remove(path)
+                self.size -= size
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def thumbnail(self, key, image_url):
+        """
+        Returns the path of the thumbnail of image_url, fetching and resizing it on
+        the first request. Returns None if the image cannot be fetched.
+        """
+        path = self.get(key)
+        if path:
+            return path
+
+        with self._lock(key):
+            path = self._cached(key)  # Fetched by another request meanwhile
+            if path:
+                return path
+            failed_at = self.failures.get(key)
+            if failed_at is not None and time.time() - failed_at < FAILURE_TTL:
+                return None
+
+            self.misses += 1
+            source_url = rebase_image_url(image_url, self.image_base_url)
+            try:
+                return self.put(key, make_thumbnail(self.fetch(source_url)))
+            except Exception as e:
+                print(f"Error fetching image {source_url}: {e}")
+                self.failures.put(key, time.time())
+                return None
+            finally:
+                with self._locks_lock:
+                    self._locks.pop(key, None)
+
+    def prefill(self, image_urls, workers=8):
+        """
+        Fetches the thumbnails of all image_urls that are not cached yet.
+        Returns (fetched, failed).
+        """
+        pending = {image_key(url): url for url in image_urls if url}
+        pending = {key: url for key, url in pending.items() if not self._cached(key)}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            paths = list(executor.map(lambda item: self.thumbnail(*item), pending.items()))
+        fetched = sum(1 for path in paths if path)
+        return fetched, len(paths) - fetched
+
+    def stats(self):
+        return {"bytes": self.size, "max_bytes": self.max_bytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+def indexed_images(ix):
+    with ix.reader() as reader:
+        return {fields["image"] for fields in reader.all_stored_fields() if fields.get("image")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefill the thumbnail cache with the images of the indexed products.")
+    parser.add_argument("--index-dir", default="index")
+    parser.add_argument("--thumb-dir", default=THUMB_DIR)
+    parser.add_argument("--max-mb", type=int, default=MAX_CACHE_BYTES >> 20, help="Cache size limit in MB")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel downloads")
+    parser.add_argument("--image-base-url", default=IMAGE_BASE_URL,
+                        help="Fetch the images from this host instead (default: IMAGE_BASE_URL)")
+    args = parser.parse_args()
+
+    cache = ThumbnailCache(args.thumb_dir, max_bytes=args.max_mb << 20, image_base_url=args.image_base_url)
+    start = time.time()
+    fetched, failed = cache.prefill(indexed_images(open_dir(current_dir(args.index_dir))), workers=args.workers)
+    print(f"Thumbnails prefilled: {fetched} fetched, {failed} failed in {time.time() - start:.1f}s "
+          f"({cache.size >> 20} MB cached).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import argparse
+import os
+import shutil
+import time
+
+from whoosh.index import exists_in, open_dir
+
+from autocomplete import AUTOCOMPLETE_FILE, Autocomplete
+from similar import SIMILAR_FILE, SimilarItems
+from spelling import SPELLING_FILE, Speller
+
+# ================================
+# Index Versions (blue/green)
+# ================================
+#
+#   index/CURRENT               name of the version being served
+#   index/versions/<version>/   a complete Whoosh index with its derived tables
+#
+# index.py never writes to the version being served: it builds into a new version
+# directory (an incremental update starts from hard links to the current version's
+# files, which Whoosh never modifies in place), validates it and publishes it by
+# atomically replacing CURRENT. The app follows the pointer on its next request
+# (SearchService switches readers between searches, so a search that is running
+# finishes on the old one). Old versions are garbage-collected: the newest
+# KEEP_VERSIONS stay for rollbacks, and no version is deleted until GC_GRACE
+# seconds after it was replaced, so every worker has moved on.
+#
+# An index directory without CURRENT (built before versions, or by the benchmark)
+# is served as it is.
+#
+#   python versions.py                 list the versions
+#   python versions.py --publish NAME  serve another version, e.g. roll back
+#   python versions.py --gc            delete old versions
+
+POINTER_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+KEEP_VERSIONS = 3          # Published versions kept, the current one included
+GC_GRACE = 600             # Seconds after a publish before old versions are deleted
+MIN_DOC_RATIO = 0.5        # A new version with fewer documents than this share of the current one fails validation
+SMOKE_QUERIES = ["dress", "top", "jeans", "black"]
+DERIVED_TABLES = {AUTOCOMPLETE_FILE: Autocomplete, SIMILAR_FILE: SimilarItems, SPELLING_FILE: Speller}
+RETIRED_FILE = "RETIRED"   # Written into a version when it stops being served
+UNLINKED_FILES = {"MAIN_WRITELOCK", RETIRED_FILE}  # Never shared between versions
+
+
+def version_path(root, name):
+    return os.path.join(root, VERSIONS_DIR, name)
+
+
+def current_version(root):
+    """
+    Name of the published version, or None.
+    """
+    try:
+        with open(os.path.join(root, POINTER_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_dir(root):
+    """
+    Directory of the index being served from `root`.
+    """
+    name = current_version(root)
+    return version_path(root, name) if name else root
+
+
+def list_versions(root):
+    try:
+        return sorted(os.listdir(os.path.join(root, VERSIONS_DIR)))  # Names sort by creation time
+    except FileNotFoundError:
+        return []
+
+
+class CurrentVersion:
+    """
+    Follows the CURRENT pointer of an index root. path() costs one stat() while the
+    pointer is unchanged (publish() replaces the file, so its inode changes).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._stamp = None
+        self._path = None
+
+    def path(self):
+        try:
+            stat = os.stat(os.path.join(self.root, POINTER_FILE))
+            stamp = (stat.st_ino, stat.st_mtime_ns)
+        except OSError:
+            stamp = None
+        if stamp != self._stamp or self._path is None:
+            self._path = current_dir(self.root)
+            self._stamp = stamp
+        return self._path
+
+
+# ================================
+# Building and Publishing
+# ================================
+
+
+def new_version(root, base=None):
+    """
+    Creates an empty version directory, or one holding hard links to (copies of,
+    where the file system can't link) the index files in `base`. Returns its path.
+    """
+    name = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+    path = version_path(root, name)
+    os.makedirs(path)
+    if base:
+        for entry in os.scandir(base):
+            if not entry.is_file() or entry.name in UNLINKED_FILES or entry.name == POINTER_FILE:
+                continue
+            target = os.path.join(path, entry.name)
+            try:
+                os.link(entry.path, target)
+            except OSError:
+                shutil.copy2(entry.path, target)
+    return path
+
+
+def validate(path, previous=None, min_doc_ratio=MIN_DOC_RATIO, queries=SMOKE_QUERIES):
+    """
+    Checks a built version before it is published. Returns a list of problems (empty
+    if it can be served): the index must open and have documents, not too many fewer
+    than the `previous` version, its derived tables must load and match its
+    generation, and the smoke queries must find something wherever the previous
+    version did, with facet counts that add up to no more than their total.
+    """
+    from search_service import SearchService  # Imported here: search_service imports this module
+
+    if not exists_in(path):
+        return [f"No index in {path}"]
+    problems = []
+    service = SearchService(open_dir(path))
+    old = None
+    try:
+        doc_count = service.ix.doc_count()
+        if not doc_count:
+            problems.append("The index has no documents")
+        for name, table in DERIVED_TABLES.items():
+            try:
+                generation = table.load(path).generation
+            except Exception as e:
+                problems.append(f"{name} does not load: {e}")
+                continue
+            if generation is not None and generation != service.generation:
+                problems.append(f"{name} is for generation {generation}, the index is at {service.generation}")
+
+        old = SearchService(open_dir(previous)) if previous and exists_in(previous) else None
+        if old is not None:
+            old_count = old.ix.doc_count()
+            if doc_count < old_count * min_doc_ratio:
+                problems.append(f"{doc_count} documents, the current version has {old_count}")
+        for query in queries:
+            total = service.search_page(query, pagelen=1)["total"]
+            old_total = old.search_page(query, pagelen=1)["total"] if old is not None else 0
+            if old_total and not total:
+                problems.append(f"{query!r} finds nothing, the current version finds {old_total}")
+            for facet, values in service.facet_counts(query, limit=None).items():
+                counted = sum(count for _, count in values)
+                if counted > total:
+                    problems.append(f"{query!r} finds {total} products, its {facet} counts add up to {counted}")
+    finally:
+        service.close()
+        if old is not None:
+            old.close()
+    return problems
+
+
+def publish(root, path):
+    """
+    Makes the version at `path` the one being served. Returns the previous version.
+    """
+    name = os.path.basename(os.path.normpath(path))
+    if not exists_in(version_path(root, name)):
+        raise ValueError(f"No index in version {name!r}")
+    previous = current_version(root)
+    pointer = os.path.join(root, POINTER_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer + ".tmp", pointer)  # Readers see the old or the new name, never a partial one
+
+    # When the replaced version (or unversioned index) stopped being served, for collect_garbage()
+    retired = version_path(root, previous) if previous else root
+    if previous != name and (previous or exists_in(root)):
+        with open(os.path.join(retired, RETIRED_FILE), "w", encoding="utf-8") as f:
+            f.write(time.strftime("%Y-%m-%dT%H:%M:%S") + "\n")
+    retired_marker = os.path.join(path, RETIRED_FILE)
+    if os.path.exists(retired_marker):
+        os.remove(retired_marker)  # Served again, e.g. after a rollback
+    return previous
+
+
+def discard(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def collect_garbage(root, keep=KEEP_VERSIONS, grace=GC_GRACE):
+    """
+    Deletes the versions older than the newest `keep` (the current one included),
+    builds that were never published and the index files of the unversioned layout.
+    Nothing is deleted less than `grace` seconds after it stopped being served (or,
+    for a build, was last written to). Returns the deleted names.
+    """
+    current = current_version(root)
+    if current is None:
+        return []
+    now = time.time()
+
+    def idle(path):
+        # Seconds since the version was replaced, or since a build last wrote to it
+        marker = os.path.join(path, RETIRED_FILE)
+        return now - os.stat(marker if os.path.exists(marker) else path).st_mtime
+
+    deleted = []
+    versions = list_versions(root)
+    older = [name for name in versions if name < current]
+    rollbacks = set(older[-(keep - 1):]) if keep > 1 else set()
+    for name in versions:
+        path = version_path(root, name)
+        if name == current or name in rollbacks or idle(path) < grace:
+            continue
+        try:
+            shutil.rmtree(path)
+            deleted.append(name)
+        except OSError as e:
+            # e.g. still open on Windows; retried by the next collection
+            print(f"Could not delete index version {name}: {e}")
+
+    # Index files left in the root by the unversioned layout
+    if os.path.exists(os.path.join(root, RETIRED_FILE)) and idle(root) >= grace:
+        for entry in os.scandir(root):
+            if entry.is_file() and (entry.name.startswith(("_MAIN_", "MAIN_")) or entry.name in DERIVED_TABLES
+                                    or entry.name == RETIRED_FILE):
+                try:
+                    os.remove(entry.path)
+                    deleted.append(entry.name)
+                except OSError as e:
+                    print(f"Could not delete {entry.name}: {e}")
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, publish and garbage-collect index versions.")
+    parser.add_argument("--index-dir", default="index", help="Index root (default: %(default)s)")
+    parser.add_argument("--publish", metavar="VERSION", help="Serve this version")
+    parser.add_argument("--gc", action="store_true", help="Delete old versions")
+    parser.add_argument("--grace", type=float, default=GC_GRACE,
+                        help="Seconds a replaced version is kept (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.publish:
+        previous = publish(args.index_dir, version_path(args.index_dir, args.publish))
+        print(f"Serving {args.publish} (was {previous}).")
+    if args.gc:
+        deleted = collect_garbage(args.index_dir, grace=args.grace)
+        print(f"Deleted {len(deleted)} old versions and files." if deleted else "Nothing to delete.")
+
+    current = current_version(args.index_dir)
+    for name in list_versions(args.index_dir):
+        path = version_path(args.index_dir, name)
+        docs = open_dir(path).doc_count() if exists_in(path) else "no index"
+        print(f"{'*' if name == current else ' '} {name}  {docs} documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+from scipy.fft import dct
+from whoosh.index import open_dir
+
+from catalog import image_key
+from thumbnails import IMAGE_BASE_URL, THUMB_DIR, ThumbnailCache, indexed_images
+from versions import current_dir
+
+# ================================
+# Visual Similarity
+# ================================
+#
+# Every product image gets a 64-bit perceptual hash (pHash: the signs of the lowest
+# frequencies of the image's DCT), so that images that look alike have hashes a few
+# bits apart. Hashes are kept per image key in HASH_FILE next to the segments of an
+# index version (like similar.npz), so they always describe the catalog being served:
+# "python visual.py" computes the hashes of the images that have none yet (from the
+# thumbnail cache, see thumbnails.py) into the published version, and index.py carries
+# the hashes of the images that are still indexed over to every new version.
+#
+# Nearest neighbours by Hamming distance use multi-index hashing: the hash is split
+# into 4 chunks of 16 bits and each chunk has its own sorted table. Two hashes at
+# most 4 * (r + 1) - 1 bits apart have a chunk at most r bits apart, so a query only
+# looks up the chunk values within r bits of its own chunks and checks those
+# candidates, instead of scanning every hash.
+
+HASH_FILE = "image_hashes.npz"  # Written next to the index segments
+CHUNKS = 4
+CHUNK_BITS = 16
+MAX_DISTANCE = 10          # Bits; larger distances are not "visually similar"
+DUPLICATE_DISTANCE = 4     # Bits; images this close are the same picture (see dedupe.py)
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def phash(image):
+    """
+    64-bit perceptual hash of a PIL image.
+    """
+    pixels = np.asarray(image.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    low = dct(dct(pixels, axis=0, norm="ortho"), axis=1, norm="ortho")[:8, :8]
+    bits = (low > np.median(low)).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def popcount(values):
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return _POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def hash_chunks(value):
+    mask = (1 << CHUNK_BITS) - 1
+    return [(value >> (CHUNK_BITS * i)) & mask for i in range(CHUNKS)]
+
+
+def _flip_masks(radius):
+    """
+    All CHUNK_BITS-bit masks with at most `radius` bits set.
+    """
+    masks = [0]
+    for _ in range(radius):
+        masks = sorted(set(masks) | {mask | (1 << bit) for mask in masks for bit in range(CHUNK_BITS)})
+    return np.array(masks, dtype=np.uint16)
+
+
+_MASKS = [_flip_masks(radius) for radius in range(3)]
+
+
+# ================================
+# Hash Store
+# ================================
+
+
+def load_hashes(index_dir):
+    """
+    Returns {image key: hash} of an index version, empty if no hashes were computed yet.
+    """
+    try:
+        with np.load(os.path.join(index_dir, HASH_FILE)) as data:
+            return dict(zip(data["keys"].astype(str).tolist(), data["hashes"].tolist()))
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+def save_hashes(hashes, index_dir):
+    path = os.path.join(index_dir, HASH_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, keys=np.array(list(hashes), dtype="S40"),
+                 hashes=np.array(list(hashes.values()), dtype=np.uint64))
+    os.replace(tmp_path, path)  # Replaces a hard link to the previous version's file, never writes to it
+
+
+def hash_images(image_urls, thumbnails, hashes=None, workers=8):
+    """
+    Computes the hashes of the images that have none yet, from their thumbnails
+    (fetched if needed). Returns (hashes, computed, failed).
+    """
+    hashes = dict(hashes or {})
+    pending = {image_key(url): url for url in image_urls if url}
+    pending = {key: url for key, url in pending.items() if key not in hashes}
+
+    def compute(item):
+        key, url = item
+        path = thumbnails.thumbnail(key, url)
+        if path is None:
+            return key, None
+        try:
+            with Image.open(path) as image:
+                return key, phash(image)
+        except Exception as e:
+            print(f"Error hashing image {url}: {e}")
+            return key, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(compute, pending.items()))
+    computed = {key: value for key, value in results if value is not None}
+    hashes.update(computed)
+    return hashes, len(computed), len(results) - len(computed)
+
+
+# ================================
+# Nearest Neighbours
+# ================================
+
+
+class VisualIndex:
+    """
+    Multi-index hash table over the image hashes.
+    """
+
+    def __init__(self, hashes):
+        self.keys = list(hashes)
+        self.hashes = np.array(list(hashes.values()), dtype=np.uint64)
+        self.position = {key: i for i, key in enumerate(self.keys)}
+        # One sorted table for all chunks: (chunk number << CHUNK_BITS | chunk value) -> position
+        entries = np.concatenate([
+            (np.uint64(i << CHUNK_BITS) | ((self.hashes >> np.uint64(CHUNK_BITS * i)) & np.uint64((1 << CHUNK_BITS) - 1)))
+            for i in range(CHUNKS)
+        ]).astype(np.uint32)
+        order = np.argsort(entries, kind="stable")
+        self.table = entries[order]
+        self.table_positions = (order % max(len(self.keys), 1)).astype(np.int64)
+
+    @classmethod
+    def load(cls, index_dir):
+        return cls(load_hashes(index_dir))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _candidates(self, value, chunk_radius):
+        probes = np.concatenate([
+            (np.uint32(i << CHUNK_BITS) | (np.uint32(chunk) ^ _MASKS[chunk_radius]))
+            for i, chunk in enumerate(hash_chunks(value))
+        ])
+        starts = np.searchsorted(self.table, probes, side="left")
+        lengths = np.searchsorted(self.table, probes, side="right") - starts
+        # Concatenated ranges table_positions[start:start + length] without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return self.table_positions[offsets]
+
+    def nearest(self, value, k=12, max_distance=MAX_DISTANCE):
+        """
+        Returns up to k (image key, distance) pairs with hashes at most max_distance
+        bits from `value`, closest first.
+        """
+        # Exact matches first (cheap), then the chunk radius that covers max_distance
+        needed = min(max(-(-(max_distance + 1) // CHUNKS) - 1, 0), len(_MASKS) - 1)
+        for chunk_radius in sorted({0, needed}):
+            exact_up_to = CHUNKS * (chunk_radius + 1) - 1  # Every hash this close is a candidate
+            candidates = self._candidates(value, chunk_radius)
+            distances = popcount(self.hashes[candidates] ^ np.uint64(value))
+            within = distances <= min(exact_up_to, max_distance)
+            # A hash can be a candidate through several chunks
+            candidates, first = np.unique(candidates[within], return_index=True)
+            distances = distances[within][first]
+            if len(candidates) >= k:
+                break
+
+        best = np.lexsort((candidates, distances))[:k]
+        return [(self.keys[candidates[i]], int(distances[i])) for i in best]
+
+    def similar(self, key, k=12, max_distance=MAX_DISTANCE):
+        """
+        Nearest neighbours of an indexed image, without the image itself.
+        """
+        position = self.position.get(key)
+        if position is None:
+            return []
+        results = self.nearest(int(self.hashes[position]), k + 1, max_distance)
+        return [(other, distance) for other, distance in results if other != key][:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute perceptual hashes for the images of the indexed products.")
+    parser.add_argument("--index-dir", default="index", help="Index root, the hashes go into the published version")
+    parser.add_argument("--thumb-dir", default=THUMB_DIR)
+    parser.add_argument("--workers", type=int, default=8, help="Parallel downloads")
+    parser.add_argument("--image-base-url", default=IMAGE_BASE_URL,
+                        help="Fetch the images from this host instead (default: IMAGE_BASE_URL)")
+    args = parser.parse_args()
+
+    start = time.time()
+    index_dir = current_dir(args.index_dir)
+    thumbnails = ThumbnailCache(args.thumb_dir, image_base_url=args.image_base_url)
+    hashes, computed, failed = hash_images(indexed_images(open_dir(index_dir)), thumbnails,
+                                           load_hashes(index_dir), workers=args.workers)
+    save_hashes(hashes, index_dir)
+    print(f"Image hashes: {computed} computed, {failed} failed, {len(hashes)} total in {time.time() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()